@@ -0,0 +1,266 @@
+"""
+ModelAdmin base class for tables that grow to millions of rows.
+
+The stock changelist gets slow on big tables in three places:
+
+* every display method touching ``obj.<relation>`` costs one query per
+  row. ``LargeTableAdmin`` reads the source of the ``list_display``
+  methods (and the ``__str__`` of related models shown directly) and
+  derives ``list_select_related`` from the ``obj.a.b`` chains it finds;
+* the paginator runs an exact ``COUNT(*)``. ``EstimatedCountPaginator``
+  counts at most ``ADMIN_EXACT_COUNT_LIMIT`` rows and above that uses the
+  planner's row estimate (or a lower bound when filters are applied);
+* deep pages use ``OFFSET``. With the default ordering the changelist
+  pages by keyset instead: the "next" link carries the sort value and pk
+  of the last row shown and the next page starts right after it.
+"""
+import ast
+import inspect
+import textwrap
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import IS_FACETS_VAR, ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+
+CURSOR_VAR = 'after'
+DEFAULT_EXACT_COUNT_LIMIT = 10000
+
+_relations_cache = {}
+
+
+def attribute_chains(func, argument=0):
+    """Yield the attribute chains (``['offer', 'user', 'id']``) read from an argument of ``func``"""
+    try:
+        source = textwrap.dedent(inspect.getsource(func))
+        tree = ast.parse(source)
+        root = list(inspect.signature(func).parameters)[argument]
+    except (OSError, TypeError, SyntaxError, IndexError):
+        return
+    for node in ast.walk(tree):
+        chain = []
+        while isinstance(node, ast.Attribute):
+            chain.append(node.attr)
+            node = node.value
+        if chain and isinstance(node, ast.Name) and node.id == root:
+            yield chain[::-1]
+
+
+def relation_path(model, chain):
+    """The select_related path covered by a chain of attribute names, or ''"""
+    path = []
+    for name in chain:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            break
+        if not (field.concrete and (field.many_to_one or field.one_to_one)):
+            break
+        path.append(name)
+        model = field.related_model
+    return '__'.join(path)
+
+
+def str_relations(model):
+    """Relations of ``model`` followed by its ``__str__``"""
+    paths = (relation_path(model, chain) for chain in attribute_chains(model.__str__))
+    return {path for path in paths if path}
+
+
+def display_relations(model_admin, list_display):
+    """Derive select_related paths for the columns in ``list_display``"""
+    model = model_admin.model
+    key = (type(model_admin), tuple(map(str, list_display)))
+    if key in _relations_cache:
+        return _relations_cache[key]
+
+    paths = set()
+    for name in list_display:
+        if callable(name):
+            chains, owner = attribute_chains(name), model
+        elif name == '__str__':
+            paths |= str_relations(model)
+            continue
+        elif hasattr(type(model_admin), name):
+            chains, owner = attribute_chains(getattr(type(model_admin), name), argument=1), model
+        else:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                attr = getattr(model, name, None)
+                if isinstance(attr, property):
+                    attr = attr.fget
+                chains, owner = (attribute_chains(attr) if callable(attr) else ()), model
+            else:
+                if field.concrete and (field.many_to_one or field.one_to_one):
+                    paths.add(name)
+                    paths |= {f'{name}__{path}' for path in str_relations(field.related_model)}
+                continue
+        paths |= {path for path in (relation_path(owner, chain) for chain in chains) if path}
+
+    # Drop paths already implied by a longer one
+    relations = sorted(
+        path for path in paths
+        if not any(other.startswith(path + '__') for other in paths)
+    )
+    _relations_cache[key] = relations
+    return relations
+
+
+def estimate_count(queryset):
+    """Cheap row estimate for an unfiltered table, or None when unavailable"""
+    if queryset.query.where:
+        return None
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+    if connection.vendor == 'sqlite':
+        # Auto-increment keys: the largest pk bounds the row count from above
+        return model._default_manager.using(queryset.db).aggregate(last=Max('pk'))['last']
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that stops counting at ``ADMIN_EXACT_COUNT_LIMIT`` rows"""
+
+    estimated = False
+    lower_bound = False
+
+    @cached_property
+    def limit(self):
+        return getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', DEFAULT_EXACT_COUNT_LIMIT)
+
+    @cached_property
+    def count(self):
+        capped = self.object_list[:self.limit + 1].count()
+        if capped <= self.limit:
+            return capped
+        self.estimated = True
+        estimate = estimate_count(self.object_list)
+        if estimate is None:
+            # Filtered: all we know is that there are more than ``limit`` rows
+            self.lower_bound = True
+            return capped
+        return max(estimate, capped)
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList paging with a ``?after=<value>|<pk>`` cursor on the default ordering"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.keyset = False
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+        # Filter, sort and search links always start again from the first page
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+        self.remove_facet_link = self.get_query_string(remove=[IS_FACETS_VAR])
+        self.add_facet_link = self.get_query_string({IS_FACETS_VAR: True})
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def keyset_ordering(self):
+        """(field, descending, pk descending) when the ordering allows keyset paging"""
+        if ORDER_VAR in self.params or self.show_all:
+            return None
+        terms = self.queryset.query.order_by
+        if not terms or not all(isinstance(term, str) for term in terms):
+            return None
+        ordering = list(dict.fromkeys(terms))
+        pk_names = {'pk', self.lookup_opts.pk.name}
+        if ordering[0].lstrip('-') in pk_names:
+            ordering = ordering[:1] * 2
+        if len(ordering) != 2 or ordering[1].lstrip('-') not in pk_names:
+            return None
+        name = ordering[0].lstrip('-')
+        try:
+            field = self.lookup_opts.pk if name in pk_names else self.lookup_opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.null or field.is_relation:
+            return None
+        return field, ordering[0].startswith('-'), ordering[1].startswith('-')
+
+    def cursor_filter(self, field, descending, pk_descending):
+        try:
+            value, pk = self.cursor.rsplit('|', 1)
+            value = field.to_python(value)
+            pk = self.lookup_opts.pk.to_python(pk)
+        except (ValueError, ValidationError):
+            raise IncorrectLookupParameters
+        after = 'lt' if descending else 'gt'
+        pk_after = 'lt' if pk_descending else 'gt'
+        if field.primary_key:
+            return Q(**{f'pk__{pk_after}': pk})
+        return Q(**{f'{field.attname}__{after}': value}) | Q(
+            **{field.attname: value, f'pk__{pk_after}': pk}
+        )
+
+    def get_results(self, request):
+        ordering = self.keyset_ordering()
+        if ordering is None:
+            return super().get_results(request)
+
+        field = ordering[0]
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        queryset = self.queryset
+        if self.cursor:
+            queryset = queryset.filter(self.cursor_filter(*ordering))
+        rows = list(queryset[:self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            last = rows[self.list_per_page - 1]
+            self.next_cursor = f'{field.value_to_string(last)}|{last.pk}'
+            rows = rows[:self.list_per_page]
+
+        self.keyset = True
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+        self.paginator = paginator
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])
+
+    @property
+    def next_page_url(self):
+        if self.next_cursor:
+            return self.get_query_string({CURSOR_VAR: self.next_cursor}, [PAGE_VAR])
+        return None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ModelAdmin with derived select_related, capped counts and keyset paging"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_list_select_related(self, request):
+        if self.list_select_related:
+            return self.list_select_related
+        return display_relations(self, self.get_list_display(request)) or False
@@ -0,0 +1,50 @@
+"""
+Optimistic concurrency control for status transitions.
+
+Models with a ``version`` column change state through
+``compare_and_swap``. It runs a single UPDATE that only matches while the
+row still has the status and version the caller read:
+
+    UPDATE ... SET status = ?, ..., version = version + 1
+    WHERE id = ? AND status = ? AND version = ?
+
+No row lock is taken. If another request got there first, nothing
+matches, the caller gets False and answers 409 instead of overwriting
+the other change. Only the listed columns are written, unlike ``save()``
+which rewrites every column from a possibly stale copy.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .outbox import OutboxMixin, record
+
+
+CONFLICT_MESSAGE = 'This record was changed by someone else, reload it and try again.'
+
+
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = CONFLICT_MESSAGE
+    default_code = 'conflict'
+
+
+def compare_and_swap(instance, **changes):
+    """Write ``changes`` if the row is unchanged since ``instance`` was read"""
+    model = type(instance)
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        changes.setdefault('updated_at', timezone.now())
+    with transaction.atomic():
+        swapped = model.objects.filter(
+            pk=instance.pk, status=instance.status, version=instance.version
+        ).update(version=F('version') + 1, **changes)
+        if not swapped:
+            return False
+        for name, value in changes.items():
+            setattr(instance, name, value)
+        instance.version += 1
+        if isinstance(instance, OutboxMixin):
+            record(instance, 'updated')
+    return True
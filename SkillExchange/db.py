@@ -0,0 +1,72 @@
+"""
+SQLite connection profiles.
+
+The development profile is Django's default SQLite configuration. The
+production profile turns on WAL so readers no longer block behind writers,
+applies the pragmas below on every new connection, keeps connections open
+between requests and starts write transactions with BEGIN IMMEDIATE. With
+IMMEDIATE the write lock is taken up front and contending writers wait in
+SQLite's busy handler (busy_timeout) instead of failing halfway through a
+transaction with "database is locked".
+
+Reads go through a separate ``read`` alias on the same file, opened with
+``query_only`` so it can never take the write lock (see
+SkillExchange.routers.ReadWriteRouter).
+"""
+
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_init_command(pragmas):
+    """Render pragmas as the ``init_command`` run on each new connection"""
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items())
+
+
+def sqlite_databases(name, profile='development'):
+    """Return the DATABASES setting for the SQLite file ``name``"""
+    if profile != 'production':
+        return {
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': name,
+            }
+        }
+
+    busy_timeout = SQLITE_PRODUCTION_PRAGMAS['busy_timeout']
+    read_pragmas = dict(SQLITE_PRODUCTION_PRAGMAS, query_only='ON')
+    # journal_mode is a property of the file and is set by the writer
+    read_pragmas.pop('journal_mode')
+
+    return {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': name,
+            'CONN_MAX_AGE': None,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': sqlite_init_command(SQLITE_PRODUCTION_PRAGMAS),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': busy_timeout / 1000,
+            },
+        },
+        'read': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': name,
+            'CONN_MAX_AGE': None,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': sqlite_init_command(read_pragmas),
+                'timeout': busy_timeout / 1000,
+            },
+            'TEST': {
+                'MIRROR': 'default',
+            },
+        },
+    }
@@ -0,0 +1,112 @@
+"""
+Serving of uploaded media with byte ranges and sendfile offload.
+
+With ``MEDIA_SENDFILE_HEADER`` set, the view only checks the path and
+hands the transfer to the web server: ``X-Sendfile`` (Apache, lighttpd)
+gets the file's absolute path and ``X-Accel-Redirect`` (nginx) its URL
+under the internal ``MEDIA_SENDFILE_PREFIX`` location. Otherwise the
+file is streamed from Python, honouring a single ``Range: bytes=`` range
+with a 206 response so clients can resume and seek.
+
+Files under a content-hashed directory (``profile_pics/<hash>/``) never
+change and are sent with an immutable one-year Cache-Control; everything
+else may be revalidated with its ETag.
+
+The URL is only mounted with ``SERVE_MEDIA``, which the settings turn on
+while DEBUG is on, with a sendfile header or with DJANGO_SERVE_MEDIA=1.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+HASHED = re.compile(r'(^|/)[0-9a-f]{32}/')
+CHUNK_SIZE = 64 * 1024
+
+
+def byte_range(header, size):
+    """(start, end) of a single satisfiable range, None to send it all, or False"""
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_range(path, start, length):
+    with open(path, 'rb') as fileobj:
+        fileobj.seek(start)
+        while length > 0:
+            chunk = fileobj.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid path')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    stat = os.stat(full_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified()
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+    if header:
+        response = HttpResponse(content_type=content_type)
+        if header.lower() == 'x-accel-redirect':
+            prefix = getattr(settings, 'MEDIA_SENDFILE_PREFIX', '/internal-media/')
+            response[header] = prefix.rstrip('/') + '/' + path.lstrip('/')
+        else:
+            response[header] = full_path
+    else:
+        requested = byte_range(request.headers.get('Range'), stat.st_size)
+        if requested is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if requested is None:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        else:
+            start, end = requested
+            response = StreamingHttpResponse(
+                iter_range(full_path, start, end - start + 1),
+                status=206,
+                content_type=content_type
+            )
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if HASHED.search(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
@@ -0,0 +1,388 @@
+"""
+Prometheus-style metrics for API requests and domain events.
+
+Each worker process keeps its counters and histograms in plain dicts
+behind one lock and writes a snapshot to ``<METRICS_DIR>/metrics-<pid>.json``
+at most every ``METRICS_FLUSH_INTERVAL`` seconds. The scrape endpoint sums
+the snapshots of all live workers and renders them in the Prometheus text
+exposition format, so any worker can answer a scrape for the whole host.
+When a worker has exited (e.g. recycled by gunicorn or uwsgi), its
+counters and histograms are folded into ``archived.json`` so the host
+totals never go backwards; only its gauges are dropped. Scrapes hold an
+flock on the directory while they fold and read.
+
+Recorded automatically:
+
+* ``http_request_duration_seconds`` histogram per route name and method,
+* ``http_request_db_queries`` histogram of queries per request,
+* ``signal_handler_duration_seconds`` histogram per handler (see ``timed``).
+
+Domain events are counted with ``metrics.inc(...)`` where they happen.
+Recording never raises: a snapshot that cannot be written is logged and
+retried at the next interval.
+"""
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process serves the scrapes
+    fcntl = None
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIGNAL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+
+HELP = {
+    'http_request_duration_seconds': ('histogram', 'API request latency by route'),
+    'http_request_db_queries': ('histogram', 'Database queries per request by route'),
+    'signal_handler_duration_seconds': ('histogram', 'Time spent in signal handlers'),
+    'exchange_requests_created_total': ('counter', 'Exchange requests created'),
+    'exchange_requests_accepted_total': ('counter', 'Exchange requests accepted'),
+    'bookings_confirmed_total': ('counter', 'Bookings confirmed'),
+    'sessions_completed_total': ('counter', 'Sessions completed'),
+    'notifications_created_total': ('counter', 'Notifications created'),
+    'password_hashing_pending': ('gauge', 'Password hashing jobs queued or running'),
+    'password_hashing_rejected_total': ('counter', 'Password hashing jobs rejected as busy'),
+}
+
+
+ARCHIVE_NAME = 'archived.json'
+LOCK_NAME = '.lock'
+
+
+def get_metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return str(directory or os.path.join(tempfile.gettempdir(), 'skillexchange-metrics'))
+
+
+class Registry:
+    """Per-process metric values"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+        self.maybe_flush()
+
+    def observe(self, name, value, buckets, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = {
+                    'buckets': list(buckets),
+                    'counts': [0] * len(buckets),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            for index, bound in enumerate(entry['buckets']):
+                if value <= bound:
+                    entry['counts'][index] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+        self.maybe_flush()
+
+    def gauge(self, name, callback):
+        """Register a callback read at flush time"""
+        self.gauges[name] = callback
+
+    def snapshot(self):
+        with self.lock:
+            data = {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), dict(entry, counts=list(entry['counts']))]
+                    for (name, labels), entry in self.histograms.items()
+                ],
+            }
+        data['gauges'] = []
+        for name, callback in self.gauges.items():
+            try:
+                data['gauges'].append([name, [], callback()])
+            except Exception:
+                continue
+        return data
+
+    def maybe_flush(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        if time.monotonic() - self.last_flush >= interval:
+            try:
+                # Threads arriving together: one writes, the others move on
+                self.flush(blocking=False)
+            except Exception:
+                logger.warning('Could not write the metrics snapshot', exc_info=True)
+
+    def flush(self, blocking=True):
+        if not self.flush_lock.acquire(blocking=blocking):
+            return
+        try:
+            self.last_flush = time.monotonic()
+            directory = get_metrics_dir()
+            os.makedirs(directory, exist_ok=True)
+            write_snapshot(os.path.join(directory, f'metrics-{os.getpid()}.json'), self.snapshot())
+        finally:
+            self.flush_lock.release()
+
+
+def write_snapshot(path, data):
+    """Replace ``path`` atomically, so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f'.metrics-{os.getpid()}-', suffix='.tmp', dir=os.path.dirname(path)
+    )
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            json.dump(data, out)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_snapshot(path):
+    try:
+        with open(path, encoding='utf-8') as fileobj:
+            return json.load(fileobj)
+    except (OSError, ValueError):
+        return None
+
+
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    registry.observe(name, value, buckets, **labels)
+
+
+def timed(handler_name):
+    """Decorator recording a signal handler's duration"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(
+                    'signal_handler_duration_seconds',
+                    time.perf_counter() - started,
+                    SIGNAL_BUCKETS,
+                    handler=handler_name
+                )
+        return wrapper
+    return decorator
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def directory_lock(directory):
+    """Serialize scrapes of ``directory`` across the workers"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_NAME), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def merge(totals, data, gauges=True):
+    """Add a snapshot to (counters, histograms, gauges) totals"""
+    counters, histograms, gauge_totals = totals
+    for name, labels, value in data.get('counters', []):
+        key = (name, tuple(tuple(label) for label in labels))
+        counters[key] = counters.get(key, 0) + value
+    if gauges:
+        for name, labels, value in data.get('gauges', []):
+            gauge_totals[name] = gauge_totals.get(name, 0) + value
+    for name, labels, entry in data.get('histograms', []):
+        key = (name, tuple(tuple(label) for label in labels))
+        total = histograms.get(key)
+        if total is None:
+            histograms[key] = dict(entry, counts=list(entry['counts']))
+            continue
+        total['counts'] = [a + b for a, b in zip(total['counts'], entry['counts'])]
+        total['sum'] += entry['sum']
+        total['count'] += entry['count']
+
+
+def archive_dead(directory, paths):
+    """Fold the counters and histograms of exited workers into the archive"""
+    archive_path = os.path.join(directory, ARCHIVE_NAME)
+    totals = ({}, {}, {})
+    merge(totals, read_snapshot(archive_path) or {})
+    folded = []
+    for path in paths:
+        data = read_snapshot(path)
+        if data is not None:
+            merge(totals, data, gauges=False)
+            folded.append(path)
+    if not folded:
+        return
+    counters, histograms, _ = totals
+    write_snapshot(archive_path, {
+        'counters': [
+            [name, [list(label) for label in labels], value] for (name, labels), value in counters.items()
+        ],
+        'histograms': [
+            [name, [list(label) for label in labels], entry] for (name, labels), entry in histograms.items()
+        ],
+    })
+    for path in folded:
+        os.remove(path)
+
+
+def collect():
+    """Sum the archive and the snapshots of every live worker on this host"""
+    try:
+        registry.flush()
+    except OSError:
+        logger.warning('Could not write the metrics snapshot', exc_info=True)
+    directory = get_metrics_dir()
+    totals = ({}, {}, {})
+    if not os.path.isdir(directory):
+        return totals
+
+    with directory_lock(directory):
+        live, dead = [], []
+        for filename in os.listdir(directory):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            pid = int(filename[len('metrics-'):-len('.json')])
+            (live if _process_alive(pid) else dead).append(os.path.join(directory, filename))
+        if dead:
+            try:
+                archive_dead(directory, dead)
+            except OSError:
+                logger.warning('Could not archive the metrics of exited workers', exc_info=True)
+
+        for path in [os.path.join(directory, ARCHIVE_NAME), *live]:
+            data = read_snapshot(path)
+            if data is not None:
+                merge(totals, data)
+    return totals
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    rendered = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return '{' + rendered + '}'
+
+
+def render():
+    """Render all metrics in the Prometheus text format"""
+    counters, histograms, gauges = collect()
+    lines = []
+    seen = set()
+
+    def header(name):
+        if name in seen:
+            return
+        seen.add(name)
+        kind, help_text = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name)
+        lines.append(f'{name}{_labels(labels)} {value}')
+
+    for name, value in sorted(gauges.items()):
+        header(name)
+        lines.append(f'{name} {value}')
+
+    for (name, labels), entry in sorted(histograms.items()):
+        header(name)
+        cumulative = 0
+        for bound, count in zip(entry['buckets'], entry['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {entry["count"]}')
+        lines.append(f'{name}_sum{_labels(labels)} {entry["sum"]}')
+        lines.append(f'{name}_count{_labels(labels)} {entry["count"]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Scrape endpoint"""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', None)
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Record latency and query count for every routed request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match is not None else 'unresolved'
+        observe('http_request_duration_seconds', elapsed, LATENCY_BUCKETS,
+                route=route, method=request.method)
+        observe('http_request_db_queries', counter.count, QUERY_COUNT_BUCKETS,
+                route=route)
+        return response
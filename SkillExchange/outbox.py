@@ -0,0 +1,172 @@
+"""
+Transactional outbox and change feed.
+
+Models with ``OutboxMixin`` write an OutboxEvent (model label, object id,
+action, the row's column values and, for updates, the values the update
+changed as loaded from the database) in the same transaction as every
+save, and the post_delete handler below does the same for deletes,
+including cascades and queryset deletes. A change is therefore recorded
+if and only if it commits. Bulk ``update()`` and ``bulk_create`` write no
+events; ``manage.py rebuild_read_models`` resyncs the read models after
+those.
+
+Read models (leaderboards, trending counters, ...) register a handler per
+model with ``@handles('skills.Booking')`` and are kept up to date by
+``consume``. It reads events after the consumer's checkpoint in id order,
+a batch at a time, and hands each handler its events in order. It then
+advances the checkpoint in the same transaction as the handlers' writes,
+so a batch is applied exactly once or retried as a whole.
+
+Ids are allocated before commit, so a slow transaction can commit an id
+below one already consumed. ``consume`` therefore leaves events younger
+than ``SETTLE_SECONDS`` for the next batch.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from SkillExchange import metrics
+
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 1.0,
+    'SETTLE_SECONDS': 2,
+    'KEEP_DAYS': 7,
+}
+
+HANDLERS = defaultdict(list)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'OUTBOX', {})}
+
+
+def event_model():
+    # Lazy: the mixin is used by models of apps loaded before skills
+    return apps.get_model('skills', 'OutboxEvent')
+
+
+def checkpoint_model():
+    return apps.get_model('skills', 'OutboxCheckpoint')
+
+
+def record(instance, action):
+    opts = instance._meta
+    payload = {field.attname: field.value_from_object(instance) for field in opts.concrete_fields}
+    previous = {}
+    if action == 'updated':
+        loaded = getattr(instance, '_outbox_loaded', {})
+        previous = {name: value for name, value in loaded.items() if payload.get(name, value) != value}
+    instance._outbox_loaded = payload
+    return event_model().objects.create(
+        model=opts.label,
+        object_id=instance.pk,
+        action=action,
+        payload=payload,
+        previous=previous,
+    )
+
+
+def outbox_deleted(sender, instance, **kwargs):
+    # Sent inside the deletion's transaction, cascades included
+    record(instance, 'deleted')
+
+
+class OutboxMixin:
+    """Record an OutboxEvent in the transaction of every save and delete"""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Per sender, so models without the mixin keep fast deletes
+        post_delete.connect(outbox_deleted, sender=cls, weak=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the next update changed, for handlers that follow a moved row
+        instance._outbox_loaded = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            record(self, 'created' if created else 'updated')
+
+
+def handles(*labels):
+    """Register ``handler(events)`` for the events of the given models"""
+    def register(handler):
+        for label in labels:
+            HANDLERS[label].append(handler)
+        return handler
+    return register
+
+
+def last_event_id():
+    return event_model().objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def set_checkpoint(name, event_id):
+    checkpoint_model().objects.update_or_create(name=name, defaults={'last_event_id': event_id})
+
+
+def consume(name='read_models', batch_size=None, now=None):
+    """Apply the next batch of events for consumer ``name``, returning how many"""
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    settled = (now or timezone.now()) - timedelta(seconds=config['SETTLE_SECONDS'])
+    with transaction.atomic():
+        checkpoint, _ = checkpoint_model().objects.select_for_update().get_or_create(name=name)
+        events = list(event_model().objects.filter(
+            pk__gt=checkpoint.last_event_id, created_at__lte=settled
+        ).order_by('pk')[:batch_size])
+        if not events:
+            return 0
+
+        by_model = defaultdict(list)
+        for event in events:
+            by_model[event.model].append(event)
+        for label, model_events in by_model.items():
+            for handler in HANDLERS.get(label, []):
+                handler(model_events)
+
+        checkpoint.last_event_id = events[-1].pk
+        checkpoint.save(update_fields=['last_event_id', 'updated_at'])
+    metrics.inc('outbox_events_consumed_total', len(events), consumer=name)
+    return len(events)
+
+
+def prune(now=None, batch_size=None):
+    """Delete events every consumer is past and older than KEEP_DAYS"""
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    cutoff = (now or timezone.now()) - timedelta(days=config['KEEP_DAYS'])
+    consumed = checkpoint_model().objects.aggregate(low=Min('last_event_id'))['low'] or 0
+    old = event_model().objects.filter(pk__lte=consumed, created_at__lt=cutoff)
+    removed = 0
+    while True:
+        pks = list(old.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return removed
+        removed += event_model().objects.filter(pk__in=pks).delete()[0]
+
+
+def run_forever(name='read_models', batch_size=None, on_batch=None):
+    config = get_config()
+    while True:
+        consumed = consume(name, batch_size)
+        if consumed:
+            if on_batch:
+                on_batch(consumed)
+            continue
+        prune()
+        time.sleep(config['POLL_INTERVAL'])
@@ -0,0 +1,222 @@
+"""
+Opt-in sampling profiler for API requests.
+
+A configurable fraction of requests, plus any request carrying the
+profiling header, is profiled by a background thread that samples the
+request thread's stack every few milliseconds. The header forces a
+profile and an immediate flush, so outside DEBUG it is only honoured when
+its value equals ``SECRET``; without a secret it is ignored. Samples are aggregated per
+view (``url_name`` plus the DRF action, if any) into:
+
+* collapsed stack files (``<view>-<pid>.collapsed``, one
+  ``frame;frame;... count`` line per distinct stack) that flamegraph
+  tools read directly, and
+* ``summary-<pid>.json``, which splits the sampled time between the ORM,
+  serialization (``to_representation``), signal handlers, permission
+  checks and everything else.
+
+Configuration lives in ``settings.REQUEST_PROFILING``; the middleware is
+a no-op unless ``ENABLED`` is true.
+"""
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,
+    'HEADER': 'X-Profile',
+    'SECRET': None,
+    'INTERVAL': 0.005,
+    'OUTPUT_DIR': None,
+    'FLUSH_EVERY': 20,
+}
+
+CATEGORIES = ['orm', 'serialization', 'signals', 'permissions', 'python']
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'REQUEST_PROFILING', {}))
+    if not config['OUTPUT_DIR']:
+        config['OUTPUT_DIR'] = os.path.join(settings.BASE_DIR, 'profiles')
+    return config
+
+
+def classify(stack):
+    """
+    Attribute one sampled stack (outermost frame first) to a category.
+
+    The innermost recognised frame decides, so a query made from a
+    serializer or a signal handler counts as ORM time, while the handler's
+    own Python code counts as signal time.
+    """
+    for filename, function in reversed(stack):
+        if 'django/db/' in filename:
+            return 'orm'
+        if function == 'to_representation':
+            return 'serialization'
+        if 'django/dispatch/' in filename and function in ('send', 'send_robust'):
+            return 'signals'
+        if function in ('check_permissions', 'check_object_permissions',
+                        'has_permission', 'has_object_permission'):
+            return 'permissions'
+    return 'python'
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread until stopped"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+class ProfileAggregator:
+    """Per-view totals shared by all requests of this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stacks = defaultdict(Counter)
+        self.summary = defaultdict(lambda: {
+            'requests': 0,
+            'wall_seconds': 0.0,
+            'samples': 0,
+            'categories': Counter(),
+        })
+        self.pending = 0
+
+    def add(self, view_name, stacks, wall_seconds):
+        with self.lock:
+            entry = self.summary[view_name]
+            entry['requests'] += 1
+            entry['wall_seconds'] += wall_seconds
+            for stack, count in stacks.items():
+                entry['samples'] += count
+                entry['categories'][classify(stack)] += count
+                collapsed = ';'.join(
+                    f'{function} ({os.path.basename(filename)})'
+                    for filename, function in stack
+                )
+                self.stacks[view_name][collapsed] += count
+            self.pending += 1
+            return self.pending
+
+    def flush(self, output_dir):
+        with self.lock:
+            os.makedirs(output_dir, exist_ok=True)
+            for view_name, stacks in self.stacks.items():
+                path = os.path.join(output_dir, f'{safe_name(view_name)}-{os.getpid()}.collapsed')
+                with open(path, 'w', encoding='utf-8') as out:
+                    for collapsed, count in stacks.most_common():
+                        out.write(f'{collapsed} {count}\n')
+
+            summary = {}
+            for view_name, entry in self.summary.items():
+                samples = entry['samples'] or 1
+                summary[view_name] = {
+                    'requests': entry['requests'],
+                    'avg_ms': round(entry['wall_seconds'] * 1000 / entry['requests'], 2),
+                    'samples': entry['samples'],
+                    'split': {
+                        category: round(entry['categories'][category] / samples, 4)
+                        for category in CATEGORIES
+                    },
+                }
+            path = os.path.join(output_dir, f'summary-{os.getpid()}.json')
+            with open(path, 'w', encoding='utf-8') as out:
+                json.dump(summary, out, indent=2, sort_keys=True)
+            self.pending = 0
+
+
+def safe_name(view_name):
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in view_name)
+
+
+aggregator = ProfileAggregator()
+
+
+def view_name_for(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    name = match.view_name or match._func_path
+    action = getattr(request, 'profiling_action', None)
+    return f'{name}.{action}' if action else name
+
+
+class SamplingProfilerMiddleware:
+    """Profile a sample of requests and aggregate the stacks per view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+
+    def header_requested(self, request):
+        """Whether the request may force profiling with the header"""
+        value = request.headers.get(self.config['HEADER'])
+        if not value:
+            return False
+        if settings.DEBUG:
+            return True
+        # Runs before authentication, so a shared secret stands in for staff checks
+        secret = self.config['SECRET']
+        return bool(secret) and hmac.compare_digest(value.encode(), secret.encode())
+
+    def __call__(self, request):
+        if not self.config['ENABLED']:
+            return self.get_response(request)
+        forced = self.header_requested(request)
+        if not forced and random.random() >= self.config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.config['INTERVAL'])
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        elapsed = time.perf_counter() - started
+
+        view_name = view_name_for(request)
+        pending = aggregator.add(view_name, sampler.stacks, elapsed)
+        if pending >= self.config['FLUSH_EVERY'] or forced:
+            aggregator.flush(self.config['OUTPUT_DIR'])
+
+        response['X-Profiled-View'] = view_name
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF viewsets expose the method -> action mapping on the view function
+        actions = getattr(view_func, 'actions', None)
+        if actions:
+            request.profiling_action = actions.get(request.method.lower())
+        return None
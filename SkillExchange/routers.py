@@ -0,0 +1,152 @@
+"""
+Database routers and the middleware that picks a read replica per request.
+
+Views opt into replica reads by setting ``read_from_replica = True`` (or
+by decorating a function view with ``replica_reads``). For safe-method
+requests to such views, ReplicaRoutingMiddleware points reads at one of
+``settings.DATABASE_REPLICAS`` for the duration of the request.
+
+Streamed responses read the database while their body is iterated, after
+the view has returned, so the replica stays selected until the response
+is closed.
+
+After a successful write the client is pinned to the primary for
+``REPLICA_STICKY_SECONDS`` through a cookie and an ``X-Primary-Pin-Until``
+response header. Clients that do not keep cookies can echo the header
+back, so they read their own writes while the replicas catch up.
+"""
+import contextvars
+import random
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import connections
+
+
+_replica_alias = contextvars.ContextVar('replica_alias', default=None)
+
+STICKY_COOKIE = 'primary_pin'
+STICKY_HEADER = 'X-Primary-Pin-Until'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_reads(view_func):
+    """Mark a function view as safe to serve from a read replica"""
+    view_func.read_from_replica = True
+    return view_func
+
+
+def get_replicas():
+    return [
+        alias for alias in getattr(settings, 'DATABASE_REPLICAS', [])
+        if alias in settings.DATABASES
+    ]
+
+
+class ReadWriteRouter:
+    """
+    Send reads to a replica or the ``read`` alias and writes to ``default``.
+
+    A replica is only used while ReplicaRoutingMiddleware has selected one
+    for the current request. Reads made inside an open transaction on
+    ``default`` stay on ``default`` so they see the transaction's own
+    uncommitted writes.
+    """
+    read_alias = 'read'
+    write_alias = 'default'
+
+    def db_for_read(self, model, **hints):
+        if connections[self.write_alias].in_atomic_block:
+            return self.write_alias
+
+        replica = _replica_alias.get()
+        if replica is not None:
+            return replica
+
+        if self.read_alias in settings.DATABASES:
+            return self.read_alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.write_alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == self.write_alias
+
+
+def _view_reads_from_replica(view_func):
+    for candidate in (
+        view_func,
+        getattr(view_func, 'cls', None),
+        getattr(view_func, 'view_class', None),
+    ):
+        if candidate is not None and getattr(candidate, 'read_from_replica', False):
+            return True
+    return False
+
+
+def _release(token):
+    try:
+        _replica_alias.reset(token)
+    except ValueError:
+        # Closed from another context (e.g. by the ASGI handler)
+        _replica_alias.set(None)
+
+
+def _is_pinned(request):
+    now = time.time()
+    for value in (request.COOKIES.get(STICKY_COOKIE), request.headers.get(STICKY_HEADER)):
+        try:
+            if value and float(value) > now:
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+class ReplicaRoutingMiddleware:
+    """Route safe requests to annotated views to a read replica"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.use_replica = False
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            token = getattr(request, '_replica_token', None)
+            if token is not None:
+                _release(token)
+            raise
+
+        token = getattr(request, '_replica_token', None)
+        if token is not None:
+            if response.streaming:
+                response._resource_closers.append(partial(_release, token))
+            else:
+                _release(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            pin_until = f'{time.time() + pin_seconds:.3f}'
+            response.set_cookie(STICKY_COOKIE, pin_until, max_age=pin_seconds, httponly=True)
+            response[STICKY_HEADER] = pin_until
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = get_replicas()
+        if (
+            replicas
+            and request.method in SAFE_METHODS
+            and _view_reads_from_replica(view_func)
+            and not _is_pinned(request)
+        ):
+            request.use_replica = True
+            request._replica_token = _replica_alias.set(random.choice(replicas))
+        return None
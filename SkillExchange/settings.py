@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .db import sqlite_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,14 +42,19 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'accounts',
+    'skills',
 ]
 
 MIDDLEWARE = [
+    'SkillExchange.profiling.SamplingProfilerMiddleware',
+    'SkillExchange.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'SkillExchange.routers.ReplicaRoutingMiddleware',
+    'SkillExchange.throttling.RateLimitHeadersMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,7 +64,7 @@ ROOT_URLCONF = 'SkillExchange.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -75,12 +83,35 @@ WSGI_APPLICATION = 'SkillExchange.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# DJANGO_DB_PROFILE=production enables WAL, tuned pragmas, persistent
+# connections and a separate read connection (see SkillExchange/db.py)
+
+DB_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+
+DATABASES = sqlite_databases(BASE_DIR / 'db.sqlite3', DB_PROFILE)
+
+DATABASE_ROUTERS = ['SkillExchange.routers.ReadWriteRouter']
+
+# Read replicas for views marked read_from_replica. Locally a second SQLite
+# file kept in sync by 'manage.py sync_replica' stands in for replication.
+
+DATABASE_REPLICAS = []
+
+if os.environ.get('DJANGO_DB_REPLICA_PATH'):
+    DATABASES['replica'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ['DJANGO_DB_REPLICA_PATH'],
+        'OPTIONS': {
+            'init_command': 'PRAGMA query_only=ON',
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
     }
-}
+    DATABASE_REPLICAS.append('replica')
+
+# Seconds a client keeps reading from the primary after a write
+REPLICA_STICKY_SECONDS = 5
 
 
 # Password validation
@@ -102,6 +133,31 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# Hashing and validation run in a bounded process pool (accounts.hashing).
+# Set DJANGO_PASSWORD_HASHING_WORKERS=0 to hash inline. PBKDF2 uses
+# Django's default iterations; DJANGO_PASSWORD_HASH_ITERATIONS lowers them
+# for tests and benchmarks only (existing hashes are never downgraded).
+
+PASSWORD_HASHERS = [
+    'accounts.hashing.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('DJANGO_PASSWORD_HASH_ITERATIONS', '0')) or None
+
+PASSWORD_HASHING_WORKERS = int(
+    os.environ.get('DJANGO_PASSWORD_HASHING_WORKERS', os.cpu_count() or 1)
+)
+
+PASSWORD_HASHING_MAX_PENDING = int(
+    os.environ.get('DJANGO_PASSWORD_HASHING_MAX_PENDING', PASSWORD_HASHING_WORKERS * 8)
+)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -119,7 +175,196 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+
+# Media files
+# Uploads are served by SkillExchange.media with byte-range support. Set
+# DJANGO_MEDIA_SENDFILE_HEADER to 'X-Sendfile' (Apache, lighttpd) or
+# 'X-Accel-Redirect' (nginx, with an internal location at
+# MEDIA_SENDFILE_PREFIX aliased to MEDIA_ROOT) to let the web server send
+# the bytes. Without either, media is only mounted while DEBUG is on:
+# production should use sendfile, or set DJANGO_SERVE_MEDIA=1 to stream
+# uploads from Python anyway.
+
+MEDIA_URL = 'media/'
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+MEDIA_SENDFILE_HEADER = os.environ.get('DJANGO_MEDIA_SENDFILE_HEADER') or None
+
+MEDIA_SENDFILE_PREFIX = '/internal-media/'
+
+SERVE_MEDIA = DEBUG or bool(MEDIA_SENDFILE_HEADER) or os.environ.get('DJANGO_SERVE_MEDIA') == '1'
+
+
+# Profile pictures
+# Square thumbnail sizes in pixels, selectable with ?picture_size=<key> or
+# 'original'; DEFAULT_SIZE applies when none is given. Uploads are
+# rendered by a pool of WORKERS processes (accounts.images), 0 renders
+# inline.
+
+PROFILE_PICTURES = {
+    'SIZES': {'xs': 40, 'sm': 96, 'md': 256, 'lg': 512},
+    'DEFAULT_SIZE': 'sm',
+    'MAX_SIDE': 1024,
+    'QUALITY': 85,
+    'WORKERS': int(os.environ.get('DJANGO_PROFILE_PICTURE_WORKERS', '2')),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Streaming JSON responses
+# Rows fetched and serialized per chunk by SkillExchange.streaming
+
+STREAMING_CHUNK_SIZE = 500
+
+
+# Django REST framework
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': [
+        'SkillExchange.throttling.TokenBucketThrottle',
+    ],
+}
+
+
+# Rate limiting
+# Bucket settings per throttle_scope; every view class gets its own bucket
+# per client. Views declare throttle_cost/throttle_costs.
+# The store defaults to a SQLite file on /dev/shm shared by all workers of
+# this checkout (named after BASE_DIR); use {'BACKEND': 'memory'} for a
+# per-process store. Requests are let through if the store stays locked
+# for TIMEOUT seconds.
+
+TOKEN_BUCKETS = {
+    'default': {'capacity': 120, 'refill_per_second': 2.0},
+    'search': {'capacity': 60, 'refill_per_second': 1.0},
+}
+
+THROTTLE_STORE = {
+    'BACKEND': os.environ.get('DJANGO_THROTTLE_STORE', 'sqlite'),
+    'PATH': os.environ.get('DJANGO_THROTTLE_STORE_PATH'),
+    'TIMEOUT': 5,
+}
+
+
+# Request profiling
+# Sampling profiler for a fraction of requests, or any request sending the
+# X-Profile header set to SECRET (any value while DEBUG is on). Writes
+# collapsed stacks and a time split per view.
+
+REQUEST_PROFILING = {
+    'ENABLED': os.environ.get('DJANGO_REQUEST_PROFILING') == '1',
+    'SAMPLE_RATE': float(os.environ.get('DJANGO_REQUEST_PROFILING_RATE', '0.01')),
+    'HEADER': 'X-Profile',
+    'SECRET': os.environ.get('DJANGO_REQUEST_PROFILING_SECRET'),
+    'INTERVAL': 0.005,
+    'OUTPUT_DIR': BASE_DIR / 'profiles',
+}
+
+
+# Metrics
+# Per-process counters are flushed to METRICS_DIR and summed by /metrics/.
+# Scrapes are only answered for METRICS_ALLOWED_IPS (empty allows all).
+
+METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+
+# Skill autocomplete
+# Seconds before a worker rebuilds its in-memory skill name trie.
+
+SKILL_AUTOCOMPLETE_TTL = 300
+
+
+# Session scheduler
+# manage.py run_scheduler: reminder lead time and the delays (seconds) after
+# which unstarted sessions become no_show and running ones completed.
+
+SESSION_SCHEDULER = {
+    'REMINDER_LEAD': 3600,
+    'NO_SHOW_AFTER': 1800,
+    'COMPLETE_AFTER': 900,
+    'HORIZON': 3600,
+    'RELOAD_INTERVAL': 60,
+    'BATCH_SIZE': 500,
+}
+
+
+# Expiry of pending requests
+# manage.py expire_stale moves pending exchange requests and bookings older
+# than these many days (and bookings whose proposed time has passed) to expired.
+
+PENDING_EXPIRY = {
+    'EXCHANGE_REQUEST_DAYS': 14,
+    'BOOKING_DAYS': 7,
+    'BATCH_SIZE': 1000,
+}
+
+
+# Notification retention
+# manage.py prune_notifications: read notifications older than READ_DAYS and
+# anything beyond MAX_PER_USER per user leave the hot table. ARCHIVE is
+# 'table' (ArchivedNotification), 'jsonl' (gzipped files in ARCHIVE_DIR)
+# or None to delete.
+
+NOTIFICATION_RETENTION = {
+    'READ_DAYS': 30,
+    'UNREAD_DAYS': None,
+    'MAX_PER_USER': 500,
+    'ARCHIVE': 'table',
+    'ARCHIVE_DIR': BASE_DIR / 'archive',
+    'BATCH_SIZE': 500,
+}
+
+
+# Exchange archive
+# manage.py archive_exchanges moves closed requests, sessions and bookings
+# older than DAYS into the history tables read by the /history/ endpoints.
+
+EXCHANGE_ARCHIVE = {
+    'DAYS': 90,
+    'BATCH_SIZE': 500,
+}
+
+
+# Trending
+# Hourly activity buckets behind /skills/trending/ and /offers/trending/,
+# filled by the outbox consumer; manage.py prune_trending drops those
+# older than KEEP_DAYS. With SKETCH a target only gets a bucket once its
+# count-min estimate for the hour (kept in the cache) reaches
+# SKETCH_THRESHOLD.
+
+TRENDING = {
+    'KEEP_DAYS': 8,
+    'SKETCH': False,
+    'SKETCH_WIDTH': 2048,
+    'SKETCH_DEPTH': 4,
+    'SKETCH_THRESHOLD': 3,
+    'BATCH_SIZE': 1000,
+}
+
+
+# Outbox
+# Changes to exchange, session, booking, feedback, rating and wanted-skill
+# rows are recorded in OutboxEvent and applied to the read models by
+# manage.py consume_outbox. Events younger than SETTLE_SECONDS wait for
+# transactions still in flight; consumed events are kept KEEP_DAYS.
+
+OUTBOX = {
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 1.0,
+    'SETTLE_SECONDS': 2,
+    'KEEP_DAYS': 7,
+}
+
+
+# Admin
+# Changelists of LargeTableAdmin count exactly up to this many rows and
+# show an estimate above it.
+
+ADMIN_EXACT_COUNT_LIMIT = 10000
@@ -0,0 +1,74 @@
+"""
+Streaming JSON responses for large list endpoints.
+
+Instead of materializing the whole queryset and the full serialized list,
+rows are pulled from the database with ``.iterator(chunk_size=...)``,
+serialized one chunk at a time and written out as pieces of a JSON array
+through ``StreamingHttpResponse``.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def get_chunk_size():
+    return getattr(settings, 'STREAMING_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def iter_json_array(queryset, serializer_class, context=None, chunk_size=None):
+    """Yield a JSON array of serialized rows piece by piece"""
+    chunk_size = chunk_size or get_chunk_size()
+    encoder = JSONEncoder()
+    rows = queryset.iterator(chunk_size=chunk_size)
+
+    yield '['
+    first = True
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+
+        data = serializer_class(batch, many=True, context=context).data
+        pieces = [encoder.encode(item) for item in data]
+        if first:
+            first = False
+            yield ','.join(pieces)
+        else:
+            yield ',' + ','.join(pieces)
+    yield ']'
+
+
+def stream_queryset(queryset, serializer_class, context=None, chunk_size=None):
+    """Return a StreamingHttpResponse writing the queryset as a JSON array"""
+    # Pin the read alias chosen for this request; rows are fetched later
+    queryset = queryset.using(queryset.db)
+    response = StreamingHttpResponse(
+        iter_json_array(queryset, serializer_class, context, chunk_size),
+        content_type='application/json'
+    )
+    response['X-Content-Streamed'] = 'true'
+    return response
+
+
+class StreamingListMixin:
+    """
+    Mixin for viewsets whose list-style actions should stream their output.
+
+    Use ``self.stream(queryset)`` in place of serializing with ``many=True``
+    and returning a ``Response``.
+    """
+    streaming_chunk_size = None
+
+    def stream(self, queryset, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        return stream_queryset(
+            queryset,
+            serializer_class,
+            context=self.get_serializer_context(),
+            chunk_size=self.streaming_chunk_size
+        )
@@ -0,0 +1,436 @@
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db.utils import ConnectionHandler, OperationalError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import serializers, viewsets
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import Skill, SkillCategory, UserRating
+from skills.models import ExchangeRequest
+
+from . import metrics, outbox, profiling, routers, throttling
+from .admin_utils import CURSOR_VAR, display_relations
+from .db import sqlite_databases
+from .streaming import StreamingListMixin, iter_json_array
+
+
+class SqliteProfileTests(SimpleTestCase):
+    # The aliases under test share their names with the project's, but
+    # live in a ConnectionHandler of their own on a temporary file
+    databases = {'default'}
+
+    def connections(self, profile):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        handler = ConnectionHandler(sqlite_databases(os.path.join(tmpdir, 'db.sqlite3'), profile))
+        self.addCleanup(handler.close_all)
+        return handler
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_production_aliases(self):
+        handler = self.connections('production')
+        writer, reader = handler['default'], handler['read']
+
+        self.assertEqual(self.pragma(writer, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(writer, 'query_only'), 0)
+        self.assertEqual(writer.transaction_mode, 'IMMEDIATE')
+        self.assertEqual(self.pragma(reader, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(reader, 'query_only'), 1)
+        with self.assertRaises(OperationalError):
+            with reader.cursor() as cursor:
+                cursor.execute('CREATE TABLE t (id integer)')
+
+    def test_development_profile_is_the_default_configuration(self):
+        handler = self.connections('development')
+
+        self.assertEqual(list(handler.settings), ['default'])
+        self.assertEqual(self.pragma(handler['default'], 'journal_mode'), 'delete')
+        self.assertIsNone(handler['default'].transaction_mode)
+
+
+def replica_view(streaming):
+    def view(request):
+        if streaming:
+            return StreamingHttpResponse(routers._replica_alias.get() for _ in range(2))
+        return HttpResponse(routers._replica_alias.get())
+    view.read_from_replica = True
+    return view
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+
+    def call(self, view):
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = routers.ReplicaRoutingMiddleware(get_response)
+        return middleware(RequestFactory().get('/'))
+
+    def test_streamed_body_reads_from_the_replica(self):
+        response = self.call(replica_view(streaming=True))
+
+        self.assertEqual(b''.join(response), b'defaultdefault')
+        response.close()
+        self.assertIsNone(routers._replica_alias.get())
+
+    def test_selection_ends_with_a_regular_response(self):
+        response = self.call(replica_view(streaming=False))
+
+        self.assertEqual(response.content, b'default')
+        self.assertIsNone(routers._replica_alias.get())
+
+
+class SearchView:
+    throttle_scope = 'search'
+    throttle_cost = 2
+
+
+class OtherSearchView(SearchView):
+    pass
+
+
+@override_settings(TOKEN_BUCKETS={'search': {'capacity': 3, 'refill_per_second': 1.0}})
+class TokenBucketTests(SimpleTestCase):
+
+    def test_spends_and_refills_tokens(self):
+        store = throttling.MemoryBucketStore()
+        self.assertEqual(store.consume('k', 3, 1.0, 2, now=100.0), (True, 1.0))
+        self.assertEqual(store.consume('k', 3, 1.0, 2, now=100.5), (False, 1.5))
+        self.assertEqual(store.consume('k', 3, 1.0, 2, now=101.0), (True, 0.0))
+
+    def allow(self, store, view=SearchView):
+        throttling._store = store
+        self.addCleanup(setattr, throttling, '_store', None)
+        request = Request(RequestFactory().get('/'))
+        request.user = AnonymousUser()
+        throttle = throttling.TokenBucketThrottle()
+        return throttle.allow_request(request, view()), throttle
+
+    def test_each_view_class_has_its_own_bucket(self):
+        store = throttling.MemoryBucketStore()
+        self.assertTrue(self.allow(store)[0])
+        self.assertFalse(self.allow(store)[0])
+        self.assertTrue(self.allow(store, OtherSearchView)[0])
+
+    def store_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return os.path.join(directory, 'buckets.sqlite3')
+
+    def test_sqlite_store_is_shared_between_connections(self):
+        path = self.store_path()
+        allowed, _ = self.allow(throttling.SQLiteBucketStore(path))
+        self.assertTrue(allowed)
+        allowed, throttle = self.allow(throttling.SQLiteBucketStore(path))
+        self.assertFalse(allowed)
+        self.assertGreater(throttle.wait(), 0)
+
+    def test_locked_store_fails_open(self):
+        path = self.store_path()
+        store = throttling.SQLiteBucketStore(path, timeout=0.05)
+        store.connection()
+        holder = sqlite3.connect(path, isolation_level=None)
+        holder.execute('BEGIN IMMEDIATE')
+        self.addCleanup(holder.close)
+
+        with self.assertLogs('SkillExchange.throttling', 'WARNING'):
+            allowed, throttle = self.allow(store)
+        self.assertTrue(allowed)
+        self.assertEqual(throttle.wait(), 0)
+
+    def test_default_store_is_per_checkout(self):
+        with self.settings(BASE_DIR='/srv/one'):
+            one = throttling.default_store_path()
+        with self.settings(BASE_DIR='/srv/two'):
+            two = throttling.default_store_path()
+        self.assertNotEqual(one, two)
+
+
+class ProfilingHeaderTests(SimpleTestCase):
+
+    def profiled(self, debug=False, **headers):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        config = {'ENABLED': True, 'SAMPLE_RATE': 0, 'SECRET': 's3cret', 'OUTPUT_DIR': output_dir}
+        with self.settings(DEBUG=debug, REQUEST_PROFILING=config):
+            middleware = profiling.SamplingProfilerMiddleware(lambda request: HttpResponse())
+            response = middleware(RequestFactory().get('/', headers=headers))
+        return 'X-Profiled-View' in response
+
+    def test_header_needs_the_secret(self):
+        self.assertFalse(self.profiled())
+        self.assertFalse(self.profiled(X_Profile='1'))
+        self.assertTrue(self.profiled(X_Profile='s3cret'))
+
+    def test_any_header_value_while_debugging(self):
+        self.assertTrue(self.profiled(debug=True, X_Profile='1'))
+
+
+class MetricsFlushTests(SimpleTestCase):
+
+    def test_concurrent_flushes_do_not_race(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = metrics.Registry()
+        errors = []
+
+        def record():
+            try:
+                for _ in range(50):
+                    registry.inc('test_events_total')
+            except Exception as exc:
+                errors.append(exc)
+
+        with self.settings(METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=0):
+            threads = [threading.Thread(target=record) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            registry.flush()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(directory), [f'metrics-{os.getpid()}.json'])
+
+    def test_write_errors_do_not_reach_the_caller(self):
+        unwritable = tempfile.NamedTemporaryFile()
+        self.addCleanup(unwritable.close)
+        registry = metrics.Registry()
+        with self.settings(METRICS_DIR=os.path.join(unwritable.name, 'sub'), METRICS_FLUSH_INTERVAL=0):
+            with self.assertLogs('SkillExchange.metrics', 'WARNING'):
+                registry.inc('test_events_total')
+        self.assertEqual(registry.counters[('test_events_total', ())], 1)
+
+
+@override_settings(OUTBOX={'SETTLE_SECONDS': 0})
+class OutboxConsumerTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.ann = User.objects.create(email='ann@example.com', username='ann')
+        self.bob = User.objects.create(email='bob@example.com', username='bob')
+        self.seen = []
+        handlers = mock.patch.dict(outbox.HANDLERS, {'accounts.UserRating': [self.seen.append]}, clear=True)
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def rate(self, rating):
+        return UserRating.objects.create(rated_user=self.ann, rated_by=self.bob, rating=rating)
+
+    def test_events_are_applied_once_in_order(self):
+        rating = self.rate(3)
+        rating.rating = 4
+        rating.save()
+        rating.delete()
+
+        self.assertEqual(outbox.consume('test', batch_size=2), 2)
+        self.assertEqual(outbox.consume('test', batch_size=2), 1)
+        self.assertEqual(outbox.consume('test'), 0)
+        actions = [[event.action for event in events] for events in self.seen]
+        self.assertEqual(actions, [['created', 'updated'], ['deleted']])
+        self.assertEqual(self.seen[0][1].previous['rating'], 3)
+
+    def test_failing_handler_keeps_the_checkpoint(self):
+        self.rate(3)
+        with mock.patch.dict(outbox.HANDLERS, {'accounts.UserRating': [mock.Mock(side_effect=RuntimeError)]}):
+            with self.assertRaises(RuntimeError):
+                outbox.consume('test')
+
+        self.assertEqual(outbox.consume('test'), 1)
+        self.assertEqual(len(self.seen), 1)
+
+    @override_settings(OUTBOX={'SETTLE_SECONDS': 60})
+    def test_recent_events_wait_to_settle(self):
+        self.rate(3)
+        self.assertEqual(outbox.consume('test'), 0)
+        self.assertEqual(outbox.consume('test', now=timezone.now() + timedelta(minutes=2)), 1)
+
+    def test_prune_keeps_events_a_consumer_has_not_read(self):
+        self.rate(3)
+        later = timezone.now() + timedelta(days=30)
+        outbox.set_checkpoint('other', 0)
+        outbox.consume('test')
+
+        self.assertEqual(outbox.prune(now=later), 0)
+        outbox.consume('other')
+        self.assertEqual(outbox.prune(now=later), 1)
+
+
+class LargeTableAdminTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin_user = User.objects.create(
+            email='admin@example.com', username='admin', is_superuser=True, is_staff=True
+        )
+        ann = User.objects.create(email='ann@example.com', username='ann')
+        bob = User.objects.create(email='bob@example.com', username='bob')
+        skill = Skill.objects.create(name='Guitar', category=SkillCategory.objects.create(name='Music'))
+        now = timezone.now()
+        self.requests = []
+        for minutes in range(5):
+            request = ExchangeRequest.objects.create(
+                requester=ann, receiver=bob, skill_offered=skill, skill_requested=skill, message='Hi'
+            )
+            # Two rows share a timestamp, so the pk has to break the tie
+            ExchangeRequest.objects.filter(pk=request.pk).update(created_at=now - timedelta(minutes=minutes // 2))
+            self.requests.append(request)
+        self.model_admin = admin.site._registry[ExchangeRequest]
+        per_page = mock.patch.object(self.model_admin, 'list_per_page', 2)
+        per_page.start()
+        self.addCleanup(per_page.stop)
+
+    def changelist(self, **params):
+        request = RequestFactory().get('/admin/skills/exchangerequest/', params)
+        request.user = self.admin_user
+        return self.model_admin.get_changelist_instance(request)
+
+    def test_select_related_is_derived_from_display_methods(self):
+        self.assertEqual(
+            display_relations(self.model_admin, self.model_admin.list_display),
+            ['receiver', 'requester', 'skill_offered', 'skill_requested']
+        )
+
+    def test_cursor_continues_without_overlap(self):
+        seen = []
+        cursor = None
+        while True:
+            changelist = self.changelist(**({CURSOR_VAR: cursor} if cursor else {}))
+            self.assertTrue(changelist.keyset)
+            seen.extend(row.pk for row in changelist.result_list)
+            cursor = changelist.next_cursor
+            if cursor is None:
+                break
+
+        expected = ExchangeRequest.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=2)
+    def test_count_is_capped_above_the_limit(self):
+        paginator = self.changelist(status='pending').paginator
+        self.assertEqual((paginator.count, paginator.estimated, paginator.lower_bound), (3, True, True))
+
+        paginator = self.changelist().paginator
+        self.assertTrue(paginator.estimated)
+        self.assertFalse(paginator.lower_bound)
+
+    def test_malformed_cursor_is_rejected(self):
+        for cursor in ('garbage', 'not-a-date|1'):
+            with self.assertRaises(IncorrectLookupParameters):
+                self.changelist(**{CURSOR_VAR: cursor})
+
+
+def dead_pid():
+    return next(pid for pid in itertools.count(4_000_000) if not metrics._process_alive(pid))
+
+
+class MetricsCollectTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = self.settings(METRICS_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write_worker(self, pid, count):
+        metrics.write_snapshot(os.path.join(self.directory, f'metrics-{pid}.json'), {
+            'counters': [['test_events_total', [], count]],
+            'histograms': [],
+            'gauges': [['test_pending', [], 7]],
+        })
+
+    def collect(self):
+        counters, _, gauges = metrics.collect()
+        return counters.get(('test_events_total', ()), 0), gauges.get('test_pending')
+
+    def test_exited_worker_counters_are_kept(self):
+        self.write_worker(dead_pid(), 5)
+        self.assertEqual(self.collect(), (5, None))
+
+        self.write_worker(dead_pid(), 2)
+        self.assertEqual(self.collect(), (7, None))
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory) if name.endswith('.json')),
+            [metrics.ARCHIVE_NAME, f'metrics-{os.getpid()}.json']
+        )
+        with open(os.path.join(self.directory, metrics.ARCHIVE_NAME)) as archive:
+            self.assertEqual(json.load(archive)['counters'], [['test_events_total', [], 7]])
+
+    def test_missing_directory_renders_empty(self):
+        shutil.rmtree(self.directory)
+        with mock.patch.object(metrics.registry, 'flush'):
+            self.assertEqual(metrics.render(), '\n')
+        os.makedirs(self.directory)
+
+
+class UsernameSerializer(serializers.Serializer):
+    username = serializers.CharField()
+
+
+class UserStreamViewSet(StreamingListMixin, viewsets.GenericViewSet):
+    serializer_class = UsernameSerializer
+    streaming_chunk_size = 2
+
+    def list(self, request):
+        return self.stream(get_user_model().objects.order_by('username'))
+
+
+class StreamingTests(TestCase):
+
+    def make_users(self, count):
+        get_user_model().objects.bulk_create(
+            get_user_model()(email=f'u{n}@example.com', username=f'u{n}') for n in range(count)
+        )
+
+    def streamed(self, chunk_size):
+        users = get_user_model().objects.order_by('username')
+        pieces = list(iter_json_array(users, UsernameSerializer, chunk_size=chunk_size))
+        return pieces, json.loads(''.join(pieces))
+
+    def test_empty_result(self):
+        self.assertEqual(self.streamed(2), (['[', ']'], []))
+
+    def test_single_chunk(self):
+        self.make_users(2)
+        pieces, data = self.streamed(5)
+        self.assertEqual(len(pieces), 3)
+        self.assertEqual(data, [{'username': 'u0'}, {'username': 'u1'}])
+
+    def test_several_chunks(self):
+        self.make_users(5)
+        pieces, data = self.streamed(2)
+        self.assertEqual(len(pieces), 5)
+        self.assertEqual([item['username'] for item in data], ['u0', 'u1', 'u2', 'u3', 'u4'])
+
+    @override_settings(THROTTLE_STORE={'BACKEND': 'memory'})
+    def test_viewset_stream(self):
+        self.addCleanup(setattr, throttling, '_store', None)
+        self.make_users(3)
+        request = APIRequestFactory().get('/users/')
+        force_authenticate(request, get_user_model().objects.first())
+        response = UserStreamViewSet.as_view({'get': 'list'})(request)
+
+        self.assertEqual(response['X-Content-Streamed'], 'true')
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 3)
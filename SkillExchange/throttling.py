@@ -0,0 +1,191 @@
+"""
+Token bucket rate limiting for the API.
+
+Every (view class, client) pair owns a bucket of ``capacity`` tokens
+that refills at ``refill_per_second``, so one busy endpoint does not use
+up a client's quota for the others. A request spends as many tokens as
+the view says it costs: ``throttle_cost`` on the view, optionally
+overridden per action through ``throttle_costs``. ``throttle_scope`` only
+picks the capacity and refill rate, configured in
+``settings.TOKEN_BUCKETS``.
+
+Buckets live in a small SQLite file, by default on /dev/shm, so they stay
+in memory and are shared by all worker processes on the host. The default
+file name includes a hash of BASE_DIR, so deployments and test runs of
+other checkouts on the same host get their own buckets. Each consume is
+one BEGIN IMMEDIATE transaction, so concurrent workers cannot both spend
+the last token. If the store stays locked past its timeout (or is
+otherwise unusable) the request is let through and the error logged:
+rate limiting fails open rather than turning every request into a 500.
+
+Throttled responses get DRF's usual 429 and Retry-After header, and
+RateLimitHeadersMiddleware adds X-RateLimit-Limit and
+X-RateLimit-Remaining to every throttled-view response.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKET = {'capacity': 120, 'refill_per_second': 2.0}
+
+
+def default_store_path():
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    project = hashlib.sha1(str(settings.BASE_DIR).encode()).hexdigest()[:12]
+    return os.path.join(directory, f'skillexchange-throttle-{project}.sqlite3')
+
+
+class MemoryBucketStore:
+    """Per-process bucket store, for tests and single-process servers"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_per_second, cost, now):
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+        return allowed, tokens
+
+
+class SQLiteBucketStore:
+    """Bucket store in a SQLite file shared by the workers on one host"""
+
+    def __init__(self, path, timeout=5):
+        self.path = str(path)
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS bucket '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self.local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, refill_per_second, cost, now):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated FROM bucket WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(now - updated, 0) * refill_per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                'INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, tokens
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'THROTTLE_STORE', {})
+                if config.get('BACKEND') == 'memory':
+                    _store = MemoryBucketStore()
+                else:
+                    _store = SQLiteBucketStore(
+                        config.get('PATH') or default_store_path(), config.get('TIMEOUT', 5)
+                    )
+    return _store
+
+
+def get_view_cost(view):
+    """Tokens a request to ``view`` costs, per action where declared"""
+    action = getattr(view, 'action', None)
+    costs = getattr(view, 'throttle_costs', {})
+    if action in costs:
+        return costs[action]
+    return getattr(view, 'throttle_cost', 1)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket throttle keyed by user (or client IP) and view class"""
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None) or 'default'
+        buckets = getattr(settings, 'TOKEN_BUCKETS', {})
+        config = buckets.get(scope) or buckets.get('default') or DEFAULT_BUCKET
+        capacity = config['capacity']
+        refill_per_second = config['refill_per_second']
+        cost = get_view_cost(view)
+
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        endpoint = f'{type(view).__module__}.{type(view).__qualname__}'
+
+        try:
+            allowed, tokens = get_store().consume(
+                f'{endpoint}:{ident}', capacity, refill_per_second, cost, time.time()
+            )
+        except sqlite3.Error:
+            # Busy or broken store: fail open, a 500 on every request is worse
+            logger.warning('Token bucket store unavailable, not throttling', exc_info=True)
+            self.wait_seconds = 0
+            return True
+
+        self.wait_seconds = 0 if allowed else (cost - tokens) / refill_per_second
+        request._request.rate_limit = {
+            'limit': capacity,
+            'remaining': int(tokens),
+            'cost': cost,
+        }
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class RateLimitHeadersMiddleware:
+    """Expose the remaining quota set by TokenBucketThrottle as response headers"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            response['X-RateLimit-Limit'] = rate_limit['limit']
+            response['X-RateLimit-Remaining'] = rate_limit['remaining']
+            response['X-RateLimit-Cost'] = rate_limit['cost']
+        return response
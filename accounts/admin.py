@@ -1,8 +1,11 @@
 from django.contrib import admin
+
+from SkillExchange.admin_utils import LargeTableAdmin
 from .models import (
     User,
     SkillCategory,
     Skill,
+    SkillAlias,
     UserSkill,
     SkillWanted,
     UserRating
@@ -13,7 +16,7 @@ from .models import (
 # Custom User Admin
 # ==============================
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = (
         'email',
         'username',
@@ -25,7 +28,7 @@ class UserAdmin(admin.ModelAdmin):
         'is_email_verified',
         'updated_at',
     )
-    search_fields = ('email', 'username', 'first_name', 'last_name')
+    search_fields = ('=email', '=username', '^first_name', '^last_name')
     list_filter = ('is_active', 'is_staff', 'is_superuser', 'is_email_verified')
     ordering = ('-updated_at',)
 
@@ -35,7 +38,8 @@ class UserAdmin(admin.ModelAdmin):
 # ==============================
 @admin.register(SkillCategory)
 class SkillCategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description', 'icon')
+    list_display = ('name', 'parent', 'description', 'icon', 'subtree_skill_count')
+    list_select_related = ('parent',)
     search_fields = ('name',)
     ordering = ('name',)
 
@@ -51,11 +55,22 @@ class SkillAdmin(admin.ModelAdmin):
     ordering = ('category', 'name')
 
 
+# ==============================
+# Skill Alias Admin
+# ==============================
+@admin.register(SkillAlias)
+class SkillAliasAdmin(admin.ModelAdmin):
+    list_display = ('alias', 'skill', 'created_at')
+    search_fields = ('alias', 'skill__name')
+    raw_id_fields = ('skill',)
+    ordering = ('alias',)
+
+
 # ==============================
 # User Skill Admin
 # ==============================
 @admin.register(UserSkill)
-class UserSkillAdmin(admin.ModelAdmin):
+class UserSkillAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'skill',
@@ -64,7 +79,7 @@ class UserSkillAdmin(admin.ModelAdmin):
         'can_teach',
         'created_at',
     )
-    search_fields = ('user__email', 'skill__name')
+    search_fields = ('=user__email', '^skill__name')
     list_filter = ('proficiency_level', 'can_teach')
     ordering = ('-years_of_experience',)
 
@@ -73,14 +88,14 @@ class UserSkillAdmin(admin.ModelAdmin):
 # Skill Wanted Admin
 # ==============================
 @admin.register(SkillWanted)
-class SkillWantedAdmin(admin.ModelAdmin):
+class SkillWantedAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'skill',
         'priority',
         'created_at',
     )
-    search_fields = ('user__email', 'skill__name')
+    search_fields = ('=user__email', '^skill__name')
     list_filter = ('priority',)
     ordering = ('-priority',)
 
@@ -89,7 +104,7 @@ class SkillWantedAdmin(admin.ModelAdmin):
 # User Rating Admin
 # ==============================
 @admin.register(UserRating)
-class UserRatingAdmin(admin.ModelAdmin):
+class UserRatingAdmin(LargeTableAdmin):
     list_display = (
         'rated_user',
         'rated_by',
@@ -97,6 +112,6 @@ class UserRatingAdmin(admin.ModelAdmin):
         'Skill',
         'created_at',
     )
-    search_fields = ('rated_user__email', 'rated_by__email')
+    search_fields = ('=rated_user__email', '=rated_by__email')
     list_filter = ('rating',)
     ordering = ('-created_at',)
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AccountsConfig(AppConfig):
@@ -8,5 +9,8 @@ class AccountsConfig(AppConfig):
     verbose_name = 'User Accounts & Skills'
     
     def ready(self):
-        # Import signals here if needed
-        pass
\ No newline at end of file
+        from . import synonyms, taxonomy
+
+        # Rows created before the closure table and normalized names are filled in after migrate
+        post_migrate.connect(taxonomy.backfill_category_tree, sender=self)
+        post_migrate.connect(synonyms.backfill_skill_names, sender=self)
\ No newline at end of file
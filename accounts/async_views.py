@@ -0,0 +1,169 @@
+"""
+Async variants of the read-heavy account endpoints.
+
+These are plain Django async views built on the async ORM, meant to be
+served through SkillExchange/asgi.py. They return the same fields as their
+DRF counterparts and read through the async ORM, so a single ASGI worker
+can keep many polling clients in flight.
+
+Authentication and throttling are DRF's: the request goes through
+``DEFAULT_AUTHENTICATION_CLASSES`` and ``DEFAULT_THROTTLE_CLASSES`` with the
+view's ``throttle_scope`` and ``throttle_cost``, exactly like the sync
+endpoints. Independent queries of a view (the stats counts) are awaited
+together with ``asyncio.gather``.
+"""
+import asyncio
+import math
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count, F, Q
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotAuthenticated, Throttled
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import images
+from .models import UserSkill, SkillWanted, UserRating
+from .views import search_users, with_rating_summary
+
+User = get_user_model()
+
+PROFILE_FIELDS = [
+    'id', 'username', 'email', 'first_name', 'last_name', 'bio',
+    'profile_picture', 'location', 'latitude', 'longitude', 'phone_number',
+    'date_of_birth', 'is_email_verified', 'created_at', 'updated_at',
+]
+
+
+def error_response(exc):
+    response = JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = str(math.ceil(exc.wait))
+    return response
+
+
+class AsyncAuthenticatedView(View):
+    """
+    Base class for async read views that require a logged in user.
+
+    Subclasses answer GET in ``get_authenticated(request, user, **kwargs)``.
+    """
+    http_method_names = ['get', 'options']
+    throttle_scope = None
+    throttle_cost = 1
+
+    def check_request(self, request):
+        """Authenticate and throttle like a DRF view, returning the user"""
+        drf_request = Request(
+            request,
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        )
+        user = drf_request.user
+        if not user.is_authenticated:
+            raise NotAuthenticated()
+        for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+            throttle = throttle_class()
+            if not throttle.allow_request(drf_request, self):
+                raise Throttled(throttle.wait())
+        return user
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            user = await sync_to_async(self.check_request)(request)
+        except APIException as exc:
+            return error_response(exc)
+        return await self.get_authenticated(request, user, *args, **kwargs)
+
+
+def profile_payload(row, picture_size):
+    """Shape a ``values()`` row like UserProfileSerializer output"""
+    row = dict(row)
+    row['full_name'] = f"{row['first_name']} {row['last_name']}".strip()
+    row['profile_picture'] = images.picture_url(row.get('profile_picture'), picture_size)
+    if row.get('average_rating') is not None:
+        row['average_rating'] = round(row['average_rating'], 2)
+    return row
+
+
+async def rating_summary(user_id):
+    return await UserRating.objects.filter(rated_user_id=user_id).aaggregate(
+        average_rating=Avg('rating'),
+        total_ratings=Count('id'),
+    )
+
+
+class AsyncUserProfileView(AsyncAuthenticatedView):
+    """Async view for the current user's profile"""
+
+    async def get_authenticated(self, request, user):
+        row = await User.objects.filter(pk=user.pk).values(*PROFILE_FIELDS).aget()
+        row.update(await rating_summary(user.pk))
+        return JsonResponse(profile_payload(row, images.requested_size(request)))
+
+
+class AsyncUserStatsView(AsyncAuthenticatedView):
+    """Async view for user statistics"""
+    throttle_cost = 3
+
+    async def get_authenticated(self, request, user, user_id=None):
+        if user_id:
+            if not await User.objects.filter(pk=user_id).aexists():
+                return JsonResponse({'error': 'User not found'}, status=404)
+        else:
+            user_id = user.pk
+
+        skills, skills_wanted, ratings, ratings_given = await asyncio.gather(
+            UserSkill.objects.filter(user_id=user_id).aaggregate(
+                total=Count('id'),
+                teachable=Count('id', filter=Q(can_teach=True)),
+            ),
+            SkillWanted.objects.filter(user_id=user_id).acount(),
+            rating_summary(user_id),
+            UserRating.objects.filter(rated_by_id=user_id).acount(),
+        )
+
+        return JsonResponse({
+            'total_skills': skills['total'],
+            'teachable_skills': skills['teachable'],
+            'skills_wanted': skills_wanted,
+            'average_rating': ratings['average_rating'],
+            'total_ratings': ratings['total_ratings'],
+            'ratings_given': ratings_given,
+        })
+
+
+class AsyncSearchUsersView(AsyncAuthenticatedView):
+    """Async view for searching users, same parameters as SearchUsersView"""
+    throttle_scope = 'search'
+    throttle_cost = 5
+
+    async def get_authenticated(self, request, user):
+        users = with_rating_summary(search_users(request.GET)).values(
+            *PROFILE_FIELDS, 'average_rating', 'total_ratings'
+        )
+
+        picture_size = images.requested_size(request)
+        results = [profile_payload(row, picture_size) async for row in users]
+        return JsonResponse(results, safe=False)
+
+
+class AsyncFindMatchesView(AsyncAuthenticatedView):
+    """Async view for users who can teach what the current user wants to learn"""
+    throttle_cost = 10
+
+    async def get_authenticated(self, request, user):
+        wanted_skill_ids = SkillWanted.objects.filter(user=user).values('skill_id')
+        matches = UserSkill.objects.filter(
+            skill_id__in=wanted_skill_ids,
+            can_teach=True
+        ).exclude(user=user).values(
+            'id', 'user', 'skill', 'proficiency_level', 'years_of_experience',
+            'can_teach', 'description', 'created_at', 'updated_at',
+            skill_name=F('skill__name'),
+            category_name=F('skill__category__name'),
+        )
+
+        results = [row async for row in matches]
+        return JsonResponse(results, safe=False)
@@ -0,0 +1,37 @@
+from django_filters import rest_framework as django_filters
+from django_filters.constants import EMPTY_VALUES
+
+from .models import Skill, UserSkill, SkillWanted
+
+
+class CategorySubtreeFilter(django_filters.NumberFilter):
+    """Match a category and all of its subcategories through the closure table"""
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return qs.filter(**{f'{self.field_name}__ancestor_links__ancestor_id': value})
+
+
+class SkillFilter(django_filters.FilterSet):
+    category = CategorySubtreeFilter(field_name='category')
+
+    class Meta:
+        model = Skill
+        fields = ['category']
+
+
+class UserSkillFilter(django_filters.FilterSet):
+    skill__category = CategorySubtreeFilter(field_name='skill__category')
+
+    class Meta:
+        model = UserSkill
+        fields = ['proficiency_level', 'can_teach', 'skill__category']
+
+
+class SkillWantedFilter(django_filters.FilterSet):
+    skill__category = CategorySubtreeFilter(field_name='skill__category')
+
+    class Meta:
+        model = SkillWanted
+        fields = ['priority', 'skill__category']
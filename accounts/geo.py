@@ -0,0 +1,221 @@
+"""
+Geohash based proximity search.
+
+Coordinates are stored next to a geohash string with a B-tree index. A
+radius query picks the finest geohash precision for which a block of at
+most 5x5 cells around the centre covers the whole circle. Each cell
+becomes an index range scan (``geohash >= prefix AND geohash < prefix +
+'~'``). Candidates are then
+filtered and ordered by their exact haversine distance. k-nearest
+queries widen the block one precision level at a time until it holds k
+points that are guaranteed to be the closest.
+
+No GIS extension is needed, so this works on SQLite as well as on
+PostgreSQL.
+"""
+import heapq
+import math
+
+from django.db.models import Q
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+MAX_PRECISION = 9
+MAX_RINGS = 2
+EARTH_RADIUS_KM = 6371.0088
+# Length of one degree of latitude on the same sphere as haversine_km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=MAX_PRECISION):
+    """Return the geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lng_range[0] = mid
+            else:
+                value <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return (lat degrees, lng degrees) spanned by a cell at ``precision``"""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def cell_radius_km(precision, latitude):
+    """Smallest distance from a cell to the far edge of its neighbours"""
+    lat_deg, lng_deg = cell_size(precision)
+    height = lat_deg * KM_PER_DEGREE
+    width = lng_deg * KM_PER_DEGREE * math.cos(math.radians(latitude))
+    return min(height, width)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_for_radius(radius_km, latitude):
+    """
+    Finest (precision, rings) whose block of cells covers ``radius_km``.
+
+    ``rings`` is how many rings of neighbours surround the centre cell.
+    Returns None when even the coarsest cells are too small.
+    """
+    # Cells narrow towards the poles, so size them at the block's poleward
+    # edge. A circle reaching a pole spans every longitude and gets None.
+    edge_latitude = abs(latitude) + radius_km / KM_PER_DEGREE
+    if edge_latitude >= 90.0:
+        return None
+    for precision in range(MAX_PRECISION, 0, -1):
+        rings = math.ceil(radius_km / cell_radius_km(precision, edge_latitude)) if radius_km else 1
+        if rings <= MAX_RINGS:
+            return precision, max(rings, 1)
+    return None
+
+
+def covering_cells(latitude, longitude, precision, rings=1):
+    """The cell containing the point and ``rings`` rings of neighbours"""
+    lat_deg, lng_deg = cell_size(precision)
+    steps = range(-rings, rings + 1)
+    cells = set()
+    for lat_step in steps:
+        lat = latitude + lat_step * lat_deg
+        if lat > 90.0 or lat < -90.0:
+            continue
+        for lng_step in steps:
+            lng = (longitude + lng_step * lng_deg + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lng, precision))
+    return cells
+
+
+def cells_filter(cells, field='geohash'):
+    """Q object matching rows whose geohash falls in any of ``cells``"""
+    condition = Q()
+    for prefix in sorted(cells):
+        condition |= Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '~'})
+    return condition
+
+
+def _with_distances(candidates, latitude, longitude):
+    for obj in candidates:
+        obj.distance_km = haversine_km(latitude, longitude, obj.latitude, obj.longitude)
+        yield obj
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """Objects within ``radius_km`` of the point, nearest first"""
+    queryset = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+    covering = covering_for_radius(radius_km, latitude)
+    if covering is not None:
+        queryset = queryset.filter(cells_filter(covering_cells(latitude, longitude, *covering)))
+
+    results = [
+        obj for obj in _with_distances(queryset.iterator(), latitude, longitude)
+        if obj.distance_km <= radius_km
+    ]
+    results.sort(key=lambda obj: obj.distance_km)
+    return results
+
+
+def nearest(queryset, latitude, longitude, k):
+    """The ``k`` objects closest to the point, nearest first"""
+    queryset = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+
+    for precision in range(MAX_PRECISION - 2, 0, -1):
+        covered_km = cell_radius_km(
+            precision, min(abs(latitude) + cell_size(precision)[0], 90.0)
+        )
+        candidates = queryset.filter(
+            cells_filter(covering_cells(latitude, longitude, precision))
+        )
+        closest = heapq.nsmallest(
+            k,
+            _with_distances(candidates.iterator(), latitude, longitude),
+            key=lambda obj: obj.distance_km
+        )
+        # Only points within covered_km are guaranteed to be in the block,
+        # so the answer is final once the k-th point lies inside it.
+        if len(closest) == k and closest[-1].distance_km <= covered_km:
+            return closest
+
+    return heapq.nsmallest(
+        k,
+        _with_distances(queryset.iterator(), latitude, longitude),
+        key=lambda obj: obj.distance_km
+    )
+
+
+def parse_point(params):
+    """Read ``lat``/``lng`` query parameters, returning None if absent or invalid"""
+    try:
+        latitude = float(params['lat'])
+        longitude = float(params['lng'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return None
+    return latitude, longitude
+
+
+def search(queryset, params, default_radius_km=20.0):
+    """
+    Apply a proximity search from query parameters.
+
+    ``lat`` and ``lng`` give the point, then either ``k`` (k-nearest) or
+    ``radius_km`` (defaults to ``default_radius_km``). Returns None when no
+    valid point was given.
+    """
+    point = parse_point(params)
+    if point is None:
+        return None
+
+    k = params.get('k')
+    if k:
+        try:
+            return nearest(queryset, *point, k=max(1, min(int(k), 100)))
+        except ValueError:
+            pass
+
+    try:
+        radius_km = float(params.get('radius_km', default_radius_km))
+    except ValueError:
+        radius_km = default_radius_km
+    return within_radius(queryset, *point, radius_km=max(0.0, min(radius_km, 500.0)))
@@ -0,0 +1,188 @@
+"""
+Password validation and hashing offloaded to a bounded process pool.
+
+Hashing is deliberately CPU-expensive, so running it on the request thread
+holds the GIL and stalls every other thread of the worker. Work is
+submitted to a ``ProcessPoolExecutor`` instead, with a cap on the number of
+outstanding jobs; once the cap is reached new requests are turned away
+with a 429 and a Retry-After header rather than queueing without bound.
+Sync views still wait for their own result, async views await it.
+
+The pool starts its processes with ``spawn``: forking a threaded server
+would copy locks held by other threads and open database connections
+into the children.
+
+Setting ``PASSWORD_HASHING_WORKERS = 0`` runs everything inline, which is
+what tests and benchmarks usually want together with a low
+``PASSWORD_HASH_ITERATIONS``.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import Throttled
+
+from SkillExchange import metrics
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 hasher whose cost can be lowered with settings.PASSWORD_HASH_ITERATIONS"""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
+
+    def must_update(self, encoded):
+        # Only ever upgrade: a lowered setting must not weaken stored hashes on login
+        decoded = self.decode(encoded)
+        return decoded['iterations'] < self.iterations
+
+
+class HashingPoolBusy(Throttled):
+    default_detail = 'Too many password operations in progress, please retry shortly.'
+    default_code = 'hashing_pool_busy'
+
+
+_lock = threading.Lock()
+_executor = None
+_pending = 0
+_completed = 0
+_rejected = 0
+
+
+def _init_worker():
+    django.setup()
+
+
+def _validate_and_hash(password, user_fields):
+    user = get_user_model()(**user_fields) if user_fields else None
+    try:
+        validate_password(password, user)
+    except ValidationError as exc:
+        return list(exc.messages), None
+    return None, make_password(password)
+
+
+def _check(password, encoded):
+    return check_password(password, encoded)
+
+
+def get_worker_count():
+    return getattr(settings, 'PASSWORD_HASHING_WORKERS', 0)
+
+
+def get_max_pending():
+    return getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', 32)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=get_worker_count(),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+    return _executor
+
+
+def _job_done(future):
+    global _pending, _completed
+    with _lock:
+        _pending -= 1
+        _completed += 1
+
+
+def submit(fn, *args):
+    """Run ``fn(*args)`` in the pool and return a Future"""
+    global _pending, _rejected, _completed
+
+    if get_worker_count() <= 0:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        with _lock:
+            _completed += 1
+        return future
+
+    with _lock:
+        if _pending >= get_max_pending():
+            _rejected += 1
+            raise HashingPoolBusy(wait=1)
+        _pending += 1
+
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        with _lock:
+            _pending -= 1
+        raise
+    future.add_done_callback(_job_done)
+    return future
+
+
+def user_fields(user=None, **fields):
+    """Attributes UserAttributeSimilarityValidator compares the password with"""
+    if user is not None:
+        fields = {
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+        }
+    return {
+        key: fields.get(key) or ''
+        for key in ('username', 'email', 'first_name', 'last_name')
+    }
+
+
+def _result(errors, encoded):
+    if errors:
+        raise ValidationError(errors)
+    return encoded
+
+
+def validate_and_hash(password, fields=None):
+    """Validate ``password`` and return its hash, raising ValidationError"""
+    return _result(*submit(_validate_and_hash, password, fields).result())
+
+
+def verify(password, encoded):
+    """Check ``password`` against an encoded hash"""
+    return submit(_check, password, encoded).result()
+
+
+async def avalidate_and_hash(password, fields=None):
+    """Async variant of validate_and_hash for use in async views"""
+    future = submit(_validate_and_hash, password, fields)
+    return _result(*await asyncio.wrap_future(future))
+
+
+async def averify(password, encoded):
+    """Async variant of verify for use in async views"""
+    return await asyncio.wrap_future(submit(_check, password, encoded))
+
+
+def stats():
+    """Queue depth and throughput counters for the hashing pool"""
+    with _lock:
+        return {
+            'workers': get_worker_count(),
+            'max_pending': get_max_pending(),
+            'pending': _pending,
+            'completed': _completed,
+            'rejected': _rejected,
+        }
+
+
+metrics.registry.gauge('password_hashing_pending', lambda: stats()['pending'])
+metrics.registry.gauge('password_hashing_rejected_total', lambda: stats()['rejected'])
@@ -0,0 +1,156 @@
+"""
+Profile picture pipeline.
+
+Uploads are decoded, turned upright from their EXIF orientation and
+re-encoded as JPEG without any metadata (EXIF, GPS, comments), together
+with a square thumbnail per ``PROFILE_PICTURES['SIZES']`` entry. The
+rendering runs in a process pool at upload time, so page views only
+ever serve finished files.
+
+All renditions of an upload share a directory named after the SHA-256 of
+the uploaded bytes::
+
+    profile_pics/<hash>/original.jpg
+    profile_pics/<hash>/96.jpg
+    ...
+
+A name therefore never changes content and can be cached forever, and
+the same picture uploaded twice is stored once. ``User.profile_picture``
+holds the original; serializers return the rendition picked with
+``?picture_size=`` (``original`` for the full picture), falling back to
+``DEFAULT_SIZE``. Pictures uploaded before the pipeline keep their single
+file until ``manage.py process_profile_pictures`` converts them.
+
+Setting ``WORKERS = 0`` renders inline.
+"""
+import hashlib
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+DEFAULTS = {
+    'SIZES': {'xs': 40, 'sm': 96, 'md': 256, 'lg': 512},
+    'DEFAULT_SIZE': 'sm',
+    'MAX_SIDE': 1024,
+    'QUALITY': 85,
+    'WORKERS': 2,
+}
+
+UPLOAD_TO = 'profile_pics'
+ORIGINAL = 'original.jpg'
+SIZE_PARAM = 'picture_size'
+
+
+class InvalidPicture(ValueError):
+    """Upload Pillow could not decode or render"""
+
+
+_lock = threading.Lock()
+_executor = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PROFILE_PICTURES', {})}
+
+
+def _encode(image, quality):
+    buffer = io.BytesIO()
+    # No exif/icc arguments: the output carries no metadata
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render(data, sizes, max_side, quality):
+    """{file name: JPEG bytes} of the cleaned original and each square size"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+
+        original = image.copy()
+        original.thumbnail((max_side, max_side), Image.LANCZOS)
+        renditions = {ORIGINAL: _encode(original, quality)}
+        for side in sorted(set(sizes)):
+            thumbnail = ImageOps.fit(image, (side, side), Image.LANCZOS)
+            renditions[f'{side}.jpg'] = _encode(thumbnail, quality)
+    return renditions
+
+
+def _get_executor(workers):
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        return _executor
+
+
+def process(data):
+    """Render ``data`` in the pool (or inline with WORKERS = 0)"""
+    config = get_config()
+    args = (data, list(config['SIZES'].values()), config['MAX_SIDE'], config['QUALITY'])
+    if config['WORKERS'] <= 0:
+        return render(*args)
+    return _get_executor(config['WORKERS']).submit(render, *args).result()
+
+
+def store(upload):
+    """Process an uploaded picture and return the storage name of its original
+
+    Raises InvalidPicture if the upload cannot be decoded.
+    """
+    upload.seek(0)
+    data = upload.read()
+    directory = f'{UPLOAD_TO}/{hashlib.sha256(data).hexdigest()[:32]}'
+    original = f'{directory}/{ORIGINAL}'
+    if default_storage.exists(original):
+        return original
+
+    try:
+        renditions = process(data)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise InvalidPicture(str(exc)) from exc
+    # The original goes last and marks the directory as complete
+    for filename in sorted(renditions, key=lambda filename: filename == ORIGINAL):
+        name = f'{directory}/{filename}'
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(renditions[filename]))
+    return original
+
+
+def is_processed(name):
+    return bool(name) and name.startswith(f'{UPLOAD_TO}/') and name.endswith(f'/{ORIGINAL}')
+
+
+def requested_size(request):
+    """Size key from ``?picture_size=``, or DEFAULT_SIZE when absent or unknown"""
+    config = get_config()
+    params = getattr(request, 'query_params', None) or getattr(request, 'GET', {})
+    size = params.get(SIZE_PARAM)
+    if size == 'original' or size in config['SIZES']:
+        return size
+    return config['DEFAULT_SIZE']
+
+
+def rendition_name(name, size):
+    """Storage name of ``size`` for a stored original"""
+    side = get_config()['SIZES'].get(size)
+    if side is None or not is_processed(name):
+        return name
+    return f'{name[:-len(ORIGINAL)]}{side}.jpg'
+
+
+def picture_url(name, size):
+    if not name:
+        return None
+    return default_storage.url(rendition_name(name, size))
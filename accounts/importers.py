@@ -0,0 +1,386 @@
+"""
+Bulk import of users, skills, user-skills and skills-wanted.
+
+Rows are read from CSV or JSONL in chunks. Each chunk is validated and
+deduplicated in memory, skill names are resolved against an in-memory
+catalog map and everything is written with ``bulk_create``, so no
+per-row password hashing, signal handling or HTTP round trip happens.
+
+Row fields (CSV columns or JSONL keys):
+
+    email, username, first_name, last_name, bio, location, phone_number,
+    teaches, wants
+
+``teaches`` holds entries of the form ``Category/Skill[:level[:years]]``
+and ``wants`` entries of the form ``Category/Skill[:priority]``. In CSV the
+entries are separated by ``;``, in JSONL they may also be given as a list.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from . import taxonomy
+from .models import (
+    SkillCategory, Skill, SkillAlias, UserSkill, SkillWanted, normalize_skill_name
+)
+
+User = get_user_model()
+
+DEFAULT_CHUNK_SIZE = 1000
+
+PROFICIENCY_LEVELS = {value for value, _ in UserSkill.PROFICIENCY_LEVELS}
+PRIORITY_LEVELS = {value for value, _ in SkillWanted.PRIORITY_LEVELS}
+
+
+class ImportReport:
+    """Counters and per-row errors collected during an import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.users_created = 0
+        self.skills_created = 0
+        self.categories_created = 0
+        self.user_skills_created = 0
+        self.skills_wanted_created = 0
+        self.duplicates = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'users_created': self.users_created,
+            'categories_created': self.categories_created,
+            'skills_created': self.skills_created,
+            'user_skills_created': self.user_skills_created,
+            'skills_wanted_created': self.skills_wanted_created,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+        }
+
+
+def _key(name):
+    return ' '.join(name.split()).lower()
+
+
+def _bulk_insert(model, objects, inserted):
+    """``bulk_create`` ignoring conflicts, returning how many rows ``inserted`` gained"""
+    before = inserted.count()
+    model.objects.bulk_create(objects, ignore_conflicts=True)
+    return inserted.count() - before
+
+
+class SkillCatalog:
+    """In-memory map of (category, skill) names to canonical skill ids"""
+
+    def __init__(self):
+        self.categories = {
+            _key(name): pk
+            for pk, name in SkillCategory.objects.values_list('id', 'name')
+        }
+        self.skills = {}
+        for pk, normalized_name, category_id in Skill.objects.order_by('-pk').values_list(
+            'id', 'normalized_name', 'category_id'
+        ):
+            # Ordered so the oldest (canonical) row wins over later duplicates
+            self.skills[(category_id, normalized_name)] = pk
+        self.aliases = dict(SkillAlias.objects.values_list('alias', 'skill_id'))
+
+    def lookup(self, category_id, skill_name):
+        normalized = normalize_skill_name(skill_name)
+        skill_id = self.skills.get((category_id, normalized))
+        if skill_id is None:
+            skill_id = self.aliases.get(normalized)
+        return skill_id
+
+    def resolve(self, category_name, skill_name):
+        category_id = self.categories.get(_key(category_name))
+        if category_id is None:
+            return None
+        return self.lookup(category_id, skill_name)
+
+    def ensure(self, pairs, report):
+        """Create any categories and skills in ``pairs`` not yet in the catalog"""
+        missing_categories = {}
+        pairs = sorted(pairs)
+        for category_name, _ in pairs:
+            key = _key(category_name)
+            if key not in self.categories:
+                missing_categories.setdefault(key, category_name.strip())
+
+        if missing_categories:
+            categories = SkillCategory.objects.filter(name__in=missing_categories.values())
+            report.categories_created += _bulk_insert(
+                SkillCategory,
+                [SkillCategory(name=name) for name in missing_categories.values()],
+                categories
+            )
+            created_ids = []
+            for pk, name in categories.values_list('id', 'name'):
+                self.categories[_key(name)] = pk
+                created_ids.append(pk)
+            taxonomy.add_roots(created_ids)
+
+        missing_skills = {}
+        for category_name, skill_name in pairs:
+            category_id = self.categories[_key(category_name)]
+            if self.lookup(category_id, skill_name) is None:
+                key = (category_id, normalize_skill_name(skill_name))
+                missing_skills.setdefault(key, skill_name.strip())
+
+        if missing_skills:
+            skills = Skill.objects.filter(
+                category_id__in={category_id for category_id, _ in missing_skills},
+                normalized_name__in=[normalized_name for _, normalized_name in missing_skills]
+            )
+            before = Counter(skills.values_list('category_id', flat=True))
+            Skill.objects.bulk_create(
+                [
+                    Skill(name=name, normalized_name=normalized_name, category_id=category_id)
+                    for (category_id, normalized_name), name in missing_skills.items()
+                ],
+                ignore_conflicts=True
+            )
+            # Only the rows actually inserted count, not those lost to a conflict
+            created = Counter(skills.values_list('category_id', flat=True))
+            created.subtract(before)
+            taxonomy.adjust_skill_counts(+created)
+            report.skills_created += sum((+created).values())
+            for pk, normalized_name, category_id in skills.order_by('-pk').values_list(
+                'id', 'normalized_name', 'category_id'
+            ):
+                self.skills[(category_id, normalized_name)] = pk
+
+
+def _split_entries(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(entry).strip() for entry in value if str(entry).strip()]
+    return [entry.strip() for entry in str(value).split(';') if entry.strip()]
+
+
+def _parse_skill_entry(entry):
+    """Split ``Category/Skill[:a[:b]]`` into (category, skill, extras)"""
+    path, *extras = entry.split(':')
+    if '/' not in path:
+        raise ValueError(f'Skill "{entry}" must be written as Category/Skill.')
+    category_name, skill_name = path.split('/', 1)
+    if not category_name.strip() or not skill_name.strip():
+        raise ValueError(f'Skill "{entry}" must be written as Category/Skill.')
+    return category_name, skill_name, [extra.strip() for extra in extras]
+
+
+def parse_row(line, row):
+    """Validate a raw row and return its cleaned form"""
+    email = (row.get('email') or '').strip()
+    if not email:
+        raise ValueError('Email is required.')
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError(f'Invalid email "{email}".')
+
+    teaches = []
+    for entry in _split_entries(row.get('teaches')):
+        category_name, skill_name, extras = _parse_skill_entry(entry)
+        level = extras[0].lower() if extras and extras[0] else 'intermediate'
+        if level not in PROFICIENCY_LEVELS:
+            raise ValueError(f'Unknown proficiency level "{level}".')
+        years = extras[1] if len(extras) > 1 and extras[1] else '0'
+        if not years.isdigit() or int(years) > 50:
+            raise ValueError(f'Invalid years of experience "{years}".')
+        teaches.append((category_name, skill_name, level, int(years)))
+
+    wants = []
+    for entry in _split_entries(row.get('wants')):
+        category_name, skill_name, extras = _parse_skill_entry(entry)
+        priority = extras[0].lower() if extras and extras[0] else 'medium'
+        if priority not in PRIORITY_LEVELS:
+            raise ValueError(f'Unknown priority "{priority}".')
+        wants.append((category_name, skill_name, priority))
+
+    return {
+        'line': line,
+        'email': User.objects.normalize_email(email),
+        'username': (row.get('username') or email.split('@')[0]).strip()[:150],
+        'first_name': (row.get('first_name') or '').strip()[:150],
+        'last_name': (row.get('last_name') or '').strip()[:150],
+        'bio': (row.get('bio') or '').strip()[:500],
+        'location': (row.get('location') or '').strip()[:100],
+        'phone_number': (row.get('phone_number') or '').strip()[:15],
+        'teaches': teaches,
+        'wants': wants,
+    }
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, dict) pairs from a CSV or JSONL text stream"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'jsonl':
+        for line, text in enumerate(stream, start=1):
+            text = text.strip()
+            if not text:
+                continue
+            try:
+                yield line, json.loads(text)
+            except ValueError:
+                yield line, None
+    else:
+        raise ValueError(f'Unsupported import format "{file_format}".')
+
+
+class BulkImporter:
+    """Streams rows through validation, dedup and bulk inserts chunk by chunk"""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.catalog = SkillCatalog()
+        self.report = ImportReport()
+        self.seen_emails = set()
+        self.seen_usernames = set()
+        # Imported accounts get an unusable password; users set one
+        # through the password reset flow. This avoids hashing per row.
+        self.password = make_password(None)
+
+    def run(self, stream, file_format):
+        rows = read_rows(stream, file_format)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        return self.report
+
+    def import_chunk(self, chunk):
+        report = self.report
+        cleaned = []
+        for line, row in chunk:
+            report.rows += 1
+            if not isinstance(row, dict):
+                report.add_error(line, 'Row is not a valid JSON object.')
+                continue
+            try:
+                data = parse_row(line, row)
+            except ValueError as exc:
+                report.add_error(line, str(exc))
+                continue
+
+            key = data['email'].lower()
+            if key in self.seen_emails:
+                report.duplicates += 1
+                continue
+            self.seen_emails.add(key)
+            cleaned.append(data)
+
+        if not cleaned:
+            return
+
+        # Emails are compared case-insensitively: Foo@x and foo@x are one user
+        existing = set(
+            User.objects.annotate(email_key=Lower('email')).filter(
+                email_key__in=[data['email'].lower() for data in cleaned]
+            ).values_list('email_key', flat=True)
+        )
+        taken = set(
+            User.objects.filter(
+                username__in=[data['username'] for data in cleaned]
+            ).values_list('username', flat=True)
+        )
+        new_rows = []
+        for data in cleaned:
+            if data['email'].lower() in existing:
+                report.duplicates += 1
+            elif data['username'] in taken or data['username'] in self.seen_usernames:
+                # Usernames derived from the email's local part can collide
+                report.add_error(data['line'], f'Username "{data["username"]}" is already taken.')
+            else:
+                self.seen_usernames.add(data['username'])
+                new_rows.append(data)
+
+        if not new_rows:
+            return
+
+        with transaction.atomic():
+            pairs = set()
+            for data in new_rows:
+                pairs.update((c, s) for c, s, *_ in data['teaches'])
+                pairs.update((c, s) for c, s, _ in data['wants'])
+            self.catalog.ensure(pairs, report)
+
+            User.objects.bulk_create(
+                [
+                    User(
+                        email=data['email'],
+                        username=data['username'],
+                        first_name=data['first_name'],
+                        last_name=data['last_name'],
+                        bio=data['bio'],
+                        location=data['location'],
+                        phone_number=data['phone_number'],
+                        password=self.password,
+                        is_email_verified=False,
+                    )
+                    for data in new_rows
+                ],
+                ignore_conflicts=True
+            )
+            user_ids = dict(
+                User.objects.filter(
+                    email__in=[data['email'] for data in new_rows]
+                ).values_list('email', 'id')
+            )
+
+            user_skills = {}
+            skills_wanted = {}
+            for data in new_rows:
+                user_id = user_ids.get(data['email'])
+                if user_id is None:
+                    report.add_error(data['line'], 'User could not be created (username taken?).')
+                    continue
+                report.users_created += 1
+
+                for category_name, skill_name, level, years in data['teaches']:
+                    skill_id = self.catalog.resolve(category_name, skill_name)
+                    user_skills[(user_id, skill_id)] = UserSkill(
+                        user_id=user_id,
+                        skill_id=skill_id,
+                        proficiency_level=level,
+                        years_of_experience=years,
+                    )
+                for category_name, skill_name, priority in data['wants']:
+                    skill_id = self.catalog.resolve(category_name, skill_name)
+                    skills_wanted[(user_id, skill_id)] = SkillWanted(
+                        user_id=user_id,
+                        skill_id=skill_id,
+                        priority=priority,
+                    )
+
+            created_ids = list(user_ids.values())
+            report.user_skills_created += _bulk_insert(
+                UserSkill, user_skills.values(), UserSkill.objects.filter(user_id__in=created_ids)
+            )
+            report.skills_wanted_created += _bulk_insert(
+                SkillWanted, skills_wanted.values(), SkillWanted.objects.filter(user_id__in=created_ids)
+            )
+
+
+def import_file(fileobj, file_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Import from a binary or text file object and return the report"""
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    return BulkImporter(chunk_size=chunk_size).run(fileobj, file_format)
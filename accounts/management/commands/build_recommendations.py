@@ -0,0 +1,36 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.recommendations import refresh
+
+
+class Command(BaseCommand):
+    help = "Build skill co-occurrence neighbours and per-user skill recommendations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help="Keep the neighbour tables and only refresh users changed since the last run"
+        )
+        parser.add_argument('--top', type=int, default=10, help="Recommendations stored per user")
+        parser.add_argument('--neighbors', type=int, default=20, help="Neighbours stored per skill")
+        parser.add_argument(
+            '--min-count',
+            type=int,
+            default=2,
+            help="Users two skills must share before they count as neighbours"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        summary = refresh(
+            incremental=options['incremental'],
+            top_n=options['top'],
+            top_neighbors_n=options['neighbors'],
+            min_count=options['min_count'],
+        )
+        summary['seconds'] = round(time.monotonic() - started, 2)
+        self.stdout.write(self.style.SUCCESS(json.dumps(summary)))
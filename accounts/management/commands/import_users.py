@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importers import DEFAULT_CHUNK_SIZE, import_file
+
+
+class Command(BaseCommand):
+    help = "Bulk import users with their skills and wanted skills from CSV or JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the CSV or JSONL file")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help="File format (defaults to the file extension)"
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            '--errors',
+            help="Write per-row errors to this JSONL file instead of stdout"
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in ('csv', 'jsonl'):
+            raise CommandError("Cannot guess the format, pass --format csv|jsonl.")
+
+        started = time.monotonic()
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as fileobj:
+                report = import_file(fileobj, file_format, options['chunk_size'])
+        except OSError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.monotonic() - started
+
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8') as out:
+                for error in report.errors:
+                    out.write(json.dumps(error) + '\n')
+        else:
+            for error in report.errors:
+                self.stderr.write(f"line {error['line']}: {error['error']}")
+
+        summary = report.as_dict()
+        summary.pop('errors')
+        summary['error_count'] = len(report.errors)
+        summary['seconds'] = round(elapsed, 2)
+        self.stdout.write(self.style.SUCCESS(json.dumps(summary)))
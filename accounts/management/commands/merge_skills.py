@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Skill
+from accounts.synonyms import backfill_normalized_names, duplicate_groups, merge_skills
+
+
+class Command(BaseCommand):
+    help = "Merge duplicate skills into canonical ones, re-pointing every reference"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--into', type=int, help="Canonical skill id to merge --skills into")
+        parser.add_argument('--skills', type=int, nargs='+', default=[], help="Duplicate skill ids")
+        parser.add_argument(
+            '--auto',
+            action='store_true',
+            help="Merge every group of skills sharing a normalized name"
+        )
+        parser.add_argument(
+            '--across-categories',
+            action='store_true',
+            help="With --auto, also merge same-named skills from different categories"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only list what would be merged")
+
+    def handle(self, *args, **options):
+        backfilled = backfill_normalized_names()
+        if backfilled:
+            self.stdout.write(f"Normalized {backfilled} skill names")
+
+        if options['auto']:
+            groups = list(duplicate_groups(options['across_categories']))
+        elif options['into'] and options['skills']:
+            groups = [(options['into'], options['skills'])]
+        else:
+            raise CommandError("Pass --auto, or --into with --skills.")
+
+        totals = {'skills_merged': 0, 'rows_moved': {}}
+        for canonical_id, duplicate_ids in groups:
+            skills = Skill.objects.in_bulk([canonical_id, *duplicate_ids])
+            if canonical_id not in skills:
+                raise CommandError(f"Skill {canonical_id} does not exist.")
+            target = skills[canonical_id]
+            sources = [skills[pk] for pk in duplicate_ids if pk in skills and pk != canonical_id]
+            self.stdout.write(
+                f"{target.name} ({target.pk}) <- "
+                + ', '.join(f"{source.name} ({source.pk})" for source in sources)
+            )
+            if options['dry_run'] or not sources:
+                continue
+
+            moved = merge_skills(target, sources)
+            totals['skills_merged'] += len(sources)
+            for table, count in moved.items():
+                totals['rows_moved'][table] = totals['rows_moved'].get(table, 0) + count
+
+        self.stdout.write(self.style.SUCCESS(json.dumps(totals)))
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from accounts import images
+
+
+class Command(BaseCommand):
+    help = "Run profile pictures uploaded before the image pipeline through it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only count the unprocessed pictures")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True).exclude(
+            profile_picture__endswith=f'/{images.ORIGINAL}'
+        ).values_list('pk', 'profile_picture')
+
+        processed = failed = 0
+        for pk, name in users.iterator(chunk_size=500):
+            if options['dry_run']:
+                processed += 1
+                continue
+            try:
+                with default_storage.open(name) as upload:
+                    stored = images.store(upload)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"User {pk}: {name}: {exc}")
+                continue
+            User.objects.filter(pk=pk, profile_picture=name).update(profile_picture=stored)
+            processed += 1
+
+        verb = "Would process" if options['dry_run'] else "Processed"
+        self.stdout.write(f"{verb} {processed} profile pictures, {failed} failed")
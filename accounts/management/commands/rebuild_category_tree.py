@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.taxonomy import rebuild_category_tree
+
+
+class Command(BaseCommand):
+    help = "Rebuild the category closure table and subtree skill counts from parent pointers"
+
+    def handle(self, *args, **options):
+        links = rebuild_category_tree()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {links} category closure rows"))
@@ -1,13 +1,44 @@
-from django.db import models
+import re
+import unicodedata
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator,MaxValueValidator
 
+from SkillExchange.outbox import OutboxMixin
+
+from . import geo
+
+_SKILL_NAME_SEPARATORS = re.compile(r'[^\w+#.]+')
+
+
+def normalize_skill_name(name):
+    """Canonical lookup form of a skill name: 'Java-Script ' -> 'java script'"""
+    name = unicodedata.normalize('NFKC', name).casefold()
+    return ' '.join(_SKILL_NAME_SEPARATORS.sub(' ', name).strip(' .').split())
+
+
+def update_geohash(instance, save_kwargs):
+    """Recompute ``instance.geohash`` from its latitude and longitude"""
+    if instance.latitude is not None and instance.longitude is not None:
+        instance.geohash = geo.encode(instance.latitude, instance.longitude)
+    else:
+        instance.geohash = ''
+    
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+        save_kwargs['update_fields'] = set(update_fields) | {'geohash'}
+
+
 class User(AbstractUser):
     """Extended User model for Skill Exchange Platform"""
     email = models.EmailField(unique=True)
     bio = models.TextField(max_length=500,blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True,null=True)
     location = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     phone_number = models.CharField(max_length=15,blank=True)
     date_of_birth = models.DateField(null=True,blank=True)
     is_email_verified = models.BooleanField(auto_created=True)
@@ -21,6 +52,11 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.email} - {self.get_full_name()}"
     
+    def save(self, *args, **kwargs):
+        # Keep the geohash used for proximity search in step with the coordinates
+        update_geohash(self, kwargs)
+        super().save(*args, **kwargs)
+    
     
     class Meta:
         ordering = ['-created_at']
@@ -31,28 +67,133 @@ class SkillCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank = True)
     icon = models.CharField(max_length=50, blank=True)  # for storing icon class
+    parent = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='children')
+    subtree_skill_count = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Keep the closure table in step with the parent pointer"""
+        from . import taxonomy
+
+        creating = self._state.adding
+        old_parent_id = getattr(self, '_loaded_parent_id', self.parent_id)
+        if not creating and kwargs.get('update_fields') is None:
+            # The counter is maintained with F() updates; never write a stale copy back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'subtree_skill_count'
+            ]
+        with transaction.atomic():
+            if not creating and old_parent_id != self.parent_id:
+                taxonomy.check_parent(self, self.parent_id)
+            super().save(*args, **kwargs)
+            if creating:
+                taxonomy.insert_category(self)
+            elif old_parent_id != self.parent_id:
+                taxonomy.move_category(self, old_parent_id)
+        self._loaded_parent_id = self.parent_id
+
+    def delete(self, *args, **kwargs):
+        from . import taxonomy
+
+        with transaction.atomic():
+            if self.parent_id:
+                count = SkillCategory.objects.filter(pk=self.pk).values_list(
+                    'subtree_skill_count', flat=True
+                ).get()
+                taxonomy.adjust_skill_counts({self.parent_id: -count})
+            return super().delete(*args, **kwargs)
     
     class Meta:
         verbose_name_Plural = "Skill Categories"
         ordering = ['name']
         
         
+class SkillCategoryClosure(models.Model):
+    """Ancestor/descendant pairs of the category tree, each category included with itself"""
+    ancestor = models.ForeignKey(SkillCategory, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(SkillCategory, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.ancestor.name} > {self.descendant.name} ({self.depth})"
+
+    class Meta:
+        unique_together = ['ancestor', 'descendant']
+        indexes = [models.Index(fields=['descendant', 'ancestor'])]
+
+
 class Skill(models.Model):
     """Individual skill that users can offer or or want to learn"""
     name = models.CharField(max_length=100)
+    normalized_name = models.CharField(max_length=100, db_index=True, editable=False)
     category = models.ForeignKey(SkillCategory,on_delete=models.CASCADE,related_name='skills')
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.name}({self.category.name})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Keep subtree_skill_count of the category and its ancestors up to date"""
+        from . import taxonomy
+
+        creating = self._state.adding
+        old_category_id = getattr(self, '_loaded_category_id', None)
+        self.normalized_name = normalize_skill_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'normalized_name'}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creating:
+                taxonomy.adjust_skill_counts({self.category_id: 1})
+            elif old_category_id is not None and old_category_id != self.category_id:
+                taxonomy.adjust_skill_counts({old_category_id: -1, self.category_id: 1})
+        self._loaded_category_id = self.category_id
+
+    def delete(self, *args, **kwargs):
+        from . import taxonomy
+
+        with transaction.atomic():
+            taxonomy.adjust_skill_counts({self.category_id: -1})
+            return super().delete(*args, **kwargs)
     
     class Meta:
         ordering = ['category','name']
         unique_together = ['name','category']
+
+
+class SkillAlias(models.Model):
+    """Alternative name (e.g. "JS") that resolves to a canonical skill"""
+    alias = models.CharField(max_length=100, unique=True, help_text="Normalized alias")
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='aliases')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        self.alias = normalize_skill_name(self.alias)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.alias} -> {self.skill.name}"
+
+    class Meta:
+        verbose_name_plural = "Skill aliases"
+        ordering = ['alias']
         
         
 class UserSkill(models.Model):
@@ -85,7 +226,7 @@ class UserSkill(models.Model):
         ordering = ['-proficiency_level','-years_of_experience']
         
         
-class SkillWanted(models.Model):
+class SkillWanted(OutboxMixin, models.Model):
     """Skills that a user wants to learn"""
     PRIORITY_LEVELS = [
         ('low','Low'),
@@ -109,7 +250,7 @@ class SkillWanted(models.Model):
         ordering = ['-priority','-created_at']
         
 
-class UserRating(models.Model):
+class UserRating(OutboxMixin, models.Model):
     """Rating system for users after skill exchanges"""
     rated_user = models.ForeignKey(User,on_delete=models.CASCADE,related_name='ratings_received')
     
@@ -118,7 +259,7 @@ class UserRating(models.Model):
     review = models.TextField(blank=True)
     Skill = models.ForeignKey(Skill,on_delete=models.SET_NULL,null=True,blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     
     def __str__(self):
@@ -130,4 +271,42 @@ class UserRating(models.Model):
         ordering = ['-created_at']
         
         
-        
\ No newline at end of file
+                
+        
+class SkillNeighbor(models.Model):
+    """Precomputed skill-to-skill similarity from user co-occurrence"""
+    KINDS = [
+        ('wanted', 'Wanted together'),
+        ('taught', 'Taught together'),
+    ]
+
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    score = models.FloatField()
+    co_count = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.skill.name} -> {self.neighbor.name} ({self.kind}, {self.score:.3f})"
+
+    class Meta:
+        unique_together = ['skill', 'neighbor', 'kind']
+        ordering = ['-score']
+        indexes = [models.Index(fields=['skill', 'kind', '-score'])]
+
+
+class SkillRecommendation(models.Model):
+    """Precomputed "skills you might want to learn" for a user"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='skill_recommendations')
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user.email} might want to learn {self.skill.name}"
+
+    class Meta:
+        unique_together = ['user', 'skill']
+        ordering = ['-score']
+        indexes = [models.Index(fields=['user', '-score'])]
@@ -0,0 +1,198 @@
+"""
+Offline "skills you might want to learn" recommender.
+
+SkillWanted and the teachable UserSkill rows form two user-skill
+bipartite graphs. For each of them the skill-by-skill co-occurrence
+matrix (A^T A) is built sparsely: every user's basket of skills is
+streamed once, ordered by user, and the pairs inside it are counted.
+Scores are cosine normalised, ``co / sqrt(n_x * n_y)``, and the top-N
+neighbours of each skill are stored in SkillNeighbor.
+
+A user's recommendations are the neighbours of the skills they want
+(and, at a lower weight, of the skills they teach) summed up, minus the
+skills they already have or want. They are stored in SkillRecommendation
+so the API reads them with one indexed query.
+
+The neighbour tables need a periodic full rebuild; between rebuilds only
+users whose SkillWanted/UserSkill rows changed since the last run are
+refreshed. Removing a skill leaves no updated row behind, so those users
+catch up at the next full run. A full run replaces each user's rows chunk
+by chunk, so the API keeps serving the previous recommendations while it
+runs, and drops the rows of users left without skills at the end.
+"""
+import heapq
+import itertools
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import SkillNeighbor, SkillRecommendation, SkillWanted, UserSkill
+
+
+KIND_WEIGHTS = {'wanted': 1.0, 'taught': 0.5}
+# Caps the quadratic pair count for users with huge skill lists
+MAX_BASKET = 200
+
+
+def skill_rows(kind):
+    if kind == 'wanted':
+        return SkillWanted.objects.all()
+    return UserSkill.objects.filter(can_teach=True)
+
+
+def baskets(kind):
+    """Yield (user_id, sorted skill ids) for one side of the graph"""
+    rows = skill_rows(kind).order_by('user_id', 'skill_id').values_list('user_id', 'skill_id')
+    for user_id, group in itertools.groupby(rows.iterator(chunk_size=5000), key=lambda row: row[0]):
+        skills = sorted({skill_id for _, skill_id in group})
+        yield user_id, skills[:MAX_BASKET]
+
+
+def co_occurrence(kind):
+    """Sparse upper-triangle co-occurrence counts and per-skill user counts"""
+    pairs = Counter()
+    totals = Counter()
+    for _, skills in baskets(kind):
+        totals.update(skills)
+        pairs.update(itertools.combinations(skills, 2))
+    return pairs, totals
+
+
+def top_neighbors(pairs, totals, top_n, min_count=1):
+    """Map skill id -> [(score, co_count, neighbor id), ...] best first"""
+    candidates = defaultdict(list)
+    for (a, b), count in pairs.items():
+        if count < min_count:
+            continue
+        score = count / math.sqrt(totals[a] * totals[b])
+        candidates[a].append((score, count, b))
+        candidates[b].append((score, count, a))
+    return {
+        skill_id: heapq.nlargest(top_n, items)
+        for skill_id, items in candidates.items()
+    }
+
+
+def build_neighbors(kind, top_n=20, min_count=2):
+    """Rebuild the SkillNeighbor rows of one kind, returning how many were stored"""
+    computed_at = timezone.now()
+    pairs, totals = co_occurrence(kind)
+    neighbors = [
+        SkillNeighbor(
+            skill_id=skill_id,
+            neighbor_id=neighbor_id,
+            kind=kind,
+            score=score,
+            co_count=count,
+            computed_at=computed_at,
+        )
+        for skill_id, items in top_neighbors(pairs, totals, top_n, min_count).items()
+        for score, count, neighbor_id in items
+    ]
+    with transaction.atomic():
+        SkillNeighbor.objects.filter(kind=kind).delete()
+        SkillNeighbor.objects.bulk_create(neighbors, batch_size=1000)
+    return len(neighbors)
+
+
+def load_neighbors():
+    """All neighbour lists keyed by (kind, skill id)"""
+    table = defaultdict(list)
+    rows = SkillNeighbor.objects.values_list('kind', 'skill_id', 'neighbor_id', 'score')
+    for kind, skill_id, neighbor_id, score in rows.iterator(chunk_size=5000):
+        table[kind, skill_id].append((neighbor_id, score))
+    return table
+
+
+def recommend(wanted, taught, neighbors, top_n=10):
+    """Best (skill id, score) pairs for a user wanting and teaching the given skills"""
+    known = set(wanted) | set(taught)
+    scores = Counter()
+    for kind, skills in (('wanted', wanted), ('taught', taught)):
+        weight = KIND_WEIGHTS[kind]
+        for skill_id in skills:
+            for neighbor_id, score in neighbors.get((kind, skill_id), ()):
+                if neighbor_id not in known:
+                    scores[neighbor_id] += weight * score
+    return heapq.nlargest(top_n, scores.items(), key=lambda item: item[1])
+
+
+def users_with_skills():
+    return (
+        skill_rows('wanted').order_by().values('user_id')
+        .union(skill_rows('taught').order_by().values('user_id'))
+    )
+
+
+def changed_user_ids(since):
+    """Users whose wanted or teachable skills changed after ``since``"""
+    return (
+        SkillWanted.objects.filter(updated_at__gt=since).order_by().values('user_id')
+        .union(UserSkill.objects.filter(updated_at__gt=since).order_by().values('user_id'))
+    )
+
+
+def last_refresh():
+    return SkillRecommendation.objects.aggregate(last=Max('computed_at'))['last']
+
+
+def refresh_users(user_ids, top_n=10, chunk_size=500, neighbors=None):
+    """Recompute and store recommendations for ``user_ids``, returning the user count"""
+    if neighbors is None:
+        neighbors = load_neighbors()
+    computed_at = timezone.now()
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        skills = {kind: defaultdict(list) for kind in KIND_WEIGHTS}
+        for kind, by_user in skills.items():
+            rows = skill_rows(kind).filter(user_id__in=chunk).values_list('user_id', 'skill_id')
+            for user_id, skill_id in rows:
+                by_user[user_id].append(skill_id)
+
+        recommendations = [
+            SkillRecommendation(
+                user_id=user_id,
+                skill_id=skill_id,
+                score=score,
+                computed_at=computed_at,
+            )
+            for user_id in chunk
+            for skill_id, score in recommend(
+                skills['wanted'][user_id], skills['taught'][user_id], neighbors, top_n
+            )
+        ]
+        with transaction.atomic():
+            SkillRecommendation.objects.filter(user_id__in=chunk).delete()
+            SkillRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+    return len(user_ids)
+
+
+def refresh(incremental=False, top_n=10, top_neighbors_n=20, min_count=2):
+    """
+    Rebuild neighbours and recommendations.
+
+    With ``incremental`` the neighbour tables are kept and only users
+    changed since the last refresh are recomputed; it falls back to a full
+    run when nothing has been computed yet. Returns a summary dict.
+    """
+    started = timezone.now()
+    since = last_refresh() if incremental else None
+    summary = {'incremental': since is not None, 'neighbors': {}}
+
+    if since is None:
+        for kind in KIND_WEIGHTS:
+            summary['neighbors'][kind] = build_neighbors(kind, top_neighbors_n, min_count)
+        user_ids = users_with_skills()
+    else:
+        user_ids = changed_user_ids(since)
+
+    user_ids = {row['user_id'] for row in user_ids}
+    summary['users'] = refresh_users(user_ids, top_n)
+    if since is None:
+        # Every user with skills was just rewritten; older rows are orphans
+        summary['pruned'] = SkillRecommendation.objects.filter(computed_at__lt=started).delete()[0]
+    return summary
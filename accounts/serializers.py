@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
+from . import hashing, images, synonyms, taxonomy
 from .models import (
-    SkillCategory, Skill, UserSkill, SkillWanted, UserRating
+    SkillCategory, Skill, UserSkill, SkillWanted, UserRating,
+    SkillRecommendation
 )
 
 User = get_user_model()
@@ -13,7 +15,6 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True,
         required=True,
-        validators=[validate_password],
         style={'input_type': 'password'}
     )
     password2 = serializers.CharField(
@@ -39,17 +40,65 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 "password": "Password fields didn't match."
             })
+
+        # Validation and hashing run in the hashing pool, off the request thread
+        try:
+            attrs['password'] = hashing.validate_and_hash(
+                attrs['password'], hashing.user_fields(**attrs)
+            )
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError({'password': list(exc.messages)})
         return attrs
 
     def create(self, validated_data):
         validated_data.pop('password2')
-        user = User.objects.create_user(**validated_data)
+        encoded_password = validated_data.pop('password')
+        validated_data['email'] = User.objects.normalize_email(validated_data['email'])
+        validated_data['username'] = User.normalize_username(validated_data['username'])
+        user = User(**validated_data)
+        user.password = encoded_password
+        user.save()
         return user
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class ProfilePictureField(serializers.ImageField):
+    """Profile picture returned at ?picture_size=, stored by ProfilePictureMixin"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        url = images.picture_url(value.name, images.requested_size(request))
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class ProfilePictureMixin:
+    """Run an uploaded profile_picture through accounts.images on save, not in is_valid()"""
+
+    def store_picture(self, validated_data):
+        upload = validated_data.get('profile_picture')
+        if not upload:
+            return
+        try:
+            validated_data['profile_picture'] = images.store(upload)
+        except images.InvalidPicture:
+            raise serializers.ValidationError({
+                'profile_picture': [ProfilePictureField.default_error_messages['invalid_image']]
+            })
+
+    def create(self, validated_data):
+        self.store_picture(validated_data)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        self.store_picture(validated_data)
+        return super().update(instance, validated_data)
+
+
+class UserProfileSerializer(ProfilePictureMixin, serializers.ModelSerializer):
     """Serializer for user profile with skills"""
     full_name = serializers.SerializerMethodField()
+    profile_picture = ProfilePictureField(required=False, allow_null=True)
     average_rating = serializers.SerializerMethodField()
     total_ratings = serializers.SerializerMethodField()
 
@@ -57,8 +106,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = User
         fields = [
             'id', 'username', 'email', 'full_name', 'first_name', 'last_name',
-            'bio', 'profile_picture', 'location', 'phone_number',
-            'date_of_birth', 'is_email_verified', 'average_rating',
+            'bio', 'profile_picture', 'location', 'latitude', 'longitude',
+            'phone_number', 'date_of_birth', 'is_email_verified', 'average_rating',
             'total_ratings', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'email', 'is_email_verified', 'created_at', 'updated_at']
@@ -67,23 +116,24 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return obj.get_full_name()
 
     def get_average_rating(self, obj):
+        # Annotated by accounts.views.with_rating_summary on list endpoints
+        if hasattr(obj, 'total_ratings'):
+            return round(obj.average_rating, 2) if obj.average_rating is not None else None
         ratings = obj.ratings_received.all()
         if ratings.exists():
             return round(sum(r.rating for r in ratings) / ratings.count(), 2)
         return None
 
     def get_total_ratings(self, obj):
+        if hasattr(obj, 'total_ratings'):
+            return obj.total_ratings
         return obj.ratings_received.count()
 
 
 class ChangePasswordSerializer(serializers.Serializer):
     """Serializer for password change"""
     old_password = serializers.CharField(required=True, write_only=True)
-    new_password = serializers.CharField(
-        required=True,
-        write_only=True,
-        validators=[validate_password]
-    )
+    new_password = serializers.CharField(required=True, write_only=True)
     new_password2 = serializers.CharField(required=True, write_only=True)
 
     def validate(self, attrs):
@@ -100,12 +150,23 @@ class SkillCategorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SkillCategory
-        fields = ['id', 'name', 'description', 'icon', 'skills_count', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = [
+            'id', 'name', 'description', 'icon', 'parent', 'skills_count',
+            'subtree_skill_count', 'created_at'
+        ]
+        read_only_fields = ['id', 'subtree_skill_count', 'created_at']
 
     def get_skills_count(self, obj):
         return obj.skills.count()
 
+    def validate_parent(self, value):
+        if self.instance is not None and value is not None:
+            try:
+                taxonomy.check_parent(self.instance, value.pk)
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError(exc.messages)
+        return value
+
 
 class SkillSerializer(serializers.ModelSerializer):
     """Serializer for skills"""
@@ -116,6 +177,16 @@ class SkillSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'category', 'category_name', 'description', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+    def validate(self, attrs):
+        name = attrs.get('name', getattr(self.instance, 'name', ''))
+        category = attrs.get('category', getattr(self.instance, 'category', None))
+        existing_id = synonyms.resolve(name, category.pk if category else None)
+        if existing_id is not None and (self.instance is None or existing_id != self.instance.pk):
+            raise serializers.ValidationError({
+                "name": f"This skill already exists (id {existing_id})."
+            })
+        return attrs
+
 
 class UserSkillSerializer(serializers.ModelSerializer):
     """Serializer for user skills"""
@@ -154,6 +225,17 @@ class SkillWantedSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class SkillRecommendationSerializer(serializers.ModelSerializer):
+    """Serializer for precomputed skill recommendations"""
+    skill_name = serializers.CharField(source='skill.name', read_only=True)
+    category_name = serializers.CharField(source='skill.category.name', read_only=True)
+
+    class Meta:
+        model = SkillRecommendation
+        fields = ['skill', 'skill_name', 'category_name', 'score', 'computed_at']
+        read_only_fields = fields
+
+
 class UserRatingSerializer(serializers.ModelSerializer):
     """Serializer for user ratings"""
     rated_by_name = serializers.CharField(source='rated_by.get_full_name', read_only=True)
@@ -180,9 +262,10 @@ class UserRatingSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(ProfilePictureMixin, serializers.ModelSerializer):
     """Detailed user serializer with all related data"""
     full_name = serializers.SerializerMethodField()
+    profile_picture = ProfilePictureField(required=False, allow_null=True)
     user_skills = UserSkillSerializer(many=True, read_only=True)
     skills_wanted = SkillWantedSerializer(many=True, read_only=True)
     average_rating = serializers.SerializerMethodField()
@@ -0,0 +1,200 @@
+"""
+Canonical skills, aliases and name autocomplete.
+
+Skill names are compared in their normalized form (``Skill.normalized_name``,
+see ``normalize_skill_name``), and SkillAlias maps further spellings such
+as "js" to one canonical skill. ``resolve`` turns any user supplied name
+into a canonical skill id.
+
+``merge_skills`` folds duplicate skills into a canonical one: every row
+pointing at a duplicate is re-pointed with one UPDATE per referencing
+table (rows that would then collide with an existing row for the
+canonical skill are deleted first), the duplicate's name becomes an alias
+and the duplicate row is removed. Neighbour pairs that end up linking the
+canonical skill to itself are dropped, and the leaderboard entries of
+teachers ranked for a duplicate are recomputed, since the UPDATEs bypass
+the outbox.
+
+Skills written before ``normalized_name`` existed are normalized after
+``migrate`` (``backfill_skill_names``), so lookups match them right away.
+
+``SkillTrie`` is a per-process prefix tree over skill names, aliases and
+the individual words of multi-word names. Each node keeps its most popular
+completions, so a lookup costs one walk down the prefix.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Exists, Min, OuterRef
+
+from .models import Skill, SkillAlias, SkillNeighbor, normalize_skill_name
+
+
+def resolve(name, category_id=None):
+    """Canonical skill id for ``name`` (alias or normalized name), or None"""
+    normalized = normalize_skill_name(name)
+    if not normalized:
+        return None
+    skill_id = SkillAlias.objects.filter(alias=normalized).values_list('skill_id', flat=True).first()
+    if skill_id is not None:
+        return skill_id
+    skills = Skill.objects.filter(normalized_name=normalized).order_by('pk')
+    if category_id is not None:
+        skills = skills.filter(category_id=category_id)
+    return skills.values_list('pk', flat=True).first()
+
+
+def backfill_normalized_names(batch_size=1000, using=DEFAULT_DB_ALIAS):
+    """Fill normalized_name for rows written before it existed or by bulk paths"""
+    skills = list(Skill.objects.using(using).filter(normalized_name='').only('pk', 'name'))
+    for skill in skills:
+        skill.normalized_name = normalize_skill_name(skill.name)
+    Skill.objects.using(using).bulk_update(skills, ['normalized_name'], batch_size=batch_size)
+    return len(skills)
+
+
+def backfill_skill_names(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate: normalize the names of skills that predate normalized_name"""
+    backfill_normalized_names(using=using)
+
+
+def skill_references():
+    """
+    Yield (model, field name, unique-with field names) for every column
+    referencing Skill, including many-to-many through tables and
+    relations hidden with ``related_name='+'``.
+    """
+    for relation in Skill._meta.get_fields(include_hidden=True):
+        # Many-to-many tables are reached through their through model's foreign key
+        if not relation.auto_created or relation.concrete or relation.many_to_many:
+            continue
+        model = relation.related_model
+        field = relation.field
+        if model is SkillAlias:
+            continue
+
+        unique_with = []
+        for fields in model._meta.unique_together:
+            if field.name in fields:
+                unique_with.extend(name for name in fields if name != field.name)
+        yield model, field.name, unique_with
+
+
+@transaction.atomic
+def merge_skills(target, sources):
+    """Merge ``sources`` into ``target``, returning {table: rows re-pointed}"""
+    # Lazy: skills depends on accounts, not the other way round
+    from skills import leaderboard
+
+    sources = [source for source in sources if source.pk != target.pk]
+    teachers = leaderboard.skill_teachers([source.pk for source in sources])
+    moved = Counter()
+    references = list(skill_references())
+
+    for source in sources:
+        for model, field, unique_with in references:
+            rows = model.objects.filter(**{field: source.pk})
+            if unique_with:
+                clash = model.objects.filter(
+                    **{field: target.pk},
+                    **{name: OuterRef(name) for name in unique_with}
+                )
+                rows.filter(Exists(clash)).delete()
+            moved[model._meta.db_table] += rows.update(**{field: target.pk})
+
+        SkillAlias.objects.filter(skill=source).update(skill=target)
+        if source.normalized_name != target.normalized_name:
+            SkillAlias.objects.get_or_create(
+                alias=source.normalized_name, defaults={'skill': target}
+            )
+        source.delete()
+
+    # Two neighbours merged into one skill would otherwise be its own neighbour
+    SkillNeighbor.objects.filter(skill=target, neighbor=target).delete()
+    for teacher_id in teachers:
+        leaderboard.recompute_teacher(teacher_id)
+    skill_trie.invalidate()
+    return dict(moved)
+
+
+def duplicate_groups(across_categories=False):
+    """Yield (canonical id, [duplicate ids]) for skills sharing a normalized name"""
+    keys = ['normalized_name'] if across_categories else ['normalized_name', 'category_id']
+    groups = Skill.objects.order_by().values(*keys).annotate(
+        count=Count('id'), canonical=Min('id')
+    ).filter(count__gt=1)
+    for group in groups:
+        filters = {key: group[key] for key in keys}
+        duplicates = Skill.objects.filter(**filters).exclude(pk=group['canonical'])
+        yield group['canonical'], list(duplicates.values_list('pk', flat=True))
+
+
+class SkillTrie:
+    """Prefix tree of skill names keeping the top completions per node"""
+
+    def __init__(self, max_completions=10):
+        self.max_completions = max_completions
+        self.root = {}
+        self.skills = {}
+        self.built_at = 0.0
+        self.lock = threading.Lock()
+
+    def insert(self, key, entry):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+            completions = node.setdefault('', [])
+            if entry not in completions:
+                completions.append(entry)
+                completions.sort()
+                del completions[self.max_completions:]
+
+    def build(self):
+        popularity = Counter(dict(
+            Skill.objects.annotate(
+                users=Count('user_skills', distinct=True) + Count('wanted_by_users', distinct=True)
+            ).values_list('pk', 'users')
+        ))
+        skills = {}
+        keys = defaultdict(set)
+        for pk, name, category_id, category_name in Skill.objects.values_list(
+            'pk', 'name', 'category_id', 'category__name'
+        ):
+            skills[pk] = {'id': pk, 'name': name, 'category': category_id, 'category_name': category_name}
+            normalized_name = normalize_skill_name(name)
+            keys[pk].add(normalized_name)
+            keys[pk].update(normalized_name.split())
+        for alias, skill_id in SkillAlias.objects.values_list('alias', 'skill_id'):
+            keys[skill_id].add(alias)
+
+        self.root = {}
+        for pk, names in keys.items():
+            # Sorting on (-popularity, name) keeps the most used skills first
+            entry = (-popularity[pk], skills[pk]['name'], pk)
+            for key in names:
+                self.insert(key, entry)
+        self.skills = skills
+        self.built_at = time.monotonic()
+
+    def invalidate(self):
+        self.built_at = 0.0
+
+    def complete(self, prefix, limit=10):
+        ttl = getattr(settings, 'SKILL_AUTOCOMPLETE_TTL', 300)
+        with self.lock:
+            if time.monotonic() - self.built_at > ttl:
+                self.build()
+            root, skills = self.root, self.skills
+
+        node = root
+        for char in normalize_skill_name(prefix):
+            node = node.get(char)
+            if node is None:
+                return []
+        return [skills[pk] for _, _, pk in node.get('', [])[:limit]]
+
+
+skill_trie = SkillTrie()
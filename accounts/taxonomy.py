@@ -0,0 +1,157 @@
+"""
+Hierarchical skill categories backed by a closure table.
+
+SkillCategoryClosure holds one row per (ancestor, descendant) pair of the
+category tree, including every category paired with itself at depth 0.
+"Everything under Programming" is then a single indexed join on
+``ancestor_id`` instead of a recursive walk, see ``subtree_filter``.
+
+Each category also keeps ``subtree_skill_count``, the number of skills in
+it and all of its descendants. The counts and closure rows are updated
+incrementally when categories are created or moved and when skills are
+created, moved or deleted through the model API. Bulk operations that
+bypass ``save()`` either call the helpers here (the importer does) or are
+followed by ``rebuild_category_tree``. Categories created before the
+closure table existed are picked up after ``migrate`` by
+``backfill_category_tree``.
+"""
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Q
+
+from .models import Skill, SkillCategory, SkillCategoryClosure
+
+
+def subtree_filter(category_id, field='category'):
+    """Q matching rows whose ``field`` category is ``category_id`` or below it"""
+    return Q(**{f'{field}__ancestor_links__ancestor_id': category_id})
+
+
+def subtree_ids(category_id):
+    return SkillCategoryClosure.objects.filter(ancestor_id=category_id).values('descendant_id')
+
+
+def add_roots(category_ids):
+    """Give new top-level categories their self rows (idempotent)"""
+    SkillCategoryClosure.objects.bulk_create(
+        [
+            SkillCategoryClosure(ancestor_id=pk, descendant_id=pk, depth=0)
+            for pk in category_ids
+        ],
+        ignore_conflicts=True
+    )
+
+
+def insert_category(category):
+    """Closure rows for a newly created category"""
+    links = [SkillCategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+    if category.parent_id:
+        for ancestor_id, depth in SkillCategoryClosure.objects.filter(
+            descendant_id=category.parent_id
+        ).values_list('ancestor_id', 'depth'):
+            links.append(SkillCategoryClosure(
+                ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1
+            ))
+    SkillCategoryClosure.objects.bulk_create(links)
+
+
+def check_parent(category, parent_id):
+    """Raise ValidationError if ``parent_id`` lies inside ``category``'s subtree"""
+    if category.pk and parent_id and SkillCategoryClosure.objects.filter(
+        ancestor_id=category.pk, descendant_id=parent_id
+    ).exists():
+        raise ValidationError("A category cannot be moved under itself or one of its subcategories.")
+
+
+@transaction.atomic
+def move_category(category, old_parent_id):
+    """Re-link ``category`` and its subtree under its new ``parent_id``"""
+    check_parent(category, category.parent_id)
+    subtree = list(SkillCategoryClosure.objects.filter(
+        ancestor_id=category.pk
+    ).values_list('descendant_id', 'depth'))
+    subtree_pks = [pk for pk, _ in subtree]
+    count = SkillCategory.objects.filter(pk=category.pk).values_list(
+        'subtree_skill_count', flat=True
+    ).get()
+
+    if old_parent_id:
+        SkillCategory.objects.filter(
+            descendant_links__descendant_id=old_parent_id
+        ).update(subtree_skill_count=F('subtree_skill_count') - count)
+    SkillCategoryClosure.objects.filter(descendant_id__in=subtree_pks).exclude(
+        ancestor_id__in=subtree_pks
+    ).delete()
+
+    if category.parent_id:
+        ancestors = list(SkillCategoryClosure.objects.filter(
+            descendant_id=category.parent_id
+        ).values_list('ancestor_id', 'depth'))
+        SkillCategoryClosure.objects.bulk_create([
+            SkillCategoryClosure(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=ancestor_depth + depth + 1
+            )
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, depth in subtree
+        ])
+        SkillCategory.objects.filter(
+            descendant_links__descendant_id=category.parent_id
+        ).update(subtree_skill_count=F('subtree_skill_count') + count)
+
+
+def adjust_skill_counts(deltas):
+    """Apply {category_id: delta} to each category and all of its ancestors"""
+    totals = Counter()
+    for descendant_id, ancestor_id in SkillCategoryClosure.objects.filter(
+        descendant_id__in=[pk for pk, delta in deltas.items() if delta]
+    ).values_list('descendant_id', 'ancestor_id'):
+        totals[ancestor_id] += deltas[descendant_id]
+
+    by_delta = {}
+    for ancestor_id, delta in totals.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(ancestor_id)
+    for delta, pks in by_delta.items():
+        SkillCategory.objects.filter(pk__in=pks).update(
+            subtree_skill_count=F('subtree_skill_count') + delta
+        )
+
+
+@transaction.atomic
+def rebuild_category_tree():
+    """Recompute all closure rows and subtree counts from the parent pointers"""
+    parents = dict(SkillCategory.objects.values_list('id', 'parent_id'))
+    links = []
+    for pk in parents:
+        ancestor_id, depth, seen = pk, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(SkillCategoryClosure(ancestor_id=ancestor_id, descendant_id=pk, depth=depth))
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+
+    SkillCategoryClosure.objects.all().delete()
+    SkillCategoryClosure.objects.bulk_create(links, batch_size=1000)
+
+    direct = Counter(dict(
+        Skill.objects.order_by().values('category_id').annotate(
+            count=Count('id')
+        ).values_list('category_id', 'count')
+    ))
+    totals = Counter()
+    for link in links:
+        totals[link.ancestor_id] += direct[link.descendant_id]
+    categories = list(SkillCategory.objects.only('id'))
+    for category in categories:
+        category.subtree_skill_count = totals[category.pk]
+    SkillCategory.objects.bulk_update(categories, ['subtree_skill_count'], batch_size=1000)
+    return len(links)
+
+
+def backfill_category_tree(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate: rebuild the tree if any category has no closure rows yet"""
+    if SkillCategory.objects.using(using).filter(ancestor_links__isnull=True).exists():
+        rebuild_category_tree()
@@ -1,3 +1,384 @@
-from django.test import TestCase
+import io
+import json
+import math
+import random
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models.signals import post_migrate
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from SkillExchange import throttling
+from skills import leaderboard
+from skills.models import TeacherScore
+
+from . import geo, images, recommendations, synonyms, taxonomy
+from .hashing import TunablePBKDF2PasswordHasher
+from .importers import import_file
+from .models import (
+    Skill, SkillCategory, SkillCategoryClosure, SkillNeighbor, SkillRecommendation, SkillWanted, UserRating
+)
+from .serializers import UserProfileSerializer
+
+User = get_user_model()
+
+
+def jsonl(*rows):
+    return io.StringIO(''.join(json.dumps(row) + '\n' for row in rows))
+
+
+class BulkImportTests(TestCase):
+
+    def test_username_collisions_are_reported(self):
+        User.objects.create(email='taken@old.com', username='ann')
+        report = import_file(jsonl(
+            {'email': 'ann@one.com'},
+            {'email': 'bob@one.com'},
+            {'email': 'bob@two.com'},
+        ), 'jsonl')
+
+        self.assertEqual(report.users_created, 1)
+        self.assertEqual(
+            [error['line'] for error in report.errors], [1, 3]
+        )
+        self.assertIn('"bob" is already taken', report.errors[1]['error'])
+
+    def test_existing_email_matches_case_insensitively(self):
+        User.objects.create(email='Foo@x.com', username='foo')
+        report = import_file(jsonl({'email': 'foo@x.com', 'username': 'foo2'}), 'jsonl')
+
+        self.assertEqual(report.users_created, 0)
+        self.assertEqual(report.duplicates, 1)
+        self.assertEqual(User.objects.filter(email__iexact='foo@x.com').count(), 1)
+
+    def test_counts_only_rows_actually_inserted(self):
+        music = SkillCategory.objects.create(name='Music')
+        Skill.objects.create(name='Guitar', category=music)
+        report = import_file(jsonl(
+            {'email': 'a@x.com', 'teaches': ['Music/Guitar', 'Music/Piano', 'Art/Drawing']},
+            {'email': 'b@x.com', 'wants': ['Music/guitar:high', 'Art/Drawing']},
+        ), 'jsonl')
+
+        self.assertEqual(report.categories_created, 1)
+        self.assertEqual(report.skills_created, 2)
+        self.assertEqual(report.user_skills_created, 3)
+        self.assertEqual(report.skills_wanted_created, 2)
+        music.refresh_from_db()
+        self.assertEqual(music.subtree_skill_count, 2)
+
+
+class TunableHasherTests(TestCase):
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=None)
+    def test_defaults_to_django_iterations(self):
+        self.assertEqual(TunablePBKDF2PasswordHasher().iterations, PBKDF2PasswordHasher.iterations)
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_lowered_iterations_never_downgrade_stored_hashes(self):
+        hasher = TunablePBKDF2PasswordHasher()
+        stronger = hasher.encode('secret', hasher.salt(), iterations=PBKDF2PasswordHasher.iterations)
+        weaker = hasher.encode('secret', hasher.salt(), iterations=500)
+
+        self.assertFalse(hasher.must_update(stronger))
+        self.assertTrue(hasher.must_update(weaker))
+
+
+@override_settings(
+    ROOT_URLCONF='accounts.urls',
+    THROTTLE_STORE={'BACKEND': 'memory'},
+    TOKEN_BUCKETS={'search': {'capacity': 5, 'refill_per_second': 0.001}},
+)
+class AsyncViewAccessTests(TestCase):
+
+    def setUp(self):
+        throttling._store = None
+        self.addCleanup(setattr, throttling, '_store', None)
+        self.user = User.objects.create(email='ann@example.com', username='ann')
+
+    def test_requires_authentication(self):
+        response = self.client.get(reverse('async-search-users'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_applies_the_token_bucket_of_the_sync_view(self):
+        self.client.force_login(self.user)
+        first = self.client.get(reverse('async-search-users'))
+        second = self.client.get(reverse('async-search-users'))
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['X-RateLimit-Cost'], '5')
+        self.assertEqual(second.status_code, 429)
+        self.assertIn('Retry-After', second)
+
+    def test_profile_has_the_fields_of_the_sync_serializer(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('async-profile'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), set(UserProfileSerializer(self.user).data))
+
+    @override_settings(TOKEN_BUCKETS={})
+    def test_streamed_search_runs_no_per_row_queries(self):
+        rater = User.objects.create(email='bob@example.com', username='bob')
+        UserRating.objects.create(rated_user=self.user, rated_by=rater, rating=4)
+        self.client.force_login(self.user)
+
+        def search():
+            response = self.client.get(reverse('search-users'))
+            return json.loads(b''.join(response.streaming_content))
+
+        with CaptureQueriesContext(connection) as few:
+            search()
+        for n in range(3):
+            User.objects.create(email=f'u{n}@example.com', username=f'u{n}')
+        with CaptureQueriesContext(connection) as more:
+            results = search()
+
+        self.assertEqual(len(few), len(more))
+        ann = next(item for item in results if item['username'] == 'ann')
+        self.assertEqual((ann['average_rating'], ann['total_ratings']), (4.0, 1))
+
+    def test_stats(self):
+        rater = User.objects.create(email='bob@example.com', username='bob')
+        UserRating.objects.create(rated_user=self.user, rated_by=rater, rating=4)
+        self.client.force_login(self.user)
+        stats = self.client.get(reverse('async-user-stats')).json()
+
+        self.assertEqual(
+            (stats['total_skills'], stats['skills_wanted'], stats['average_rating'], stats['total_ratings']),
+            (0, 0, 4.0, 1)
+        )
+        self.assertEqual(stats['ratings_given'], 0)
+
+
+def send_post_migrate():
+    post_migrate.send(
+        sender=apps.get_app_config('accounts'), app_config=apps.get_app_config('accounts'),
+        verbosity=0, interactive=False, using='default', apps=apps, plan=[]
+    )
+
+
+class CategoryTreeTests(TestCase):
+
+    def test_post_migrate_backfills_categories_without_closure_rows(self):
+        tech = SkillCategory.objects.create(name='Tech')
+        web = SkillCategory.objects.create(name='Web', parent=tech)
+        Skill.objects.create(name='Django', category=web)
+        # As if both categories existed before the closure table
+        SkillCategoryClosure.objects.all().delete()
+        self.assertFalse(Skill.objects.filter(taxonomy.subtree_filter(tech.pk)).exists())
+
+        send_post_migrate()
+
+        self.assertEqual(Skill.objects.filter(taxonomy.subtree_filter(tech.pk)).count(), 1)
+        tech.refresh_from_db()
+        self.assertEqual(tech.subtree_skill_count, 1)
+
+
+class SkillMergeTests(TestCase):
+
+    def setUp(self):
+        self.category = SkillCategory.objects.create(name='Tech')
+
+    def test_post_migrate_normalizes_existing_names(self):
+        skill = Skill.objects.create(name='Java-Script', category=self.category)
+        Skill.objects.filter(pk=skill.pk).update(normalized_name='')
+
+        send_post_migrate()
+
+        self.assertEqual(synonyms.resolve('java script'), skill.pk)
+
+    def test_merging_both_neighbours_leaves_no_self_pairs(self):
+        target, js, ecma = (
+            Skill.objects.create(name=name, category=self.category)
+            for name in ('JavaScript', 'JS', 'ECMAScript')
+        )
+        for skill, neighbor in ((js, ecma), (ecma, js)):
+            SkillNeighbor.objects.create(
+                skill=skill, neighbor=neighbor, kind='taught', score=0.5, co_count=3,
+                computed_at=timezone.now()
+            )
+
+        synonyms.merge_skills(target, [js, ecma])
+
+        self.assertFalse(SkillNeighbor.objects.exists())
+        self.assertEqual(synonyms.resolve('js'), target.pk)
+
+    def test_merge_moves_skill_leaderboard_entries(self):
+        target, js = (Skill.objects.create(name=name, category=self.category) for name in ('JavaScript', 'JS'))
+        teacher = User.objects.create(email='ann@example.com', username='ann')
+        student = User.objects.create(email='bob@example.com', username='bob')
+        UserRating.objects.create(rated_user=teacher, rated_by=student, rating=4, Skill=js)
+        leaderboard.recompute_teacher(teacher.pk)
+
+        synonyms.merge_skills(target, [js])
+
+        entries = TeacherScore.objects.filter(teacher=teacher, scope='skill')
+        self.assertEqual(list(entries.values_list('scope_id', 'rating_sum')), [(target.pk, 4)])
+
+
+def png_upload():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile('me.png', buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(PROFILE_PICTURES={'WORKERS': 0, 'SIZES': {'sm': 4}})
+class ProfilePictureTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create(email='ann@example.com', username='ann')
+
+    def serializer(self):
+        return UserProfileSerializer(self.user, data={'profile_picture': png_upload()}, partial=True)
+
+    def test_picture_is_processed_on_save_only(self):
+        serializer = self.serializer()
+        with mock.patch.object(images, 'store', wraps=images.store) as store:
+            self.assertTrue(serializer.is_valid())
+            store.assert_not_called()
+            serializer.save()
+        store.assert_called_once()
+
+        self.user.refresh_from_db()
+        self.assertTrue(images.is_processed(self.user.profile_picture.name))
+
+    def test_undecodable_picture_is_a_validation_error(self):
+        serializer = self.serializer()
+        self.assertTrue(serializer.is_valid())
+        with mock.patch.object(images, 'process', side_effect=OSError('broken data stream')):
+            with self.assertRaises(ValidationError) as caught:
+                serializer.save()
+        self.assertIn('profile_picture', caught.exception.detail)
+
+
+def destination(latitude, longitude, bearing, km):
+    """Point ``km`` from the given one along ``bearing`` degrees"""
+    distance = km / geo.EARTH_RADIUS_KM
+    phi1, lambda1, theta = map(math.radians, (latitude, longitude, bearing))
+    phi2 = math.asin(
+        math.sin(phi1) * math.cos(distance) + math.cos(phi1) * math.sin(distance) * math.cos(theta)
+    )
+    lambda2 = lambda1 + math.atan2(
+        math.sin(theta) * math.sin(distance) * math.cos(phi1),
+        math.cos(distance) - math.sin(phi1) * math.sin(phi2)
+    )
+    return math.degrees(phi2), (math.degrees(lambda2) + 540.0) % 360.0 - 180.0
+
+
+class GeohashCoveringTests(SimpleTestCase):
+
+    def test_encode(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744), 'u4pruydqq')
+
+    def test_block_covers_every_point_of_the_circle(self):
+        rng = random.Random(7)
+        centres = [(51.5, -0.12), (0.0, 179.99), (-60.0, -179.9), (70.0, 25.0), (89.5, 0.0), (-89.9, 100.0)]
+        for latitude, longitude in centres:
+            for radius_km in (0.05, 0.5, 5, 50, 500):
+                covering = geo.covering_for_radius(radius_km, latitude)
+                if covering is None:
+                    continue
+                cells = geo.covering_cells(latitude, longitude, *covering)
+                for _ in range(200):
+                    point = destination(latitude, longitude, rng.uniform(0, 360), radius_km * rng.random())
+                    with self.subTest(centre=(latitude, longitude), radius_km=radius_km, point=point):
+                        self.assertIn(geo.encode(*point, covering[0]), cells)
+
+    def test_circle_around_a_pole_has_no_block(self):
+        self.assertIsNone(geo.covering_for_radius(50, 89.9))
+
+
+class ProximitySearchTests(TestCase):
+
+    def setUp(self):
+        # 0.5, 3 and 30 km east of the centre, across the antimeridian
+        self.centre = (10.0, 179.999)
+        self.users = [
+            User.objects.create(
+                email=f'{name}@example.com', username=name, latitude=latitude, longitude=longitude
+            )
+            for name, (latitude, longitude) in zip(
+                ('near', 'mid', 'far'),
+                (destination(*self.centre, 90, km) for km in (0.5, 3, 30)),
+            )
+        ]
+
+    def test_within_radius(self):
+        found = geo.within_radius(User.objects.all(), *self.centre, radius_km=5)
+        self.assertEqual([user.username for user in found], ['near', 'mid'])
+
+    def test_nearest(self):
+        found = geo.nearest(User.objects.all(), *self.centre, k=2)
+        self.assertEqual([user.username for user in found], ['near', 'mid'])
+
+
+class RecommendationTests(TestCase):
+
+    def setUp(self):
+        category = SkillCategory.objects.create(name='Tech')
+        self.python, self.django, self.rust = (
+            Skill.objects.create(name=name, category=category) for name in ('Python', 'Django', 'Rust')
+        )
+        self.users = [User.objects.create(email=f'u{n}@example.com', username=f'u{n}') for n in range(4)]
+        for user, skills in zip(self.users, [
+            (self.python, self.django), (self.python, self.django), (self.python, self.rust), (self.python,)
+        ]):
+            for skill in skills:
+                SkillWanted.objects.create(user=user, skill=skill)
+
+    def recommended(self, user):
+        return list(SkillRecommendation.objects.filter(user=user).values_list('skill__name', flat=True))
+
+    def test_build_neighbors_keeps_pairs_seen_often_enough(self):
+        self.assertEqual(recommendations.build_neighbors('wanted', min_count=2), 2)
+
+        neighbor = SkillNeighbor.objects.get(skill=self.python, kind='wanted')
+        self.assertEqual((neighbor.neighbor_id, neighbor.co_count), (self.django.pk, 2))
+        self.assertAlmostEqual(neighbor.score, 2 / math.sqrt(4 * 2))
+
+    def test_refresh_users_recommends_neighbours_not_yet_wanted(self):
+        recommendations.build_neighbors('wanted')
+        self.assertEqual(recommendations.refresh_users([self.users[3].pk]), 1)
+
+        self.assertEqual(self.recommended(self.users[3]), ['Django'])
+        self.assertEqual(self.recommended(self.users[0]), [])
+
+    def test_full_refresh_replaces_rows_and_prunes_users_without_skills(self):
+        recommendations.refresh()
+        self.assertEqual(self.recommended(self.users[3]), ['Django'])
+
+        SkillWanted.objects.filter(user=self.users[3]).delete()
+        summary = recommendations.refresh()
+
+        self.assertEqual(summary['pruned'], 1)
+        self.assertEqual(self.recommended(self.users[3]), [])
+
+    def test_incremental_refresh_only_recomputes_changed_users(self):
+        recommendations.refresh()
+        computed = dict(SkillRecommendation.objects.values_list('user_id', 'computed_at'))
+        newcomer = User.objects.create(email='new@example.com', username='new')
+        SkillWanted.objects.create(user=newcomer, skill=self.python)
+
+        summary = recommendations.refresh(incremental=True)
+
+        self.assertEqual((summary['incremental'], summary['users']), (True, 1))
+        self.assertEqual(self.recommended(newcomer), ['Django'])
+        self.assertEqual(
+            SkillRecommendation.objects.get(user=self.users[3]).computed_at, computed[self.users[3].pk]
+        )
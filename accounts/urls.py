@@ -1,11 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    UserRegistrationView, UserProfileView, UserDetailView,
+    UserRegistrationView, BulkImportView, UserProfileView, UserDetailView,
     ChangePasswordView, SkillCategoryViewSet, SkillViewSet,
     UserSkillViewSet, SkillWantedViewSet, UserRatingViewSet,
     SearchUsersView, UserStatsView
 )
+from .async_views import (
+    AsyncUserProfileView, AsyncUserStatsView,
+    AsyncSearchUsersView, AsyncFindMatchesView
+)
 
 # Create router for viewsets
 router = DefaultRouter()
@@ -23,12 +27,20 @@ urlpatterns = [
     path('profile/', UserProfileView.as_view(), name='profile'),
     path('profile/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
     path('change-password/', ChangePasswordView.as_view(), name='change-password'),
+    path('import/', BulkImportView.as_view(), name='bulk-import'),
     
     # Search and stats endpoints
     path('search/', SearchUsersView.as_view(), name='search-users'),
     path('stats/', UserStatsView.as_view(), name='user-stats'),
     path('stats/<int:user_id>/', UserStatsView.as_view(), name='user-stats-detail'),
     
+    # Async read endpoints (served through ASGI)
+    path('async/profile/', AsyncUserProfileView.as_view(), name='async-profile'),
+    path('async/stats/', AsyncUserStatsView.as_view(), name='async-user-stats'),
+    path('async/stats/<int:user_id>/', AsyncUserStatsView.as_view(), name='async-user-stats-detail'),
+    path('async/search/', AsyncSearchUsersView.as_view(), name='async-search-users'),
+    path('async/matches/', AsyncFindMatchesView.as_view(), name='async-find-matches'),
+    
     # Router URLs
     path('', include(router.urls)),
 ]
\ No newline at end of file
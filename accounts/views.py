@@ -1,21 +1,30 @@
 from rest_framework import viewsets, status, generics, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Avg
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q, Avg, Count
 from django_filters.rest_framework import DjangoFilterBackend
 
+from SkillExchange.streaming import StreamingListMixin, stream_queryset
+
+from . import geo, hashing, taxonomy
+from .filters import SkillFilter, UserSkillFilter, SkillWantedFilter
+from .importers import import_file
+from .synonyms import skill_trie
 from .models import (
-    SkillCategory, Skill, UserSkill, SkillWanted, UserRating
+    SkillCategory, Skill, UserSkill, SkillWanted, UserRating,
+    SkillRecommendation
 )
 from .serializers import (
     UserRegistrationSerializer, UserProfileSerializer,
     UserDetailSerializer, ChangePasswordSerializer,
     SkillCategorySerializer, SkillSerializer,
     UserSkillSerializer, SkillWantedSerializer,
-    UserRatingSerializer
+    UserRatingSerializer, SkillRecommendationSerializer
 )
 
 User = get_user_model()
@@ -38,6 +47,30 @@ class UserRegistrationView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class BulkImportView(APIView):
+    """View for bulk importing users and skills from a CSV or JSONL upload"""
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'file': ['No file was uploaded.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        file_format = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in ('csv', 'jsonl'):
+            return Response(
+                {'format': ['Format must be "csv" or "jsonl".']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        report = import_file(upload.file, file_format)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """View for retrieving and updating user profile"""
     serializer_class = UserProfileSerializer
@@ -64,16 +97,25 @@ class ChangePasswordView(APIView):
         if serializer.is_valid():
             user = request.user
             
-            # Check old password
-            if not user.check_password(serializer.data.get('old_password')):
+            # Check old password (hash work runs in the hashing pool)
+            if not hashing.verify(serializer.validated_data['old_password'], user.password):
                 return Response(
                     {'old_password': ['Wrong password.']},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Set new password
-            user.set_password(serializer.data.get('new_password'))
-            user.save()
+            # Validate and set new password
+            try:
+                user.password = hashing.validate_and_hash(
+                    serializer.validated_data['new_password'],
+                    hashing.user_fields(user)
+                )
+            except DjangoValidationError as exc:
+                return Response(
+                    {'new_password': list(exc.messages)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            user.save(update_fields=['password'])
             
             return Response(
                 {'message': 'Password updated successfully.'},
@@ -95,31 +137,45 @@ class SkillCategoryViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def skills(self, request, pk=None):
-        """Get all skills in a category"""
+        """Get all skills in a category, or in its whole subtree with ?subtree=true"""
         category = self.get_object()
-        skills = category.skills.all()
+        if request.query_params.get('subtree') in ('1', 'true'):
+            skills = Skill.objects.filter(taxonomy.subtree_filter(category.pk))
+        else:
+            skills = category.skills.all()
         serializer = SkillSerializer(skills, many=True)
         return Response(serializer.data)
 
 
-class SkillViewSet(viewsets.ModelViewSet):
+class SkillViewSet(StreamingListMixin, viewsets.ModelViewSet):
     """ViewSet for skills"""
     queryset = Skill.objects.all()
     serializer_class = SkillSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category']
+    filterset_class = SkillFilter
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['category', 'name']
+    throttle_costs = {'users_with_skill': 5}
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Complete a skill name prefix from the in-memory trie"""
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 10))
+        except ValueError:
+            limit = 10
+        return Response(skill_trie.complete(request.query_params.get('q', ''), limit))
 
     @action(detail=True, methods=['get'])
     def users_with_skill(self, request, pk=None):
         """Get all users who have this skill"""
         skill = self.get_object()
-        user_skills = UserSkill.objects.filter(skill=skill, can_teach=True)
-        serializer = UserSkillSerializer(user_skills, many=True)
-        return Response(serializer.data)
+        user_skills = UserSkill.objects.filter(
+            skill=skill, can_teach=True
+        ).select_related('skill__category')
+        return self.stream(user_skills, UserSkillSerializer)
 
 
 class UserSkillViewSet(viewsets.ModelViewSet):
@@ -127,7 +183,7 @@ class UserSkillViewSet(viewsets.ModelViewSet):
     serializer_class = UserSkillSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['proficiency_level', 'can_teach', 'skill__category']
+    filterset_class = UserSkillFilter
     ordering_fields = ['proficiency_level', 'years_of_experience', 'created_at']
     ordering = ['-proficiency_level', '-years_of_experience']
 
@@ -153,14 +209,15 @@ class UserSkillViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class SkillWantedViewSet(viewsets.ModelViewSet):
+class SkillWantedViewSet(StreamingListMixin, viewsets.ModelViewSet):
     """ViewSet for skills wanted to learn"""
     serializer_class = SkillWantedSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['priority', 'skill__category']
+    filterset_class = SkillWantedFilter
     ordering_fields = ['priority', 'created_at']
     ordering = ['-priority', '-created_at']
+    throttle_costs = {'find_matches': 10}
 
     def get_queryset(self):
         """Return wanted skills for the current user or filter by user_id"""
@@ -185,9 +242,21 @@ class SkillWantedViewSet(viewsets.ModelViewSet):
         matches = UserSkill.objects.filter(
             skill_id__in=wanted_skill_ids,
             can_teach=True
-        ).exclude(user=request.user)
+        ).exclude(user=request.user).select_related('skill__category')
         
-        serializer = UserSkillSerializer(matches, many=True)
+        return self.stream(matches, UserSkillSerializer)
+
+    @action(detail=False, methods=['get'])
+    def recommendations(self, request):
+        """Skills the current user might want to learn, from the precomputed table"""
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+        recommendations = SkillRecommendation.objects.filter(
+            user=request.user
+        ).select_related('skill__category')[:limit]
+        serializer = SkillRecommendationSerializer(recommendations, many=True)
         return Response(serializer.data)
 
 
@@ -222,61 +291,89 @@ class UserRatingViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+def with_rating_summary(users):
+    """Annotate the rating fields UserProfileSerializer reports, instead of per-row queries"""
+    return users.annotate(
+        average_rating=Avg('ratings_received__rating'),
+        total_ratings=Count('ratings_received', distinct=True),
+    )
+
+
+def search_users(params):
+    """Build the user search queryset from query parameters"""
+    query = params.get('q', '')
+    skill_id = params.get('skill_id', None)
+    category_id = params.get('category_id', None)
+    location = params.get('location', '')
+    min_rating = params.get('min_rating', None)
+    
+    users = User.objects.all()
+    
+    # Search by name, email, or username
+    if query:
+        users = users.filter(
+            Q(first_name__icontains=query) |
+            Q(last_name__icontains=query) |
+            Q(username__icontains=query) |
+            Q(email__icontains=query) |
+            Q(bio__icontains=query)
+        )
+    
+    # Filter by skill
+    if skill_id:
+        users = users.filter(
+            user_skills__skill_id=skill_id,
+            user_skills__can_teach=True
+        )
+    
+    # Filter by category, including its subcategories
+    if category_id:
+        users = users.filter(
+            taxonomy.subtree_filter(category_id, 'user_skills__skill__category'),
+            user_skills__can_teach=True
+        )
+    
+    # Filter by location
+    if location:
+        users = users.filter(location__icontains=location)
+    
+    # Filter by minimum rating
+    if min_rating:
+        users = users.annotate(
+            avg_rating=Avg('ratings_received__rating')
+        ).filter(avg_rating__gte=float(min_rating))
+    
+    return users.distinct()
+
+
 class SearchUsersView(APIView):
     """View for searching users by various criteria"""
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
+    throttle_scope = 'search'
+    throttle_cost = 5
 
     def get(self, request):
-        query = request.query_params.get('q', '')
-        skill_id = request.query_params.get('skill_id', None)
-        category_id = request.query_params.get('category_id', None)
-        location = request.query_params.get('location', '')
-        min_rating = request.query_params.get('min_rating', None)
-        
-        users = User.objects.all()
+        users = with_rating_summary(search_users(request.query_params))
         
-        # Search by name, email, or username
-        if query:
-            users = users.filter(
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query) |
-                Q(username__icontains=query) |
-                Q(email__icontains=query) |
-                Q(bio__icontains=query)
-            )
-        
-        # Filter by skill
-        if skill_id:
-            users = users.filter(
-                user_skills__skill_id=skill_id,
-                user_skills__can_teach=True
-            )
-        
-        # Filter by category
-        if category_id:
-            users = users.filter(
-                user_skills__skill__category_id=category_id,
-                user_skills__can_teach=True
-            )
-        
-        # Filter by location
-        if location:
-            users = users.filter(location__icontains=location)
+        # Proximity search: ?lat=&lng= with radius_km (default 20) or k nearest
+        nearby = geo.search(users, request.query_params)
+        if nearby is not None:
+            data = UserProfileSerializer(nearby, many=True, context={'request': request}).data
+            for item, user in zip(data, nearby):
+                item['distance_km'] = round(user.distance_km, 3)
+            return Response(data)
         
-        # Filter by minimum rating
-        if min_rating:
-            users = users.annotate(
-                avg_rating=Avg('ratings_received__rating')
-            ).filter(avg_rating__gte=float(min_rating))
-        
-        users = users.distinct()
-        serializer = UserProfileSerializer(users, many=True)
-        return Response(serializer.data)
+        return stream_queryset(
+            users, UserProfileSerializer, context={'request': request}
+        )
 
 
 class UserStatsView(APIView):
     """View for getting user statistics"""
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
+    throttle_cost = 3
 
     def get(self, request, user_id=None):
         if user_id:
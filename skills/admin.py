@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Count
+
+from SkillExchange.admin_utils import LargeTableAdmin
 from .models import (
     ExchangeRequest, ExchangeSession, SessionFeedback,
     SkillExchangeOffer, Booking, Notification
@@ -8,7 +10,7 @@ from .models import (
 
 
 @admin.register(ExchangeRequest)
-class ExchangeRequestAdmin(admin.ModelAdmin):
+class ExchangeRequestAdmin(LargeTableAdmin):
     """Admin configuration for ExchangeRequest"""
     list_display = [
         'id', 'requester_display', 'receiver_display',
@@ -17,10 +19,9 @@ class ExchangeRequestAdmin(admin.ModelAdmin):
     ]
     list_filter = ['status', 'created_at', 'proposed_date']
     search_fields = [
-        'requester__email', 'requester__username',
-        'receiver__email', 'receiver__username',
-        'skill_offered__name', 'skill_requested__name',
-        'message'
+        '=requester__email', '=requester__username',
+        '=receiver__email', '=receiver__username',
+        '^skill_offered__name', '^skill_requested__name'
     ]
     readonly_fields = ['created_at', 'updated_at', 'responded_at']
     ordering = ['-created_at']
@@ -83,7 +84,7 @@ class ExchangeRequestAdmin(admin.ModelAdmin):
 
 
 @admin.register(ExchangeSession)
-class ExchangeSessionAdmin(admin.ModelAdmin):
+class ExchangeSessionAdmin(LargeTableAdmin):
     """Admin configuration for ExchangeSession"""
     list_display = [
         'id', 'title', 'participant_1_display', 'participant_2_display',
@@ -91,9 +92,9 @@ class ExchangeSessionAdmin(admin.ModelAdmin):
     ]
     list_filter = ['status', 'meeting_type', 'scheduled_start', 'created_at']
     search_fields = [
-        'title', 'description',
-        'participant_1__email', 'participant_1__username',
-        'participant_2__email', 'participant_2__username'
+        '^title',
+        '=participant_1__email', '=participant_1__username',
+        '=participant_2__email', '=participant_2__username'
     ]
     readonly_fields = ['created_at', 'updated_at']
     ordering = ['-scheduled_start']
@@ -159,7 +160,7 @@ class ExchangeSessionAdmin(admin.ModelAdmin):
 
 
 @admin.register(SessionFeedback)
-class SessionFeedbackAdmin(admin.ModelAdmin):
+class SessionFeedbackAdmin(LargeTableAdmin):
     """Admin configuration for SessionFeedback"""
     list_display = [
         'id', 'session_title', 'user_display', 'overall_rating_stars',
@@ -169,10 +170,7 @@ class SessionFeedbackAdmin(admin.ModelAdmin):
         'overall_rating', 'teaching_quality', 'communication',
         'punctuality', 'would_recommend', 'created_at'
     ]
-    search_fields = [
-        'session__title', 'user__email', 'user__username',
-        'what_went_well', 'what_to_improve', 'additional_comments'
-    ]
+    search_fields = ['^session__title', '=user__email', '=user__username']
     readonly_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
     
@@ -193,7 +191,8 @@ class SessionFeedbackAdmin(admin.ModelAdmin):
     )
 
     def session_title(self, obj):
-        return obj.session.title
+        session = obj.session or obj.archived_session
+        return session.title
     session_title.short_description = 'Session'
 
     def user_display(self, obj):
@@ -220,7 +219,7 @@ class SessionFeedbackAdmin(admin.ModelAdmin):
 
 
 @admin.register(SkillExchangeOffer)
-class SkillExchangeOfferAdmin(admin.ModelAdmin):
+class SkillExchangeOfferAdmin(LargeTableAdmin):
     """Admin configuration for SkillExchangeOffer"""
     list_display = [
         'id', 'title', 'user_display', 'skill_name',
@@ -232,8 +231,8 @@ class SkillExchangeOfferAdmin(admin.ModelAdmin):
         'requires_exchange', 'created_at'
     ]
     search_fields = [
-        'title', 'description', 'user__email',
-        'user__username', 'skill__name'
+        '^title', '=user__email',
+        '=user__username', '^skill__name'
     ]
     readonly_fields = ['total_sessions', 'total_students', 'created_at', 'updated_at']
     ordering = ['-created_at']
@@ -285,7 +284,7 @@ class SkillExchangeOfferAdmin(admin.ModelAdmin):
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     """Admin configuration for Booking"""
     list_display = [
         'id', 'offer_title', 'student_display', 'teacher_display',
@@ -293,8 +292,8 @@ class BookingAdmin(admin.ModelAdmin):
     ]
     list_filter = ['status', 'created_at', 'proposed_datetime']
     search_fields = [
-        'offer__title', 'student__email', 'student__username',
-        'offer__user__email', 'message'
+        '^offer__title', '=student__email', '=student__username',
+        '=offer__user__email'
     ]
     readonly_fields = ['created_at', 'updated_at', 'confirmed_at']
     ordering = ['-created_at']
@@ -354,14 +353,14 @@ class BookingAdmin(admin.ModelAdmin):
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdmin):
     """Admin configuration for Notification"""
     list_display = [
         'id', 'user_display', 'notification_type_badge',
         'title', 'is_read_badge', 'created_at'
     ]
     list_filter = ['notification_type', 'is_read', 'created_at']
-    search_fields = ['user__email', 'user__username', 'title', 'message']
+    search_fields = ['=user__email', '=user__username', '^title']
     readonly_fields = ['created_at', 'read_at']
     ordering = ['-created_at']
     
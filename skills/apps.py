@@ -1,15 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class SkillsConfig(AppConfig):
     name = 'skills'
+    verbose_name = 'Skill Exchanges & Sessions'
 
+    def ready(self):
+        import skills.signals
+        import skills.read_models
+        from . import leaderboard
 
-default_auto_field = 'django.db.model.BigAutoField'
-name = 'skills'
-verbose_name = 'Skill Exchanges & Sessions'
- 
-def ready(self):
-    # Import signals here if needed
-    import skills.signals
-    
\ No newline at end of file
+        # Feedback written before it stored its teacher and skill
+        post_migrate.connect(leaderboard.backfill_feedback_targets, sender=self)
@@ -0,0 +1,69 @@
+"""
+Async variants of the read-heavy skills endpoints (see accounts.async_views).
+"""
+from django.db.models import Q, Value
+from django.db.models.functions import Concat
+from django.http import JsonResponse
+from django.utils import timezone
+
+from accounts.async_views import AsyncAuthenticatedView
+
+from .models import ExchangeSession, Notification
+
+MAX_PAGE_SIZE = 100
+
+
+def _limit(request, default=50):
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+class AsyncNotificationListView(AsyncAuthenticatedView):
+    """Async view for the current user's notifications"""
+
+    async def get_authenticated(self, request, user):
+        notifications = Notification.objects.filter(user=user)
+        if request.GET.get('unread') in ('1', 'true'):
+            notifications = notifications.filter(is_read=False)
+
+        notifications = notifications.order_by('-created_at').values(
+            'id', 'user', 'notification_type', 'title', 'message',
+            'exchange_request', 'session', 'booking', 'is_read',
+            'read_at', 'repeat_count', 'created_at'
+        )[:_limit(request)]
+
+        results = [row async for row in notifications]
+        return JsonResponse(results, safe=False)
+
+
+class AsyncUpcomingSessionsView(AsyncAuthenticatedView):
+    """Async view for the current user's upcoming sessions"""
+
+    async def get_authenticated(self, request, user):
+        sessions = ExchangeSession.objects.filter(
+            Q(participant_1=user) | Q(participant_2=user),
+            scheduled_start__gte=timezone.now(),
+            status='scheduled'
+        ).order_by('scheduled_start').values(
+            'id', 'exchange_request', 'participant_1', 'participant_2',
+            'title', 'description', 'status', 'meeting_type',
+            'scheduled_start', 'scheduled_end', 'meeting_link', 'location',
+            'created_at', 'updated_at',
+            participant_1_name=Concat(
+                'participant_1__first_name', Value(' '), 'participant_1__last_name'
+            ),
+            participant_2_name=Concat(
+                'participant_2__first_name', Value(' '), 'participant_2__last_name'
+            ),
+        )[:_limit(request)]
+
+        results = []
+        async for row in sessions:
+            row['duration_minutes'] = int(
+                (row['scheduled_end'] - row['scheduled_start']).total_seconds() / 60
+            )
+            results.append(row)
+        return JsonResponse(results, safe=False)
@@ -0,0 +1,120 @@
+"""
+Expiry of pending exchange requests and bookings nobody answered.
+
+Stale rows are found through the (status, created_at) and, for bookings,
+(status, proposed_datetime) indexes and moved to ``expired`` a chunk at a
+time: each chunk is one SELECT of at most ``BATCH_SIZE`` ids, one UPDATE
+guarded by ``status='pending'`` and one bulk insert of the notifications
+for the people who sent them. Short transactions keep the tables
+available to the API while a large backlog is worked off.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from SkillExchange import metrics
+
+from .models import Booking, ExchangeRequest, Notification
+
+
+DEFAULTS = {
+    'EXCHANGE_REQUEST_DAYS': 14,
+    'BOOKING_DAYS': 7,
+    'BATCH_SIZE': 1000,
+}
+
+
+def get_policy():
+    return {**DEFAULTS, **getattr(settings, 'PENDING_EXPIRY', {})}
+
+
+def stale_requests(now, policy):
+    cutoff = now - timedelta(days=policy['EXCHANGE_REQUEST_DAYS'])
+    return ExchangeRequest.objects.filter(status='pending', created_at__lt=cutoff)
+
+
+def stale_bookings(now, policy):
+    cutoff = now - timedelta(days=policy['BOOKING_DAYS'])
+    return Booking.objects.filter(
+        Q(created_at__lt=cutoff) | Q(proposed_datetime__lt=now),
+        status='pending'
+    )
+
+
+def request_notification(row):
+    return Notification(
+        user_id=row['requester_id'],
+        notification_type='request_expired',
+        title='Exchange Request Expired',
+        message=f'Your request to learn {row["skill_requested__name"]} expired without a response',
+        exchange_request_id=row['pk'],
+    )
+
+
+def booking_notification(row):
+    return Notification(
+        user_id=row['student_id'],
+        notification_type='booking_expired',
+        title='Booking Expired',
+        message=f'Your booking for "{row["offer__title"]}" expired without a confirmation',
+        booking_id=row['pk'],
+    )
+
+
+TARGETS = {
+    'exchange_requests': (
+        stale_requests, ('pk', 'requester_id', 'skill_requested__name'), request_notification
+    ),
+    'bookings': (
+        stale_bookings, ('pk', 'student_id', 'offer__title'), booking_notification
+    ),
+}
+
+
+def expire_chunk(queryset, fields, make_notification, now, batch_size):
+    """Expire at most ``batch_size`` rows of ``queryset``, returning how many"""
+    with transaction.atomic():
+        rows = list(queryset.select_for_update(of=('self',)).order_by().values(*fields)[:batch_size])
+        if not rows:
+            return 0
+        selected = queryset.model.objects.filter(pk__in=[row['pk'] for row in rows])
+        expired = selected.filter(status='pending').update(
+            status='expired', version=F('version') + 1, updated_at=now
+        )
+        if not expired:
+            return 0
+        # select_for_update is a no-op on SQLite: only notify for the rows this UPDATE moved
+        if expired < len(rows):
+            updated = set(selected.filter(status='expired', updated_at=now).values_list('pk', flat=True))
+            rows = [row for row in rows if row['pk'] in updated]
+        notifications = Notification.objects.bulk_create(
+            [make_notification(row) for row in rows]
+        )
+    metrics.inc(
+        'notifications_created_total', len(notifications),
+        type=notifications[0].notification_type
+    )
+    return expired
+
+
+def expire_stale(now=None, dry_run=False, **policy):
+    """Expire every stale pending row, returning {target: rows expired}"""
+    now = now or timezone.now()
+    policy = {**get_policy(), **policy}
+    summary = {}
+    for name, (stale, fields, make_notification) in TARGETS.items():
+        queryset = stale(now, policy)
+        if dry_run:
+            summary[name] = queryset.count()
+            continue
+        total = 0
+        while True:
+            expired = expire_chunk(queryset, fields, make_notification, now, policy['BATCH_SIZE'])
+            if not expired:
+                break
+            total += expired
+        summary[name] = total
+    return summary
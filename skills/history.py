@@ -0,0 +1,154 @@
+"""
+Hot/cold split for closed exchanges.
+
+Completed, cancelled, rejected, expired and no-show rows are rarely read
+after a while but make up most of ExchangeRequest, ExchangeSession and
+Booking. ``archive_closed`` moves those older than ``DAYS`` into the
+``*History`` tables, which mirror the live columns and keep the original
+ids, so the live tables (and every default viewset queryset) only hold
+rows that can still change.
+
+Rows are moved a chunk at a time: copy into the history table,
+detach notifications pointing at them and delete, all in one short
+transaction, which re-selects the chunk under the closed filter so a
+row reopened meanwhile stays live. Bookings go first, then sessions that
+no live booking still points to, then requests without live sessions.
+The feedback of a moved session is repointed to its history row; it
+keeps its own teacher and skill, so ratings and leaderboards never go
+through the session.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import (
+    Booking, BookingHistory, ExchangeRequest, ExchangeRequestHistory,
+    ExchangeSession, ExchangeSessionHistory, Notification, SessionFeedback
+)
+
+
+DEFAULTS = {
+    'DAYS': 90,
+    'BATCH_SIZE': 500,
+}
+MAX_PAGE_SIZE = 200
+
+
+def get_policy():
+    return {**DEFAULTS, **getattr(settings, 'EXCHANGE_ARCHIVE', {})}
+
+
+def closed_bookings(cutoff):
+    return Booking.objects.filter(
+        status__in=['completed', 'cancelled', 'expired'],
+        created_at__lt=cutoff
+    )
+
+
+def closed_sessions(cutoff):
+    return ExchangeSession.objects.filter(
+        status__in=['completed', 'cancelled', 'no_show'],
+        scheduled_start__lt=cutoff
+    ).exclude(
+        Exists(Booking.objects.filter(session=OuterRef('pk')))
+    )
+
+
+def closed_requests(cutoff):
+    return ExchangeRequest.objects.filter(
+        status__in=['completed', 'cancelled', 'rejected', 'expired'],
+        created_at__lt=cutoff
+    ).exclude(
+        Exists(ExchangeSession.objects.filter(exchange_request=OuterRef('pk')))
+    )
+
+
+def repoint_feedback(pks):
+    SessionFeedback.objects.filter(session_id__in=pks).update(
+        archived_session_id=F('session_id'), session=None
+    )
+
+
+# (name, live queryset factory, history model, Notification field,
+#  callable moving other rows off the archived pks or None)
+TIERS = [
+    ('bookings', closed_bookings, BookingHistory, 'booking', None),
+    ('sessions', closed_sessions, ExchangeSessionHistory, 'session', repoint_feedback),
+    ('exchange_requests', closed_requests, ExchangeRequestHistory, 'exchange_request', None),
+]
+
+
+def column_map(live_model, history_model):
+    """{history attname: live attname} for the mirrored columns"""
+    return {
+        field.attname: live_model._meta.get_field(field.name).attname
+        for field in history_model._meta.concrete_fields
+        if field.name != 'archived_at'
+    }
+
+
+def move_chunk(queryset, history_model, notification_field, batch_size, now, repoint=None):
+    """Move at most ``batch_size`` rows of ``queryset``, returning how many"""
+    live_model = queryset.model
+    columns = column_map(live_model, history_model)
+    with transaction.atomic():
+        # Selected and locked in the transaction that deletes them, so a
+        # row reopened since the caller's count is not archived
+        rows = list(queryset.order_by('pk').select_for_update().values(*columns.values())[:batch_size])
+        if not rows:
+            return 0
+        pks = [row[live_model._meta.pk.attname] for row in rows]
+        history_model.objects.bulk_create(
+            [
+                history_model(archived_at=now, **{
+                    name: row[live_name] for name, live_name in columns.items()
+                })
+                for row in rows
+            ],
+            ignore_conflicts=True
+        )
+        Notification.objects.filter(**{f'{notification_field}__in': pks}).update(
+            **{notification_field: None}
+        )
+        if repoint is not None:
+            repoint(pks)
+        live_model.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def archive_closed(now=None, dry_run=False, **policy):
+    """Move closed rows older than DAYS to the history tables, returning counts"""
+    now = now or timezone.now()
+    policy = {**get_policy(), **policy}
+    cutoff = now - timedelta(days=policy['DAYS'])
+    summary = {}
+    for name, closed, history_model, notification_field, repoint in TIERS:
+        queryset = closed(cutoff)
+        if dry_run:
+            summary[name] = queryset.count()
+            continue
+        moved = 0
+        while True:
+            chunk = move_chunk(
+                queryset, history_model, notification_field, policy['BATCH_SIZE'], now, repoint
+            )
+            if not chunk:
+                break
+            moved += chunk
+        summary[name] = moved
+    return summary
+
+
+def history_page(queryset, request):
+    """Newest-first slice of a history queryset, continued with ``?before=<id>``"""
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 50)), MAX_PAGE_SIZE))
+    except ValueError:
+        limit = 50
+    before = request.query_params.get('before')
+    if before and before.isdigit():
+        queryset = queryset.filter(pk__lt=int(before))
+    return queryset.order_by('-pk')[:limit]
@@ -0,0 +1,238 @@
+"""
+Top-teacher leaderboards, globally, per skill and per category.
+
+TeacherScore keeps running totals per (teacher, scope): the teaching
+quality ratings from session feedback plus the UserRating stars the
+teacher received, the number of sessions with feedback and how many of
+them were recommended. Category scopes include every ancestor category of
+the skill, so "Programming" ranks teachers of any skill below it.
+
+Entries are ranked by ``score``::
+
+    smoothed rating + RECOMMEND_WEIGHT * smoothed recommend rate
+                    + SESSION_WEIGHT * log1p(sessions)
+
+where both averages are pulled towards a prior, so one five star review
+does not beat a hundred good ones. The (scope, scope_id, -score, teacher)
+index serves the top-N as a range read and a teacher's rank as a count
+of the entries above it, which reads as many index entries as the rank.
+
+The outbox consumer (skills.read_models) recomputes every teacher a batch
+of feedback or rating changes touched from their own rows, so a change
+is never counted twice however its events are batched. ``rebuild``
+recomputes everything.
+"""
+import functools
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import Skill, SkillCategoryClosure, UserRating
+
+from .models import ExchangeSession, SessionFeedback, TeacherScore
+
+
+PRIOR_RATING = 3.0
+PRIOR_COUNT = 5
+PRIOR_RECOMMEND = 0.5
+RECOMMEND_WEIGHT = 1.0
+SESSION_WEIGHT = 0.25
+
+FEEDBACK_FIELDS = ('teacher_id', 'skill_id', 'teaching_quality', 'would_recommend')
+
+TARGET_FIELDS = (
+    'booking__offer__user_id', 'booking__offer__skill_id',
+    'exchange_request__requester_id', 'exchange_request__receiver_id',
+    'exchange_request__skill_offered_id', 'exchange_request__skill_requested_id',
+)
+
+
+def compute_score(rating_sum, rating_count, sessions, recommend_count):
+    rating = (rating_sum + PRIOR_RATING * PRIOR_COUNT) / (rating_count + PRIOR_COUNT)
+    recommend = (recommend_count + PRIOR_RECOMMEND * PRIOR_COUNT) / (sessions + PRIOR_COUNT)
+    return rating + RECOMMEND_WEIGHT * recommend + SESSION_WEIGHT * math.log1p(sessions)
+
+
+def feedback_teacher(author, row):
+    """(teacher id, skill id) that ``author`` rates in a session values() row, or None"""
+    if row['booking__offer__user_id'] is not None:
+        if author == row['booking__offer__user_id']:
+            return None
+        return row['booking__offer__user_id'], row['booking__offer__skill_id']
+    # In an exchange the requester teaches skill_offered and learns skill_requested
+    if author == row['exchange_request__requester_id']:
+        return row['exchange_request__receiver_id'], row['exchange_request__skill_requested_id']
+    if author == row['exchange_request__receiver_id']:
+        return row['exchange_request__requester_id'], row['exchange_request__skill_offered_id']
+    return None
+
+
+def feedback_target(session_id, author_id):
+    """What SessionFeedback stores as its teacher and skill, or None"""
+    row = ExchangeSession.objects.filter(pk=session_id).values(*TARGET_FIELDS).first()
+    return feedback_teacher(author_id, row) if row is not None else None
+
+
+def scopes_for(skill_id, ancestors):
+    """Scope keys a rating for ``skill_id`` counts towards"""
+    scopes = [('global', 0)]
+    if skill_id is not None:
+        scopes.append(('skill', skill_id))
+        scopes.extend(('category', category_id) for category_id in ancestors(skill_id))
+    return scopes
+
+
+def skill_ancestors(skill_id):
+    category_id = Skill.objects.filter(pk=skill_id).values_list('category_id', flat=True).first()
+    return list(SkillCategoryClosure.objects.filter(
+        descendant_id=category_id
+    ).values_list('ancestor_id', flat=True))
+
+
+def ancestor_map():
+    """Cached skill id -> ancestor category ids, for bulk recomputation"""
+    by_category = defaultdict(list)
+    for descendant_id, ancestor_id in SkillCategoryClosure.objects.values_list('descendant_id', 'ancestor_id'):
+        by_category[descendant_id].append(ancestor_id)
+    categories = dict(Skill.objects.values_list('pk', 'category_id'))
+    return lambda skill_id: by_category.get(categories.get(skill_id), [])
+
+
+def contributions(feedback_rows, rating_rows, ancestors):
+    """Sum feedback and rating rows into {(teacher, scope, scope_id): totals}"""
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for row in feedback_rows:
+        teacher_id, skill_id = row['teacher_id'], row['skill_id']
+        if teacher_id is None:
+            continue
+        for scope, scope_id in scopes_for(skill_id, ancestors):
+            entry = totals[teacher_id, scope, scope_id]
+            entry[0] += row['teaching_quality']
+            entry[1] += 1
+            entry[2] += 1
+            entry[3] += int(row['would_recommend'])
+    for teacher_id, skill_id, rating in rating_rows:
+        for scope, scope_id in scopes_for(skill_id, ancestors):
+            entry = totals[teacher_id, scope, scope_id]
+            entry[0] += rating
+            entry[1] += 1
+    return totals
+
+
+def score_rows(totals):
+    return [
+        TeacherScore(
+            teacher_id=teacher_id,
+            scope=scope,
+            scope_id=scope_id,
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            sessions=sessions,
+            recommend_count=recommend_count,
+            score=compute_score(rating_sum, rating_count, sessions, recommend_count),
+        )
+        for (teacher_id, scope, scope_id), (rating_sum, rating_count, sessions, recommend_count)
+        in totals.items()
+    ]
+
+
+def teacher_feedback(teacher_id):
+    """Feedback rows rating ``teacher_id``, live and archived sessions alike"""
+    return SessionFeedback.objects.filter(teacher_id=teacher_id).values(*FEEDBACK_FIELDS)
+
+
+@transaction.atomic
+def recompute_teacher(teacher_id):
+    """Rebuild one teacher's entries from their feedback and ratings"""
+    ratings = UserRating.objects.filter(rated_user_id=teacher_id).values_list(
+        'rated_user_id', 'Skill_id', 'rating'
+    )
+    totals = contributions(teacher_feedback(teacher_id), ratings, functools.cache(skill_ancestors))
+    totals = {key: value for key, value in totals.items() if key[0] == teacher_id}
+    stale = TeacherScore.objects.filter(teacher_id=teacher_id)
+    if totals:
+        kept = [Q(scope=scope, scope_id=scope_id) for _, scope, scope_id in totals]
+        stale = stale.exclude(Q(*kept, _connector=Q.OR))
+    stale.delete()
+    # Upsert: a concurrent recompute may have inserted the same entries
+    TeacherScore.objects.bulk_create(
+        score_rows(totals),
+        update_conflicts=True,
+        unique_fields=['teacher', 'scope', 'scope_id'],
+        update_fields=['rating_sum', 'rating_count', 'sessions', 'recommend_count', 'score', 'updated_at'],
+    )
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Recompute every leaderboard entry, returning how many were stored"""
+    feedback = SessionFeedback.objects.values(*FEEDBACK_FIELDS).iterator(chunk_size=5000)
+    ratings = UserRating.objects.values_list('rated_user_id', 'Skill_id', 'rating').iterator(chunk_size=5000)
+    rows = score_rows(contributions(feedback, ratings, ancestor_map()))
+    TeacherScore.objects.all().delete()
+    TeacherScore.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def retarget_feedback(session_ids):
+    """Re-resolve the teacher and skill of feedback on the given live
+    sessions, returning the teachers rated before or after"""
+    teachers = set()
+    if not session_ids:
+        return teachers
+    targets = {
+        row.pop('pk'): row
+        for row in ExchangeSession.objects.filter(pk__in=session_ids).values('pk', *TARGET_FIELDS)
+    }
+    changed = []
+    for feedback in SessionFeedback.objects.filter(session_id__in=session_ids).only(
+        'session_id', 'user_id', 'teacher_id', 'skill_id'
+    ):
+        target = feedback_teacher(feedback.user_id, targets[feedback.session_id]) or (None, None)
+        if target != (feedback.teacher_id, feedback.skill_id):
+            teachers.update((feedback.teacher_id, target[0]))
+            feedback.teacher_id, feedback.skill_id = target
+            changed.append(feedback)
+    SessionFeedback.objects.bulk_update(changed, ['teacher', 'skill'])
+    return teachers
+
+
+def backfill_feedback_targets(**kwargs):
+    """post_migrate: resolve the teacher and skill of feedback that predates them"""
+    retarget_feedback(set(SessionFeedback.objects.filter(
+        teacher__isnull=True, session__isnull=False
+    ).values_list('session_id', flat=True)))
+
+
+def skill_teachers(skill_ids):
+    """Teachers with an entry for any of the given skills"""
+    return set(TeacherScore.objects.filter(
+        scope='skill', scope_id__in=skill_ids
+    ).values_list('teacher_id', flat=True))
+
+
+def scope_entries(scope, scope_id):
+    return TeacherScore.objects.filter(scope=scope, scope_id=scope_id)
+
+
+def top(scope, scope_id, limit=10):
+    return scope_entries(scope, scope_id).select_related('teacher').order_by('-score', 'teacher_id')[:limit]
+
+
+def rank(teacher_id, scope, scope_id):
+    """
+    1-based rank of ``teacher_id`` and its entry, or (None, None).
+
+    The rank is a COUNT of the entries above the teacher's, a range scan
+    of the scope's index that costs O(rank): cheap near the top, but the
+    last teacher of a large scope reads the whole scope.
+    """
+    entry = scope_entries(scope, scope_id).filter(teacher_id=teacher_id).first()
+    if entry is None:
+        return None, None
+    above = scope_entries(scope, scope_id).filter(
+        Q(score__gt=entry.score) | Q(score=entry.score, teacher_id__lt=teacher_id)
+    ).count()
+    return above + 1, entry
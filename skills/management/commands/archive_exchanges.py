@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.history import archive_closed
+
+
+class Command(BaseCommand):
+    help = "Move closed exchange requests, sessions and bookings into the history tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Override EXCHANGE_ARCHIVE['DAYS']")
+        parser.add_argument('--batch-size', type=int, help="Rows moved per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the rows that would move")
+
+    def handle(self, *args, **options):
+        policy = {}
+        if options['days'] is not None:
+            policy['DAYS'] = options['days']
+        if options['batch_size']:
+            policy['BATCH_SIZE'] = options['batch_size']
+
+        started = time.monotonic()
+        summary = archive_closed(dry_run=options['dry_run'], **policy)
+        verb = "Would move" if options['dry_run'] else "Moved"
+        for name, count in summary.items():
+            self.stdout.write(f"{verb} {count} {name.replace('_', ' ')}")
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.monotonic() - started:.2f}s"))
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from SkillExchange.db import SQLITE_PRODUCTION_PRAGMAS
+
+
+PROFILES = {
+    # Django's defaults: rollback journal, 5s timeout, deferred transactions
+    'development': {'pragmas': {}, 'begin': 'BEGIN', 'timeout': 5.0},
+    'production': {
+        'pragmas': SQLITE_PRODUCTION_PRAGMAS,
+        'begin': 'BEGIN IMMEDIATE',
+        'timeout': SQLITE_PRODUCTION_PRAGMAS['busy_timeout'] / 1000,
+    },
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent reads and writes for the SQLite development and production profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--profile', choices=sorted(PROFILES), action='append')
+
+    def handle(self, *args, **options):
+        for name in options['profile'] or sorted(PROFILES):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                result = self.run_profile(
+                    PROFILES[name], os.path.join(tmpdir, 'bench.sqlite3'),
+                    options['writers'], options['readers'], options['seconds']
+                )
+            self.stdout.write(
+                f"{name:12} writes/s={result['writes'] / options['seconds']:9.1f} "
+                f"reads/s={result['reads'] / options['seconds']:9.1f} "
+                f"locked_errors={result['errors']}"
+            )
+
+    def connect(self, profile, path):
+        conn = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None,
+                               check_same_thread=False)
+        for pragma, value in profile['pragmas'].items():
+            conn.execute(f'PRAGMA {pragma}={value}')
+        return conn
+
+    def run_profile(self, profile, path, writers, readers, seconds):
+        conn = self.connect(profile, path)
+        conn.execute(
+            'CREATE TABLE notification (id INTEGER PRIMARY KEY, user_id INTEGER, '
+            'is_read INTEGER, message TEXT, created_at REAL)'
+        )
+        conn.execute('CREATE INDEX notification_user ON notification (user_id, is_read)')
+        conn.close()
+
+        counts = {'writes': 0, 'reads': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+
+        def writer(worker):
+            conn = self.connect(profile, path)
+            done = errors = 0
+            while time.monotonic() < deadline:
+                try:
+                    # Read-then-write, like the views' read-check-save pattern
+                    conn.execute(profile['begin'])
+                    conn.execute(
+                        'SELECT COUNT(*) FROM notification WHERE user_id = ? AND is_read = 0',
+                        (worker,)
+                    ).fetchone()
+                    conn.execute(
+                        'INSERT INTO notification (user_id, is_read, message, created_at) '
+                        'VALUES (?, 0, ?, ?)',
+                        (worker, 'x' * 200, time.time())
+                    )
+                    conn.execute('COMMIT')
+                    done += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+            conn.close()
+            with lock:
+                counts['writes'] += done
+                counts['errors'] += errors
+
+        def reader(worker):
+            conn = self.connect(profile, path)
+            done = errors = 0
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute(
+                        'SELECT id, message FROM notification WHERE user_id = ? '
+                        'ORDER BY id DESC LIMIT 20',
+                        (worker % max(writers, 1),)
+                    ).fetchall()
+                    done += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+            conn.close()
+            with lock:
+                counts['reads'] += done
+                counts['errors'] += errors
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.similarity import build
+
+
+class Command(BaseCommand):
+    help = "Compute the most similar teachers for every teacher"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help="Neighbours stored per teacher")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stored = build(top_n=options['top'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stored} teacher neighbours in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from SkillExchange import outbox
+from skills.read_models import CONSUMER
+
+
+class Command(BaseCommand):
+    help = "Apply outbox events to the read models (leaderboards, trending)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Consume the pending events and exit instead of running as a daemon"
+        )
+        parser.add_argument('--batch-size', type=int, help="Events applied per transaction")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['once']:
+            total = 0
+            while consumed := outbox.consume(CONSUMER, batch_size):
+                total += consumed
+            self.stdout.write(f"Consumed {total} events, pruned {outbox.prune()}")
+            return
+        self.stdout.write("Consumer running, press Ctrl+C to stop")
+        try:
+            outbox.run_forever(CONSUMER, batch_size, on_batch=self.report)
+        except KeyboardInterrupt:
+            pass
+
+    def report(self, consumed):
+        self.stdout.write(f"Consumed {consumed} events")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from skills.expiry import expire_stale
+
+
+class Command(BaseCommand):
+    help = "Expire pending exchange requests and bookings older than the configured policy"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--request-days', type=int, help="Override PENDING_EXPIRY['EXCHANGE_REQUEST_DAYS']")
+        parser.add_argument('--booking-days', type=int, help="Override PENDING_EXPIRY['BOOKING_DAYS']")
+        parser.add_argument('--batch-size', type=int, help="Rows expired per UPDATE")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the stale rows")
+
+    def handle(self, *args, **options):
+        policy = {}
+        if options['request_days'] is not None:
+            policy['EXCHANGE_REQUEST_DAYS'] = options['request_days']
+        if options['booking_days'] is not None:
+            policy['BOOKING_DAYS'] = options['booking_days']
+        if options['batch_size']:
+            policy['BATCH_SIZE'] = options['batch_size']
+
+        summary = expire_stale(dry_run=options['dry_run'], **policy)
+        verb = "Would expire" if options['dry_run'] else "Expired"
+        for name, count in summary.items():
+            self.stdout.write(f"{verb} {count} {name.replace('_', ' ')}")
@@ -0,0 +1,58 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from skills.snapshots import DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP, SNAPSHOT_TABLES, export_snapshot
+
+
+class Command(BaseCommand):
+    help = "Export exchange, session, feedback, booking, offer and rating tables to gzipped JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help="Directory the snapshot files are written to")
+        parser.add_argument(
+            '--table',
+            action='append',
+            dest='tables',
+            choices=sorted(SNAPSHOT_TABLES),
+            help="Only export this table (can be repeated)"
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help="Only export rows updated since the previous snapshot in output_dir"
+        )
+        parser.add_argument(
+            '--overlap',
+            type=float,
+            default=DEFAULT_OVERLAP.total_seconds(),
+            help="Seconds before the previous cut-off an incremental export starts from"
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            '--database',
+            default='default',
+            help="Database alias to read from (e.g. a replica)"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            results = export_snapshot(
+                options['output_dir'],
+                tables=options['tables'],
+                incremental=options['incremental'],
+                overlap=timedelta(seconds=options['overlap']),
+                using=options['database'],
+                chunk_size=options['chunk_size'],
+            )
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for result in results:
+            self.stdout.write(json.dumps(result))
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(results)} tables in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from skills.retention import prune_notifications
+
+
+class Command(BaseCommand):
+    help = "Collapse repeated notifications and archive old ones out of the hot table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--read-days', type=int, help="Override NOTIFICATION_RETENTION['READ_DAYS']")
+        parser.add_argument('--unread-days', type=int, help="Override NOTIFICATION_RETENTION['UNREAD_DAYS']")
+        parser.add_argument('--max-per-user', type=int, help="Override NOTIFICATION_RETENTION['MAX_PER_USER']")
+        parser.add_argument(
+            '--archive',
+            choices=['table', 'jsonl', 'none'],
+            help="Where removed rows go (default: NOTIFICATION_RETENTION['ARCHIVE'])"
+        )
+        parser.add_argument('--batch-size', type=int, help="Rows per chunk")
+
+    def handle(self, *args, **options):
+        policy = {}
+        for option, key in (
+            ('read_days', 'READ_DAYS'),
+            ('unread_days', 'UNREAD_DAYS'),
+            ('max_per_user', 'MAX_PER_USER'),
+            ('batch_size', 'BATCH_SIZE'),
+        ):
+            if options[option] is not None:
+                policy[key] = options[option]
+        if options['archive']:
+            policy['ARCHIVE'] = None if options['archive'] == 'none' else options['archive']
+        if policy.get('BATCH_SIZE', 1) < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        started = time.monotonic()
+        summary = prune_notifications(**policy)
+        self.stdout.write(self.style.SUCCESS(
+            f"Collapsed {summary['collapsed']}, expired {summary['expired']}, "
+            f"capped {summary['capped']} notifications in {time.monotonic() - started:.2f}s"
+        ))
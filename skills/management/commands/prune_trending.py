@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from skills.trending import prune, rebuild
+
+
+class Command(BaseCommand):
+    help = "Drop trending buckets older than TRENDING['KEEP_DAYS'], or recount the kept window"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Recount the kept buckets from the activity tables")
+        parser.add_argument('--batch-size', type=int, help="Buckets deleted per statement")
+
+    def handle(self, *args, **options):
+        removed = prune(batch_size=options['batch_size'])
+        self.stdout.write(f"Removed {removed} old trending buckets")
+        if options['rebuild']:
+            stored = rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Stored {stored} trending buckets"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.leaderboard import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute every teacher leaderboard entry from feedback and ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Entries inserted per statement")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stored = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stored} leaderboard entries in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.read_models import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the leaderboards and trending buckets and reset the outbox checkpoint"
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        for name, count in rebuild().items():
+            self.stdout.write(f"Stored {count} {name}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt read models in {time.monotonic() - started:.2f}s"))
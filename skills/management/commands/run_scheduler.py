@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from skills.scheduler import SessionScheduler
+
+
+class Command(BaseCommand):
+    help = "Send session reminders and move overdue sessions to no_show/completed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process the events due now and exit instead of running as a daemon"
+        )
+        parser.add_argument('--horizon', type=int, help="Seconds of upcoming events kept in memory")
+        parser.add_argument('--batch-size', type=int, help="Sessions handled per UPDATE")
+
+    def handle(self, *args, **options):
+        config = {}
+        if options['horizon']:
+            config['HORIZON'] = options['horizon']
+        if options['batch_size']:
+            config['BATCH_SIZE'] = options['batch_size']
+        scheduler = SessionScheduler(**config)
+
+        if options['once']:
+            self.report(scheduler.tick())
+            return
+        self.stdout.write("Scheduler running, press Ctrl+C to stop")
+        try:
+            scheduler.run_forever(on_tick=self.report)
+        except KeyboardInterrupt:
+            pass
+
+    def report(self, done):
+        summary = ', '.join(f"{kind}: {count}" for kind, count in sorted(done.items()))
+        self.stdout.write(summary or "Nothing due")
@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into a replica file (local replication stand-in)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replica', default='replica', help="Replica database alias")
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help="Keep syncing every N seconds instead of copying once"
+        )
+        parser.add_argument('--pages', type=int, default=1024, help="Pages copied per backup step")
+
+    def handle(self, *args, **options):
+        alias = options['replica']
+        if alias not in settings.DATABASES:
+            raise CommandError(f"Database alias '{alias}' is not configured.")
+
+        primary = settings.DATABASES['default']
+        replica = settings.DATABASES[alias]
+        for config in (primary, replica):
+            if config['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError("sync_replica only supports SQLite databases.")
+
+        while True:
+            started = time.monotonic()
+            self.copy(str(primary['NAME']), str(replica['NAME']), options['pages'])
+            self.stdout.write(
+                f"Synced {alias} in {(time.monotonic() - started) * 1000:.0f} ms"
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, source_path, target_path, pages):
+        # The online backup API copies a consistent snapshot while the
+        # primary keeps accepting writes.
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, pages=pages)
+        finally:
+            target.close()
+            source.close()
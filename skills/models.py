@@ -1,12 +1,17 @@
+from django.apps import apps
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+from accounts.models import update_geohash
+from SkillExchange.outbox import OutboxMixin
+
 User = get_user_model()
 
 
-class ExchangeRequest(models.Model):
+class ExchangeRequest(OutboxMixin, models.Model):
     """Request to exchange skills between two users"""
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -14,6 +19,7 @@ class ExchangeRequest(models.Model):
         ('rejected', 'Rejected'),
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
+        ('expired', 'Expired'),
     ]
 
     requester = models.ForeignKey(
@@ -52,6 +58,9 @@ class ExchangeRequest(models.Model):
         validators=[MinValueValidator(15), MaxValueValidator(480)]
     )
     
+    # Bumped by every compare-and-swap status transition
+    version = models.PositiveIntegerField(default=0, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -62,9 +71,10 @@ class ExchangeRequest(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
 
 
-class ExchangeSession(models.Model):
+class ExchangeSession(OutboxMixin, models.Model):
     """Actual skill exchange session between users"""
     STATUS_CHOICES = [
         ('scheduled', 'Scheduled'),
@@ -112,12 +122,28 @@ class ExchangeSession(models.Model):
     # Location/Meeting info
     meeting_link = models.URLField(blank=True, help_text="Online meeting link")
     location = models.CharField(max_length=200, blank=True, help_text="Physical location if in-person")
+    latitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+        help_text="Coordinates of the meeting place for in-person sessions"
+    )
+    longitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     
     # Notes
     notes = models.TextField(blank=True)
     participant_1_notes = models.TextField(blank=True)
     participant_2_notes = models.TextField(blank=True)
     
+    # Set by the scheduler once the reminder notifications went out
+    reminder_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -125,8 +151,16 @@ class ExchangeSession(models.Model):
     def __str__(self):
         return f"{self.title} - {self.scheduled_start.strftime('%Y-%m-%d %H:%M')}"
 
+    def save(self, *args, **kwargs):
+        update_geohash(self, kwargs)
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-scheduled_start']
+        indexes = [
+            models.Index(fields=['status', 'scheduled_start']),
+            models.Index(fields=['status', 'scheduled_end']),
+        ]
 
     @property
     def duration_minutes(self):
@@ -138,11 +172,22 @@ class ExchangeSession(models.Model):
         return int(delta.total_seconds() / 60)
 
 
-class SessionFeedback(models.Model):
+class SessionFeedback(OutboxMixin, models.Model):
     """Feedback for a completed session"""
+    # Exactly one of these is set: archive_exchanges repoints the feedback
+    # of a session it moves to the history table
     session = models.ForeignKey(
         ExchangeSession,
         on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='feedbacks'
+    )
+    archived_session = models.ForeignKey(
+        'ExchangeSessionHistory',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
         related_name='feedbacks'
     )
     user = models.ForeignKey(
@@ -150,6 +195,25 @@ class SessionFeedback(models.Model):
         on_delete=models.CASCADE,
         related_name='session_feedbacks_given'
     )
+
+    # Who was rated for which skill, resolved from the session on save so
+    # leaderboards and similarity never need the (possibly archived) session
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='session_feedbacks_received'
+    )
+    skill = models.ForeignKey(
+        'accounts.Skill',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+'
+    )
     
     # Ratings
     overall_rating = models.PositiveIntegerField(
@@ -177,7 +241,22 @@ class SessionFeedback(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Feedback by {self.user.email} for {self.session.title}"
+        return f"Feedback by {self.user.email} for {self.session_title}"
+
+    @property
+    def session_title(self):
+        session = self.session or self.archived_session
+        return session.title if session is not None else ''
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_outbox_loaded', {})
+        if self.session_id is not None and (self._state.adding or self.session_id != loaded.get('session_id')):
+            from .leaderboard import feedback_target
+
+            self.teacher_id, self.skill_id = feedback_target(self.session_id, self.user_id) or (None, None)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'teacher', 'skill'}
+        super().save(*args, **kwargs)
 
     class Meta:
         unique_together = ['session', 'user']
@@ -248,6 +327,8 @@ class SkillExchangeOffer(models.Model):
     total_sessions = models.PositiveIntegerField(default=0)
     total_students = models.PositiveIntegerField(default=0)
     
+    version = models.PositiveIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -258,13 +339,90 @@ class SkillExchangeOffer(models.Model):
         ordering = ['-created_at']
 
 
-class Booking(models.Model):
+class TeacherNeighbor(models.Model):
+    """Precomputed most similar teachers for a teacher"""
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='teacher_neighbors'
+    )
+    neighbor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='similar_to'
+    )
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.teacher.email} ~ {self.neighbor.email} ({self.score:.3f})"
+
+    class Meta:
+        unique_together = ['teacher', 'neighbor']
+        ordering = ['-score']
+        indexes = [models.Index(fields=['teacher', '-score'])]
+
+
+class TeacherScore(models.Model):
+    """Leaderboard entry of a teacher, globally or for one skill or category"""
+    SCOPES = [
+        ('global', 'Global'),
+        ('category', 'Category'),
+        ('skill', 'Skill'),
+    ]
+
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='teacher_scores'
+    )
+    scope = models.CharField(max_length=10, choices=SCOPES)
+    scope_id = models.PositiveBigIntegerField(default=0, help_text="Skill or category id, 0 for global")
+
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    sessions = models.PositiveIntegerField(default=0, help_text="Sessions with feedback")
+    recommend_count = models.PositiveIntegerField(default=0)
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.teacher.email} {self.scope}:{self.scope_id} ({self.score:.3f})"
+
+    class Meta:
+        unique_together = ['teacher', 'scope', 'scope_id']
+        ordering = ['-score', 'teacher']
+        indexes = [models.Index(fields=['scope', 'scope_id', '-score', 'teacher'])]
+
+
+class TrendingBucket(models.Model):
+    """Activity count of one skill or offer during one hour"""
+    KINDS = [
+        ('skill', 'Skill'),
+        ('offer', 'Offer'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    target_id = models.PositiveBigIntegerField()
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.kind}:{self.target_id} @ {self.hour:%Y-%m-%d %H:00} ({self.count})"
+
+    class Meta:
+        unique_together = ['kind', 'target_id', 'hour']
+        indexes = [models.Index(fields=['kind', 'hour'])]
+
+
+class Booking(OutboxMixin, models.Model):
     """Booking for a skill exchange offer"""
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
+        ('expired', 'Expired'),
     ]
 
     offer = models.ForeignKey(
@@ -303,6 +461,8 @@ class Booking(models.Model):
         related_name='booking'
     )
     
+    version = models.PositiveIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     confirmed_at = models.DateTimeField(null=True, blank=True)
@@ -312,6 +472,10 @@ class Booking(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'proposed_datetime']),
+        ]
 
 
 class Notification(models.Model):
@@ -320,11 +484,13 @@ class Notification(models.Model):
         ('exchange_request', 'Exchange Request'),
         ('request_accepted', 'Request Accepted'),
         ('request_rejected', 'Request Rejected'),
+        ('request_expired', 'Request Expired'),
         ('session_reminder', 'Session Reminder'),
         ('session_cancelled', 'Session Cancelled'),
         ('feedback_received', 'Feedback Received'),
         ('booking_request', 'Booking Request'),
         ('booking_confirmed', 'Booking Confirmed'),
+        ('booking_expired', 'Booking Expired'),
         ('new_message', 'New Message'),
     ]
 
@@ -361,6 +527,8 @@ class Notification(models.Model):
     # Status
     is_read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
+    # Number of identical notifications collapsed into this digest row
+    repeat_count = models.PositiveIntegerField(default=1)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -369,10 +537,175 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', 'created_at']),
+            models.Index(fields=['is_read', 'created_at']),
+        ]
 
     def mark_as_read(self):
         """Mark notification as read"""
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save()
\ No newline at end of file
+            self.save()
+
+
+class ArchivedNotification(models.Model):
+    """Cold copy of a notification removed from the hot table by the retention job"""
+    id = models.BigIntegerField(primary_key=True, help_text="Id of the original notification")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+
+    # Plain ids: the targets may have been archived or deleted since
+    exchange_request_id = models.BigIntegerField(null=True, blank=True)
+    session_id = models.BigIntegerField(null=True, blank=True)
+    booking_id = models.BigIntegerField(null=True, blank=True)
+
+    is_read = models.BooleanField(default=False)
+    read_at = models.DateTimeField(null=True, blank=True)
+    repeat_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.title} (archived)"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', 'created_at'])]
+
+
+class ExchangeRequestHistory(models.Model):
+    """Closed exchange request moved out of the live table by archive_exchanges"""
+    id = models.BigIntegerField(primary_key=True)
+    requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    skill_offered = models.ForeignKey('accounts.Skill', on_delete=models.CASCADE, related_name='+')
+    skill_requested = models.ForeignKey('accounts.Skill', on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=ExchangeRequest.STATUS_CHOICES)
+    message = models.TextField()
+    response_message = models.TextField(blank=True)
+    proposed_date = models.DateTimeField(null=True, blank=True)
+    duration_minutes = models.PositiveIntegerField(default=60)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    responded_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.requester_id} → {self.receiver_id} ({self.status}, archived)"
+
+    class Meta:
+        verbose_name_plural = "Exchange request history"
+        ordering = ['-id']
+
+
+class ExchangeSessionHistory(models.Model):
+    """Closed session moved out of the live table by archive_exchanges"""
+    id = models.BigIntegerField(primary_key=True)
+    # Plain id: the request may still be live or archived itself
+    exchange_request = models.BigIntegerField()
+    participant_1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    participant_2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=ExchangeSession.STATUS_CHOICES)
+    meeting_type = models.CharField(max_length=20, choices=ExchangeSession.MEETING_TYPE_CHOICES)
+    scheduled_start = models.DateTimeField()
+    scheduled_end = models.DateTimeField()
+    actual_start = models.DateTimeField(null=True, blank=True)
+    actual_end = models.DateTimeField(null=True, blank=True)
+    meeting_link = models.URLField(blank=True)
+    location = models.CharField(max_length=200, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True)
+    notes = models.TextField(blank=True)
+    participant_1_notes = models.TextField(blank=True)
+    participant_2_notes = models.TextField(blank=True)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    duration_minutes = ExchangeSession.duration_minutes
+
+    def __str__(self):
+        return f"{self.title} ({self.status}, archived)"
+
+    class Meta:
+        verbose_name_plural = "Exchange session history"
+        ordering = ['-id']
+
+
+class BookingHistory(models.Model):
+    """Closed booking moved out of the live table by archive_exchanges"""
+    id = models.BigIntegerField(primary_key=True)
+    offer = models.ForeignKey(SkillExchangeOffer, on_delete=models.CASCADE, related_name='+')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    message = models.TextField()
+    proposed_datetime = models.DateTimeField()
+    exchange_skill = models.ForeignKey(
+        'accounts.Skill',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    exchange_message = models.TextField(blank=True)
+    session = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    confirmed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.student_id} → offer {self.offer_id} ({self.status}, archived)"
+
+    class Meta:
+        verbose_name_plural = "Booking history"
+        ordering = ['-id']
+
+
+class OutboxEvent(models.Model):
+    """Change to an outbox model, written in the transaction that made it"""
+    ACTIONS = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=100, help_text="App label and model, e.g. skills.Booking")
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    payload = models.JSONField(encoder=DjangoJSONEncoder, help_text="Column values after the change")
+    previous = models.JSONField(
+        encoder=DjangoJSONEncoder, default=dict, blank=True,
+        help_text="Values an update changed, before the change"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.model}:{self.object_id} {self.action}"
+
+    def instance(self):
+        """Unsaved model instance carrying the payload values"""
+        return apps.get_model(self.model)(**self.payload)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['created_at'])]
+
+
+class OutboxCheckpoint(models.Model):
+    """Last OutboxEvent a consumer has processed"""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
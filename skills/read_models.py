@@ -0,0 +1,131 @@
+"""
+Read models maintained from the outbox change feed.
+
+The leaderboards and the trending buckets used to be updated in save
+signals, inside every write. They are now consumer handlers (see
+SkillExchange.outbox), applied in batches by ``consume_outbox``:
+
+* leaderboards: any change to feedback or ratings recomputes the
+  teachers involved once per batch from their rows, on both sides of a
+  row moved to another teacher; a session with a new participant first
+  re-resolves whom its feedback rates;
+* trending: created requests, bookings and wanted skills are summed per
+  (kind, target, hour) and added with one statement per bucket.
+
+``rebuild`` recomputes both from the source tables and moves the
+checkpoint to the last event it covers.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from SkillExchange import outbox
+
+from . import leaderboard, trending
+from .models import SkillExchangeOffer
+
+
+CONSUMER = 'read_models'
+
+
+def before(event, name):
+    """Value of column ``name`` before the event's change"""
+    return event.previous.get(name, event.payload[name])
+
+
+def recompute_teachers(teachers):
+    for teacher_id in teachers - {None}:
+        leaderboard.recompute_teacher(teacher_id)
+
+
+@outbox.handles('skills.SessionFeedback')
+def feedback_changed(events):
+    teachers = set()
+    for event in events:
+        teachers.update((event.payload['teacher_id'], before(event, 'teacher_id')))
+    recompute_teachers(teachers)
+
+
+@outbox.handles('skills.ExchangeSession')
+def sessions_changed(events):
+    # Feedback deleted with its session has events of its own, but on a
+    # session with a new participant it rates someone else
+    sessions = {
+        event.object_id for event in events
+        if event.action == 'updated'
+        and {'participant_1_id', 'participant_2_id'} & event.previous.keys()
+    }
+    recompute_teachers(leaderboard.retarget_feedback(sessions))
+
+
+@outbox.handles('accounts.UserRating')
+def rating_changed(events):
+    teachers = set()
+    for event in events:
+        teachers.update((event.payload['rated_user_id'], before(event, 'rated_user_id')))
+    recompute_teachers(teachers)
+
+
+def created(events):
+    return [event for event in events if event.action == 'created']
+
+
+def count_activity(targets):
+    """Add {(kind, target id, hour): [event ids]} to the trending buckets"""
+    for (kind, target_id, hour), event_ids in targets.items():
+        trending.record(kind, target_id, hour, event_ids=event_ids)
+
+
+def hour_of(event):
+    return trending.bucket_hour(parse_datetime(event.payload['created_at']))
+
+
+def by_target(pairs):
+    """Group (target key, event) pairs into {target key: [event ids]}"""
+    targets = defaultdict(list)
+    for key, event in pairs:
+        targets[key].append(event.pk)
+    return targets
+
+
+@outbox.handles('skills.ExchangeRequest')
+def requests_created(events):
+    count_activity(by_target(
+        (('skill', event.payload['skill_requested_id'], hour_of(event)), event)
+        for event in created(events)
+    ))
+
+
+@outbox.handles('accounts.SkillWanted')
+def skills_wanted(events):
+    count_activity(by_target(
+        (('skill', event.payload['skill_id'], hour_of(event)), event)
+        for event in created(events)
+    ))
+
+
+@outbox.handles('skills.Booking')
+def bookings_created(events):
+    events = created(events)
+    skills = dict(SkillExchangeOffer.objects.filter(
+        pk__in={event.payload['offer_id'] for event in events}
+    ).values_list('pk', 'skill_id'))
+    pairs = []
+    for event in events:
+        offer_id = event.payload['offer_id']
+        pairs.append((('offer', offer_id, hour_of(event)), event))
+        pairs.append((('skill', skills.get(offer_id), hour_of(event)), event))
+    count_activity(by_target(pairs))
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every read model, returning {name: rows stored}"""
+    last_event_id = outbox.last_event_id()
+    summary = {
+        'leaderboard entries': leaderboard.rebuild(),
+        'trending buckets': trending.rebuild(),
+    }
+    outbox.set_checkpoint(CONSUMER, last_event_id)
+    return summary
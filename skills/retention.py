@@ -0,0 +1,167 @@
+"""
+Retention for the notifications table.
+
+``prune_notifications`` runs three passes, each working in chunks of
+``BATCH_SIZE`` primary keys so no statement holds the table for long:
+
+1. collapse: notifications of the same user, type, title and target are
+   folded into the newest one, which keeps the sum in ``repeat_count`` and
+   stays unread while any of the folded rows was unread; notifications
+   without a target are never folded, and folded rows are archived;
+2. age: read notifications older than ``READ_DAYS`` (and unread ones older
+   than ``UNREAD_DAYS``, when set) leave the hot table;
+3. cap: users with more than ``MAX_PER_USER`` notifications keep only
+   their newest ones, which bounds the hot table by the user count.
+
+Rows leaving the hot table are copied to ArchivedNotification
+(``ARCHIVE='table'``), appended to a gzipped JSONL file per day in
+``ARCHIVE_DIR`` (``'jsonl'``) or just deleted (``None``). The copy and the
+delete of a chunk share one transaction for the table archive; a file
+archive is written first, so a crash can duplicate lines but never lose
+rows.
+"""
+import gzip
+import json
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+
+
+DEFAULTS = {
+    'READ_DAYS': 30,
+    'UNREAD_DAYS': None,
+    'MAX_PER_USER': 500,
+    'ARCHIVE': 'table',
+    'ARCHIVE_DIR': None,
+    'BATCH_SIZE': 500,
+}
+
+TARGET_FIELDS = ('exchange_request_id', 'session_id', 'booking_id')
+ARCHIVED_FIELDS = (
+    'id', 'user_id', 'notification_type', 'title', 'message', *TARGET_FIELDS,
+    'is_read', 'read_at', 'repeat_count', 'created_at',
+)
+
+
+def get_policy():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATION_RETENTION', {})}
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def group_filter(group):
+    """Filter matching one (user, type, title, target) group, nulls included"""
+    lookups = {
+        'user_id': group['user_id'],
+        'notification_type': group['notification_type'],
+        'title': group['title'],
+    }
+    for field in TARGET_FIELDS:
+        if group[field] is None:
+            lookups[f'{field}__isnull'] = True
+        else:
+            lookups[field] = group[field]
+    return Q(**lookups)
+
+
+def collapse_repeats(policy, now):
+    """Fold repeated notifications into digest rows, returning rows removed"""
+    # Without a target, rows of one type may be about different things
+    targeted = Notification.objects.exclude(**{f'{field}__isnull': True for field in TARGET_FIELDS})
+    groups = targeted.order_by().values(
+        'user_id', 'notification_type', 'title', *TARGET_FIELDS
+    ).annotate(
+        rows=Count('pk'),
+        keep=Max('pk'),
+        total=Sum('repeat_count'),
+        unread=Count('pk', filter=Q(is_read=False)),
+    ).filter(rows__gt=1)
+
+    removed = 0
+    for group in list(groups):
+        with transaction.atomic():
+            Notification.objects.filter(pk=group['keep']).update(
+                repeat_count=group['total'],
+                is_read=not group['unread'],
+            )
+            pks = list(Notification.objects.filter(
+                group_filter(group), pk__lt=group['keep']
+            ).values_list('pk', flat=True))
+            for chunk in chunks(pks, policy['BATCH_SIZE']):
+                folded = Notification.objects.filter(pk__in=chunk)
+                rows = list(folded.values(*ARCHIVED_FIELDS))
+                archive_rows(rows, policy['ARCHIVE'], policy['ARCHIVE_DIR'], now)
+                removed += folded.delete()[0]
+    return removed
+
+
+def archive_rows(rows, mode, archive_dir, now):
+    if mode == 'table':
+        ArchivedNotification.objects.bulk_create(
+            [ArchivedNotification(archived_at=now, **row) for row in rows],
+            ignore_conflicts=True
+        )
+    elif mode == 'jsonl':
+        directory = Path(archive_dir or Path(settings.BASE_DIR) / 'archive')
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"notifications-{now:%Y%m%d}.jsonl.gz"
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+
+def evict(queryset, policy, now):
+    """Archive and delete ``queryset`` chunk by chunk, returning rows removed"""
+    removed = 0
+    while True:
+        rows = list(queryset.order_by('pk').values(*ARCHIVED_FIELDS)[:policy['BATCH_SIZE']])
+        if not rows:
+            return removed
+        with transaction.atomic():
+            archive_rows(rows, policy['ARCHIVE'], policy['ARCHIVE_DIR'], now)
+            removed += Notification.objects.filter(
+                pk__in=[row['id'] for row in rows]
+            ).delete()[0]
+
+
+def over_cap(policy):
+    """(user id, pks beyond the newest MAX_PER_USER) for users over the cap"""
+    cap = policy['MAX_PER_USER']
+    users = Notification.objects.order_by().values('user_id').annotate(
+        rows=Count('pk')
+    ).filter(rows__gt=cap).values_list('user_id', flat=True)
+    for user_id in users:
+        pks = Notification.objects.filter(user_id=user_id).order_by(
+            '-created_at', '-pk'
+        ).values_list('pk', flat=True)[cap:]
+        yield user_id, list(pks)
+
+
+def prune_notifications(now=None, **policy):
+    """Run the collapse, age and cap passes, returning rows removed by each"""
+    now = now or timezone.now()
+    policy = {**get_policy(), **policy}
+    summary = {'collapsed': collapse_repeats(policy, now)}
+
+    expired = Q(is_read=True, created_at__lt=now - timedelta(days=policy['READ_DAYS']))
+    if policy['UNREAD_DAYS'] is not None:
+        expired |= Q(is_read=False, created_at__lt=now - timedelta(days=policy['UNREAD_DAYS']))
+    summary['expired'] = evict(Notification.objects.filter(expired), policy, now)
+
+    capped = 0
+    if policy['MAX_PER_USER']:
+        for _, pks in over_cap(policy):
+            for chunk in chunks(pks, policy['BATCH_SIZE']):
+                capped += evict(Notification.objects.filter(pk__in=chunk), policy, now)
+    summary['capped'] = capped
+    return summary
@@ -0,0 +1,240 @@
+"""
+Time-driven session events: reminders, no-shows and auto-completion.
+
+``SessionScheduler`` keeps a min-heap of (due time, kind, session id,
+scheduled time) for the next ``HORIZON`` seconds. The heap is filled from range scans on the
+(status, scheduled_start) and (status, scheduled_end) indexes, so a
+reload reads only the sessions that fall due inside the window, and a
+tick pops only the events that are due. Due events are handled in
+batches:
+
+* ``remind``: ``session_reminder`` notifications for both participants,
+  ``REMINDER_LEAD`` seconds before the start;
+* ``no_show``: scheduled sessions never started ``NO_SHOW_AFTER`` seconds
+  after their start become ``no_show``;
+* ``complete``: in-progress sessions ``COMPLETE_AFTER`` seconds past their
+  end become ``completed``.
+
+All state lives in the sessions themselves (``status`` and
+``reminder_sent_at``) and every batch re-checks it in its UPDATE, so the
+scheduler can be restarted at any time and overdue events are simply
+picked up by the first reload. Events are queued per scheduled time: a
+rescheduled session gets a new event at the next reload and the stale one
+is skipped when it falls due. A failing tick is logged and the daemon
+reloads from the database after ``RELOAD_INTERVAL``.
+"""
+import heapq
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from SkillExchange import metrics
+
+from .models import Booking, ExchangeSession, Notification, SkillExchangeOffer
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'REMINDER_LEAD': 3600,
+    'NO_SHOW_AFTER': 1800,
+    'COMPLETE_AFTER': 900,
+    'HORIZON': 3600,
+    'RELOAD_INTERVAL': 60,
+    'BATCH_SIZE': 500,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SESSION_SCHEDULER', {})}
+
+
+def remind(session_ids, now, starts=None):
+    """
+    Send reminders for sessions that still need one, returning how many.
+
+    ``starts`` maps session ids to the start the reminder was queued for.
+    Sessions moved since then are skipped, as they are queued again for
+    their new start.
+    """
+    with transaction.atomic():
+        sessions = [
+            session for session in ExchangeSession.objects.select_for_update().filter(
+                pk__in=session_ids,
+                status='scheduled',
+                reminder_sent_at__isnull=True,
+                scheduled_start__gt=now,
+            ).values('pk', 'title', 'scheduled_start', 'participant_1_id', 'participant_2_id')
+            if starts is None or starts.get(session['pk']) == session['scheduled_start']
+        ]
+        if not sessions:
+            return 0
+        ExchangeSession.objects.filter(
+            pk__in=[session['pk'] for session in sessions]
+        ).update(reminder_sent_at=now)
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                notification_type='session_reminder',
+                title='Upcoming Session',
+                message=f'Your session "{session["title"]}" starts at {session["scheduled_start"].strftime("%Y-%m-%d %H:%M")}',
+                session_id=session['pk'],
+            )
+            for session in sessions
+            for user_id in (session['participant_1_id'], session['participant_2_id'])
+        ])
+    metrics.inc('notifications_created_total', len(notifications), type='session_reminder')
+    return len(sessions)
+
+
+def mark_no_show(session_ids, now, after):
+    """Move scheduled sessions that never started to ``no_show``"""
+    return ExchangeSession.objects.filter(
+        pk__in=session_ids,
+        status='scheduled',
+        scheduled_start__lte=now - timedelta(seconds=after),
+    ).update(status='no_show', version=F('version') + 1, updated_at=now)
+
+
+def complete(session_ids, now, after):
+    """Complete in-progress sessions past their end, returning how many"""
+    with transaction.atomic():
+        completed = list(
+            ExchangeSession.objects.select_for_update().filter(
+                pk__in=session_ids,
+                status='in_progress',
+                scheduled_end__lte=now - timedelta(seconds=after),
+            ).values_list('pk', flat=True)
+        )
+        if not completed:
+            return 0
+        ExchangeSession.objects.filter(pk__in=completed).update(
+            status='completed', actual_end=F('scheduled_end'),
+            version=F('version') + 1, updated_at=now
+        )
+        update_offer_stats(completed)
+    metrics.inc('sessions_completed_total', len(completed))
+    return len(completed)
+
+
+def update_offer_stats(session_ids):
+    """Offer counters the session_status_changed signal keeps for single saves"""
+    per_offer = Booking.objects.filter(session_id__in=session_ids).order_by().values(
+        'offer_id'
+    ).annotate(sessions=Count('id'))
+    students = Booking.objects.filter(
+        offer=OuterRef('pk'), status='completed'
+    ).order_by().values('offer').annotate(count=Count('student', distinct=True)).values('count')
+    for row in per_offer:
+        SkillExchangeOffer.objects.filter(pk=row['offer_id']).update(
+            total_sessions=F('total_sessions') + row['sessions'],
+            # No completed booking yields no group at all, i.e. NULL
+            total_students=Coalesce(Subquery(students), 0),
+        )
+
+
+class SessionScheduler:
+    """Min-heap of upcoming session events, refilled from the indexes"""
+
+    def __init__(self, **config):
+        self.config = {**get_config(), **config}
+        self.heap = []
+        self.queued = set()
+        self.loaded_at = None
+
+    def push(self, due, kind, session_id, at):
+        """Queue ``kind`` for the session as scheduled at ``at`` (its start or end)"""
+        if (kind, session_id, at) not in self.queued:
+            self.queued.add((kind, session_id, at))
+            heapq.heappush(self.heap, (due, kind, session_id, at))
+
+    def load(self, now=None):
+        """Queue every event due before now + HORIZON, returning how many were added"""
+        now = now or timezone.now()
+        config = self.config
+        until = now + timedelta(seconds=config['HORIZON'])
+        lead = timedelta(seconds=config['REMINDER_LEAD'])
+        no_show_after = timedelta(seconds=config['NO_SHOW_AFTER'])
+        complete_after = timedelta(seconds=config['COMPLETE_AFTER'])
+        before = len(self.queued)
+
+        scheduled = ExchangeSession.objects.filter(status='scheduled').order_by()
+        for pk, start in scheduled.filter(
+            reminder_sent_at__isnull=True,
+            scheduled_start__gt=now,
+            scheduled_start__lte=until + lead,
+        ).values_list('pk', 'scheduled_start'):
+            self.push(start - lead, 'remind', pk, start)
+        for pk, start in scheduled.filter(
+            scheduled_start__lte=until - no_show_after
+        ).values_list('pk', 'scheduled_start'):
+            self.push(start + no_show_after, 'no_show', pk, start)
+        for pk, end in ExchangeSession.objects.filter(
+            status='in_progress', scheduled_end__lte=until - complete_after
+        ).order_by().values_list('pk', 'scheduled_end'):
+            self.push(end + complete_after, 'complete', pk, end)
+
+        self.loaded_at = now
+        return len(self.queued) - before
+
+    def pop_due(self, now):
+        """Remove and group the events due at ``now`` by kind as {kind: {id: scheduled time}}"""
+        due = defaultdict(dict)
+        while self.heap and self.heap[0][0] <= now:
+            _, kind, session_id, at = heapq.heappop(self.heap)
+            self.queued.discard((kind, session_id, at))
+            due[kind][session_id] = at
+        return due
+
+    def run_due(self, now=None):
+        """Process every due event in batches, returning {kind: sessions changed}"""
+        now = now or timezone.now()
+        config = self.config
+        done = {}
+        for kind, events in self.pop_due(now).items():
+            # no_show and complete re-check the times in their UPDATE
+            handlers = {
+                'remind': lambda ids: remind(ids, now, events),
+                'no_show': lambda ids: mark_no_show(ids, now, config['NO_SHOW_AFTER']),
+                'complete': lambda ids: complete(ids, now, config['COMPLETE_AFTER']),
+            }
+            session_ids = list(events)
+            size = config['BATCH_SIZE']
+            done[kind] = sum(
+                handlers[kind](session_ids[start:start + size])
+                for start in range(0, len(session_ids), size)
+            )
+        return done
+
+    def seconds_until_next(self, now):
+        """Sleep time until the next event or the next reload"""
+        reload_at = self.loaded_at + timedelta(seconds=self.config['RELOAD_INTERVAL'])
+        wake_at = min(self.heap[0][0], reload_at) if self.heap else reload_at
+        return max((wake_at - now).total_seconds(), 0)
+
+    def tick(self):
+        now = timezone.now()
+        if self.loaded_at is None or now - self.loaded_at >= timedelta(seconds=self.config['RELOAD_INTERVAL']):
+            self.load(now)
+        return self.run_due(now)
+
+    def run_forever(self, on_tick=None):
+        while True:
+            try:
+                done = self.tick()
+            except Exception:
+                # Popped events are lost, reload them from the sessions after a pause
+                logger.exception('Session scheduler tick failed')
+                self.heap, self.queued = [], set()
+                self.loaded_at = timezone.now()
+                done = None
+            if on_tick and done:
+                on_tick(done)
+            time.sleep(self.seconds_until_next(timezone.now()))
@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+
+from SkillExchange.concurrency import Conflict, compare_and_swap
+
 from .models import (
     ExchangeRequest, ExchangeSession, SessionFeedback,
-    SkillExchangeOffer, Booking, Notification
+    SkillExchangeOffer, Booking, Notification,
+    ExchangeRequestHistory, ExchangeSessionHistory, BookingHistory
 )
 
 User = get_user_model()
@@ -63,8 +67,10 @@ class ExchangeRequestUpdateSerializer(serializers.ModelSerializer):
         return value
 
     def update(self, instance, validated_data):
-        instance.responded_at = timezone.now()
-        return super().update(instance, validated_data)
+        # Only the changed columns, and only if nobody answered in between
+        if not compare_and_swap(instance, responded_at=timezone.now(), **validated_data):
+            raise Conflict()
+        return instance
 
 
 class ExchangeSessionSerializer(serializers.ModelSerializer):
@@ -80,8 +86,8 @@ class ExchangeSessionSerializer(serializers.ModelSerializer):
             'participant_2', 'participant_2_name', 'title', 'description',
             'status', 'meeting_type', 'scheduled_start', 'scheduled_end',
             'actual_start', 'actual_end', 'meeting_link', 'location',
-            'notes', 'participant_1_notes', 'participant_2_notes',
-            'duration_minutes', 'created_at', 'updated_at'
+            'latitude', 'longitude', 'notes', 'participant_1_notes',
+            'participant_2_notes', 'duration_minutes', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
@@ -106,18 +112,20 @@ class ExchangeSessionSerializer(serializers.ModelSerializer):
 class SessionFeedbackSerializer(serializers.ModelSerializer):
     """Serializer for session feedback"""
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
-    session_title = serializers.CharField(source='session.title', read_only=True)
+    # Nullable on the model only so archived feedback can leave the live table
+    session = serializers.PrimaryKeyRelatedField(queryset=ExchangeSession.objects.all())
+    session_title = serializers.CharField(read_only=True)
 
     class Meta:
         model = SessionFeedback
         fields = [
-            'id', 'session', 'session_title', 'user', 'user_name',
+            'id', 'session', 'archived_session', 'session_title', 'user', 'user_name',
             'overall_rating', 'teaching_quality', 'communication',
             'punctuality', 'what_went_well', 'what_to_improve',
             'additional_comments', 'would_recommend', 'created_at',
             'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'archived_session', 'user', 'created_at', 'updated_at']
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
@@ -228,8 +236,10 @@ class BookingUpdateSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         if validated_data.get('status') == 'confirmed':
-            instance.confirmed_at = timezone.now()
-        return super().update(instance, validated_data)
+            validated_data['confirmed_at'] = timezone.now()
+        if not compare_and_swap(instance, **validated_data):
+            raise Conflict()
+        return instance
 
 
 class NotificationSerializer(serializers.ModelSerializer):
@@ -239,9 +249,9 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'notification_type', 'title', 'message',
             'exchange_request', 'session', 'booking', 'is_read',
-            'read_at', 'created_at'
+            'read_at', 'repeat_count', 'created_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at']
+        read_only_fields = ['id', 'user', 'repeat_count', 'created_at']
 
 
 class ExchangeSessionDetailSerializer(serializers.ModelSerializer):
@@ -258,8 +268,9 @@ class ExchangeSessionDetailSerializer(serializers.ModelSerializer):
             'participant_2', 'participant_2_name', 'title', 'description',
             'status', 'meeting_type', 'scheduled_start', 'scheduled_end',
             'actual_start', 'actual_end', 'meeting_link', 'location',
-            'notes', 'participant_1_notes', 'participant_2_notes',
-            'duration_minutes', 'feedbacks', 'created_at', 'updated_at'
+            'latitude', 'longitude', 'notes', 'participant_1_notes',
+            'participant_2_notes', 'duration_minutes', 'feedbacks',
+            'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
@@ -289,12 +300,32 @@ class SkillExchangeOfferDetailSerializer(serializers.ModelSerializer):
         return SkillSerializer(obj.desired_skills.all(), many=True).data
 
     def get_average_rating(self, obj):
-        # Calculate average rating from session feedbacks
-        sessions = ExchangeSession.objects.filter(
-            exchange_request__skill_offered=obj.skill,
-            status='completed'
-        )
-        feedbacks = SessionFeedback.objects.filter(session__in=sessions)
+        # Calculate average rating from session feedbacks, archived ones included
+        feedbacks = SessionFeedback.objects.filter(skill=obj.skill)
         if feedbacks.exists():
             return round(sum(f.overall_rating for f in feedbacks) / feedbacks.count(), 2)
-        return None
\ No newline at end of file
+        return None
+
+
+class ExchangeRequestHistorySerializer(ExchangeRequestSerializer):
+    """Read-only serializer for archived exchange requests"""
+    class Meta:
+        model = ExchangeRequestHistory
+        fields = ExchangeRequestSerializer.Meta.fields + ['archived_at']
+        read_only_fields = fields
+
+
+class ExchangeSessionHistorySerializer(ExchangeSessionSerializer):
+    """Read-only serializer for archived sessions"""
+    class Meta:
+        model = ExchangeSessionHistory
+        fields = ExchangeSessionSerializer.Meta.fields + ['archived_at']
+        read_only_fields = fields
+
+
+class BookingHistorySerializer(BookingSerializer):
+    """Read-only serializer for archived bookings"""
+    class Meta:
+        model = BookingHistory
+        fields = BookingSerializer.Meta.fields + ['archived_at']
+        read_only_fields = fields
@@ -1,14 +1,20 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
+
+from SkillExchange import metrics
+
 from .models import ExchangeRequest, ExchangeSession, Booking, Notification
+from .scheduler import update_offer_stats
 
 
 @receiver(post_save, sender=ExchangeRequest)
+@metrics.timed('exchange_request_created')
 def exchange_request_created(sender, instance, created, **kwargs):
     """
     Create notification when exchange request is created
     """
     if created:
+        metrics.inc('exchange_requests_created_total')
         Notification.objects.create(
             user=instance.receiver,
             notification_type='exchange_request',
@@ -19,6 +25,7 @@ def exchange_request_created(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=ExchangeSession)
+@metrics.timed('session_created')
 def session_created(sender, instance, created, **kwargs):
     """
     Send notifications when session is created
@@ -36,6 +43,7 @@ def session_created(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=Booking)
+@metrics.timed('booking_created')
 def booking_created(sender, instance, created, **kwargs):
     """
     Create notification when booking is created
@@ -51,6 +59,7 @@ def booking_created(sender, instance, created, **kwargs):
 
 
 @receiver(pre_save, sender=ExchangeSession)
+@metrics.timed('session_status_changed')
 def session_status_changed(sender, instance, **kwargs):
     """
     Handle session status changes
@@ -61,18 +70,17 @@ def session_status_changed(sender, instance, **kwargs):
             
             # If session completed, update offer stats if applicable
             if old_instance.status != 'completed' and instance.status == 'completed':
-                # Check if this session is from an offer booking
-                if hasattr(instance, 'booking') and instance.booking:
-                    offer = instance.booking.offer
-                    offer.total_sessions += 1
-                    
-                    # Update total students (unique students)
-                    unique_students = Booking.objects.filter(
-                        offer=offer,
-                        status='completed'
-                    ).values('student').distinct().count()
-                    
-                    offer.total_students = unique_students
-                    offer.save()
+                # F() updates of the counters only, so a concurrent toggle_status survives
+                update_offer_stats([instance.pk])
         except ExchangeSession.DoesNotExist:
-            pass
\ No newline at end of file
+            pass
+
+
+@receiver(post_save, sender=Notification)
+@metrics.timed('notification_created')
+def notification_created(sender, instance, created, **kwargs):
+    """
+    Count notifications by type
+    """
+    if created:
+        metrics.inc('notifications_created_total', type=instance.notification_type)
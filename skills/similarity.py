@@ -0,0 +1,115 @@
+"""
+"Teachers like this one" from sparse teacher profiles.
+
+Every teacher is a sparse vector over the skills they can teach, each
+weighted by proficiency level and (log-scaled) years of experience, plus
+one extra ``feedback`` component taken from their smoothed teaching
+quality score. Vectors are L2-normalised, so a dot product is the cosine
+similarity.
+
+Similarities are computed in one batch through an inverted index
+(skill -> [(teacher, weight)]): a teacher's row of the similarity matrix
+is accumulated from the postings of its own skills only, so teachers
+without a shared skill are never compared. The top-N rows per teacher
+are stored in TeacherNeighbor, which the offers API joins against.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from accounts.models import UserSkill
+
+from .models import SessionFeedback, TeacherNeighbor
+
+
+PROFICIENCY_WEIGHTS = {
+    'beginner': 1.0,
+    'intermediate': 2.0,
+    'advanced': 3.0,
+    'expert': 4.0,
+}
+# Weight of the feedback component relative to a single skill
+FEEDBACK_WEIGHT = 1.0
+PRIOR_RATING = 3.0
+PRIOR_COUNT = 5
+
+
+def skill_weight(proficiency_level, years_of_experience):
+    return PROFICIENCY_WEIGHTS.get(proficiency_level, 1.0) * (1.0 + math.log1p(years_of_experience))
+
+
+def feedback_scores():
+    """Smoothed mean teaching quality (1-5) per teacher from session feedback"""
+    rows = SessionFeedback.objects.filter(teacher__isnull=False).order_by().values(
+        'teacher_id'
+    ).annotate(total=Sum('teaching_quality'), count=Count('id'))
+    return {
+        row['teacher_id']: (row['total'] + PRIOR_RATING * PRIOR_COUNT) / (row['count'] + PRIOR_COUNT)
+        for row in rows
+    }
+
+
+def teacher_vectors():
+    """Map teacher id -> ({skill id: weight}, feedback weight), L2-normalised"""
+    skills = defaultdict(dict)
+    rows = UserSkill.objects.filter(can_teach=True).order_by().values_list(
+        'user_id', 'skill_id', 'proficiency_level', 'years_of_experience'
+    )
+    for user_id, skill_id, level, years in rows.iterator(chunk_size=5000):
+        weight = skill_weight(level, years)
+        skills[user_id][skill_id] = max(weight, skills[user_id].get(skill_id, 0.0))
+
+    feedback = feedback_scores()
+    vectors = {}
+    for user_id, weights in skills.items():
+        feedback_weight = FEEDBACK_WEIGHT * feedback.get(user_id, PRIOR_RATING) / 5
+        norm = math.sqrt(sum(w * w for w in weights.values()) + feedback_weight ** 2)
+        vectors[user_id] = (
+            {skill_id: w / norm for skill_id, w in weights.items()},
+            feedback_weight / norm,
+        )
+    return vectors
+
+
+def nearest_teachers(vectors, top_n=10):
+    """Yield (teacher id, [(score, neighbor id), ...]) best first"""
+    postings = defaultdict(list)
+    for user_id, (weights, _) in vectors.items():
+        for skill_id, weight in weights.items():
+            postings[skill_id].append((user_id, weight))
+
+    for user_id, (weights, feedback) in vectors.items():
+        dots = Counter()
+        for skill_id, weight in weights.items():
+            for other_id, other_weight in postings[skill_id]:
+                dots[other_id] += weight * other_weight
+        dots.pop(user_id, None)
+        scored = (
+            (dot + feedback * vectors[other_id][1], other_id)
+            for other_id, dot in dots.items()
+        )
+        yield user_id, heapq.nlargest(top_n, scored)
+
+
+def build(top_n=10, batch_size=1000):
+    """Recompute every teacher's neighbours, returning the number of rows stored"""
+    computed_at = timezone.now()
+    vectors = teacher_vectors()
+    neighbors = [
+        TeacherNeighbor(
+            teacher_id=user_id,
+            neighbor_id=neighbor_id,
+            score=score,
+            computed_at=computed_at,
+        )
+        for user_id, nearest in nearest_teachers(vectors, top_n)
+        for score, neighbor_id in nearest
+    ]
+    with transaction.atomic():
+        TeacherNeighbor.objects.all().delete()
+        TeacherNeighbor.objects.bulk_create(neighbors, batch_size=batch_size)
+    return len(neighbors)
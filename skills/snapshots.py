@@ -0,0 +1,119 @@
+"""
+Bulk snapshot export of exchange, session, booking, offer and rating tables.
+
+Every table is written to its own gzip-compressed JSONL file. All tables
+are read in one transaction on one connection (REPEATABLE READ on
+PostgreSQL, a read transaction on SQLite), so the files describe a single
+consistent point in time. Rows are additionally capped at the shared
+``snapshot_at`` cut-off.
+
+In incremental mode the previous cut-off, kept in a small state file next
+to the exports, becomes the lower bound minus ``overlap``. ``updated_at``
+is set by the application when a row is written, not when its transaction
+commits, so a slow transaction can commit a row stamped before the last
+cut-off; the overlap picks it up on the next run. Rows in the overlap are
+exported twice, consumers keep the latest version of each id.
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+
+
+SNAPSHOT_TABLES = {
+    'exchange_requests': 'skills.ExchangeRequest',
+    'exchange_sessions': 'skills.ExchangeSession',
+    'session_feedback': 'skills.SessionFeedback',
+    'bookings': 'skills.Booking',
+    'offers': 'skills.SkillExchangeOffer',
+    'ratings': 'accounts.UserRating',
+}
+
+STATE_FILE = '.export_state.json'
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_OVERLAP = timedelta(minutes=5)
+
+
+def load_state(output_dir):
+    path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as fileobj:
+        return json.load(fileobj)
+
+
+def save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fileobj:
+        json.dump(state, fileobj, indent=2)
+    os.replace(tmp_path, path)
+
+
+def export_table(name, output_dir, snapshot_at, since=None,
+                 using='default', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write one table to ``<name>-<snapshot>.jsonl.gz`` and return its stats"""
+    model = apps.get_model(SNAPSHOT_TABLES[name])
+    columns = [field.attname for field in model._meta.concrete_fields]
+
+    queryset = model._default_manager.using(using).filter(updated_at__lte=snapshot_at)
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    queryset = queryset.order_by('pk').values(*columns)
+
+    stamp = snapshot_at.strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(output_dir, f'{name}-{stamp}.jsonl.gz')
+    tmp_path = path + '.tmp'
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    rows = 0
+
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as out:
+            for row in queryset.iterator(chunk_size=chunk_size):
+                out.write(encoder.encode(row))
+                out.write('\n')
+                rows += 1
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        'table': name,
+        'file': os.path.basename(path),
+        'rows': rows,
+        'since': since.isoformat() if since else None,
+        'snapshot_at': snapshot_at.isoformat(),
+    }
+
+
+def export_snapshot(output_dir, tables=None, incremental=False, overlap=DEFAULT_OVERLAP,
+                    using='default', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Export ``tables`` from one consistent read and return the per-table stats"""
+    os.makedirs(output_dir, exist_ok=True)
+    tables = tables or list(SNAPSHOT_TABLES)
+    snapshot_at = timezone.now()
+    state = load_state(output_dir)
+
+    results = []
+    # One transaction gives every table the same read view and lets
+    # backends such as PostgreSQL use server-side cursors
+    with transaction.atomic(using=using):
+        if connections[using].vendor == 'postgresql':
+            with connections[using].cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        for name in tables:
+            since = None
+            if incremental and name in state:
+                since = timezone.datetime.fromisoformat(state[name]['snapshot_at']) - overlap
+            results.append(export_table(name, output_dir, snapshot_at, since, using, chunk_size))
+
+    for result in results:
+        state[result['table']] = result
+    save_state(output_dir, state)
+    return results
@@ -1,3 +1,481 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.utils import timezone
+
+from accounts.models import Skill, SkillCategory, UserRating, UserSkill
+from SkillExchange import outbox, throttling
+from SkillExchange.concurrency import compare_and_swap
+
+from . import history, leaderboard, similarity, trending
+from .expiry import TARGETS, expire_chunk
+from .models import (
+    ArchivedNotification, Booking, ExchangeRequest, ExchangeSession, ExchangeSessionHistory, Notification,
+    SessionFeedback, SkillExchangeOffer, TeacherNeighbor, TeacherScore, TrendingBucket
+)
+from .retention import prune_notifications
+from .scheduler import SessionScheduler, complete
+from .snapshots import export_snapshot
+from .views import (
+    ExchangeRequestViewSet, ExchangeSessionViewSet, SessionFeedbackViewSet, SkillExchangeOfferViewSet
+)
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create(email=f'{name}@example.com', username=name)
+
+
+def make_skill(name='Guitar'):
+    category, _ = SkillCategory.objects.get_or_create(name='Music')
+    return Skill.objects.create(name=name, category=category)
+
+
+def make_session(teacher, student, start, **fields):
+    skill = Skill.objects.first() or make_skill()
+    request = ExchangeRequest.objects.create(
+        requester=student, receiver=teacher, skill_offered=skill, skill_requested=skill,
+        message='Hi', status='accepted'
+    )
+    return ExchangeSession.objects.create(
+        exchange_request=request, participant_1=teacher, participant_2=student,
+        title='Lesson', scheduled_start=start, scheduled_end=start + timedelta(hours=1), **fields
+    )
+
+
+def make_booked_session(teacher, student, start, **fields):
+    """A session created from a confirmed booking of one of ``teacher``'s offers"""
+    session = make_session(teacher, student, start, **fields)
+    offer = SkillExchangeOffer.objects.create(
+        user=teacher, skill=session.exchange_request.skill_requested, title='Lessons',
+        description='Guitar'
+    )
+    Booking.objects.create(
+        offer=offer, student=student, message='Hi', proposed_datetime=start,
+        status='confirmed', session=session
+    )
+    return session, offer
+
+
+class SnapshotExportTests(TestCase):
+
+    def setUp(self):
+        self.ann, self.bob, self.cid = make_user('ann'), make_user('bob'), make_user('cid')
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def export(self, **kwargs):
+        [result] = export_snapshot(self.output_dir, tables=['ratings'], **kwargs)
+        with gzip.open(os.path.join(self.output_dir, result['file']), 'rt') as fileobj:
+            return [json.loads(line) for line in fileobj]
+
+    def test_incremental_export_sees_rating_edits(self):
+        rating = UserRating.objects.create(rated_user=self.ann, rated_by=self.bob, rating=3)
+        self.assertEqual(len(self.export()), 1)
+
+        rating.rating = 5
+        rating.save()
+        rows = self.export(incremental=True)
+        self.assertEqual([(row['id'], row['rating']) for row in rows], [(rating.pk, 5)])
+
+    def test_incremental_export_overlaps_the_previous_cutoff(self):
+        self.export()
+        # Stamped before the cut-off but committed after it
+        late = UserRating.objects.create(rated_user=self.ann, rated_by=self.cid, rating=4)
+        UserRating.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(seconds=30))
+
+        self.assertEqual([row['id'] for row in self.export(incremental=True)], [late.pk])
+        self.assertEqual(self.export(incremental=True, overlap=timedelta(0)), [])
+
+
+class SessionSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.student = make_user('teacher'), make_user('student')
+        self.now = timezone.now()
+        self.scheduler = SessionScheduler(REMINDER_LEAD=3600, HORIZON=3 * 3600)
+
+    def reminders(self):
+        return Notification.objects.filter(notification_type='session_reminder', title='Upcoming Session').count()
+
+    def test_rescheduled_session_is_reminded_at_its_new_time(self):
+        session = make_session(self.teacher, self.student, self.now + timedelta(hours=2))
+        self.scheduler.load(self.now)
+        session.scheduled_start += timedelta(minutes=30)
+        session.save()
+        self.scheduler.load(self.now + timedelta(minutes=1))
+
+        self.assertEqual(self.scheduler.run_due(self.now + timedelta(minutes=61)), {'remind': 0})
+        self.assertEqual(self.reminders(), 0)
+        self.assertEqual(self.scheduler.run_due(self.now + timedelta(minutes=91)), {'remind': 1})
+        self.assertEqual(self.reminders(), 2)
+
+    def test_completes_sessions_created_from_bookings(self):
+        session, offer = make_booked_session(
+            self.teacher, self.student, self.now - timedelta(hours=2), status='in_progress'
+        )
+
+        self.assertEqual(complete([session.pk], self.now, 900), 1)
+        offer.refresh_from_db()
+        self.assertEqual((offer.total_sessions, offer.total_students), (1, 0))
+
+    def test_failing_tick_does_not_stop_the_daemon(self):
+        ticks = mock.Mock(side_effect=[RuntimeError('database is locked'), {}, KeyboardInterrupt])
+        self.scheduler.loaded_at = self.now
+        with mock.patch.object(self.scheduler, 'tick', ticks), mock.patch('time.sleep'):
+            with self.assertLogs('skills.scheduler', 'ERROR'):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.scheduler.run_forever()
+        self.assertEqual(ticks.call_count, 3)
+
+
+class ExpiryTests(TestCase):
+
+    def test_notifies_only_rows_the_update_expired(self):
+        teacher, ann, bob = make_user('teacher'), make_user('ann'), make_user('bob')
+        offer = SkillExchangeOffer.objects.create(
+            user=teacher, skill=make_skill(), title='Lessons', description='Guitar'
+        )
+        past = timezone.now() - timedelta(days=1)
+        pending, confirmed = (
+            Booking.objects.create(offer=offer, student=student, message='Hi', proposed_datetime=past)
+            for student in (ann, bob)
+        )
+        # Confirmed between the SELECT and the guarded UPDATE
+        Booking.objects.filter(pk=confirmed.pk).update(status='confirmed')
+        _, fields, make_notification = TARGETS['bookings']
+
+        selected = Booking.objects.filter(pk__in=[pending.pk, confirmed.pk])
+        self.assertEqual(expire_chunk(selected, fields, make_notification, timezone.now(), 10), 1)
+        self.assertEqual(
+            list(Notification.objects.filter(notification_type='booking_expired').values_list('user', flat=True)),
+            [ann.pk]
+        )
+
+
+class LeaderboardConsumerTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.student = make_user('teacher'), make_user('student')
+        self.session = make_session(self.teacher, self.student, timezone.now() - timedelta(days=1))
+
+    def consume(self):
+        return outbox.consume(now=timezone.now() + timedelta(minutes=1))
+
+    def global_totals(self, teacher):
+        return TeacherScore.objects.filter(teacher=teacher, scope='global').values_list(
+            'rating_sum', 'rating_count', 'sessions'
+        ).get()
+
+    def feedback(self, session, **fields):
+        return SessionFeedback.objects.create(
+            session=session, user=self.student, overall_rating=4, teaching_quality=4,
+            communication=4, punctuality=4, **fields
+        )
+
+    def test_edit_and_new_feedback_in_one_batch_count_once(self):
+        rating = UserRating.objects.create(rated_user=self.teacher, rated_by=self.student, rating=3)
+        self.consume()
+        self.assertEqual(self.global_totals(self.teacher), (3, 1, 0))
+
+        rating.rating = 5
+        rating.save()
+        self.feedback(self.session)
+        self.consume()
+
+        self.assertEqual(self.global_totals(self.teacher), (9, 2, 1))
+
+    def test_feedback_moved_to_another_session_leaves_the_old_teacher(self):
+        other = make_user('other')
+        moved_to = make_session(other, self.student, timezone.now() - timedelta(hours=1))
+        feedback = self.feedback(self.session)
+        self.consume()
+
+        feedback = SessionFeedback.objects.get(pk=feedback.pk)
+        feedback.session = moved_to
+        feedback.save()
+        self.consume()
+
+        self.assertFalse(TeacherScore.objects.filter(teacher=self.teacher).exists())
+        self.assertEqual(self.global_totals(other), (4, 1, 1))
+
+    def test_recompute_replaces_existing_and_stale_entries(self):
+        UserRating.objects.create(rated_user=self.teacher, rated_by=self.student, rating=4)
+        TeacherScore.objects.create(teacher=self.teacher, scope='global', rating_sum=1, rating_count=1)
+        TeacherScore.objects.create(teacher=self.teacher, scope='skill', scope_id=999, rating_count=1)
+
+        leaderboard.recompute_teacher(self.teacher.pk)
+
+        self.assertEqual(self.global_totals(self.teacher), (4, 1, 0))
+        self.assertEqual(TeacherScore.objects.filter(teacher=self.teacher).count(), 1)
+
+
+@override_settings(THROTTLE_STORE={'BACKEND': 'memory'})
+class SessionCompletionTests(TestCase):
+
+    def setUp(self):
+        throttling._store = None
+        self.addCleanup(setattr, throttling, '_store', None)
+        self.teacher, self.student = make_user('teacher'), make_user('student')
+        self.session, self.offer = make_booked_session(
+            self.teacher, self.student, timezone.now() - timedelta(hours=2), status='in_progress'
+        )
+
+    def post(self, action, session):
+        request = APIRequestFactory().post(f'/sessions/{session.pk}/{action}/')
+        force_authenticate(request, self.teacher)
+        return ExchangeSessionViewSet.as_view({'post': action})(request, pk=session.pk)
+
+    def assertCounted(self):
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.total_sessions, self.offer.total_students), (1, 0))
+
+    def test_complete_action_updates_the_offer(self):
+        response = self.post('complete', self.session)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertCounted()
+
+    def test_saving_a_completed_session_updates_the_offer(self):
+        self.session.status = 'completed'
+        self.session.save()
+
+        self.assertCounted()
+
+    def test_stale_copy_gets_a_conflict(self):
+        stale = ExchangeSession.objects.get(pk=self.session.pk)
+        self.assertTrue(compare_and_swap(self.session, status='completed'))
+
+        self.assertFalse(compare_and_swap(stale, status='cancelled'))
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.version), ('completed', self.session.version))
+
+        ExchangeSession.objects.filter(pk=self.session.pk).update(status='scheduled')
+        with mock.patch('skills.views.compare_and_swap', return_value=False):
+            response = self.post('cancel', self.session)
+        self.assertEqual(response.status_code, 409)
+
+    def test_swap_records_an_outbox_event(self):
+        self.assertTrue(compare_and_swap(self.session, status='completed'))
+
+        event = outbox.event_model().objects.filter(model='skills.ExchangeSession').last()
+        self.assertEqual((event.action, event.payload['status']), ('updated', 'completed'))
+        self.assertEqual(event.payload['version'], self.session.version)
+
+
+class NotificationRetentionTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('ann')
+        self.session = make_session(self.user, make_user('bob'), timezone.now() + timedelta(days=1))
+        Notification.objects.all().delete()
+
+    def notify(self, title='New message', is_read=True, **targets):
+        return Notification.objects.create(
+            user=self.user, notification_type='new_message', title=title, message='Hi',
+            is_read=is_read, **targets
+        )
+
+    def prune(self):
+        return prune_notifications(READ_DAYS=365, MAX_PER_USER=0)
+
+    def test_repeats_collapse_into_the_newest_row(self):
+        self.notify(session=self.session, is_read=False)
+        self.notify(session=self.session)
+        newest = self.notify(session=self.session)
+
+        self.assertEqual(self.prune()['collapsed'], 2)
+        newest.refresh_from_db()
+        self.assertEqual((newest.repeat_count, newest.is_read), (3, False))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_folded_rows_are_archived(self):
+        folded = [self.notify(session=self.session) for _ in range(2)]
+        self.notify(session=self.session)
+
+        self.prune()
+        self.assertEqual(
+            sorted(ArchivedNotification.objects.values_list('pk', flat=True)),
+            [notification.pk for notification in folded]
+        )
+
+    def test_rows_without_a_target_or_with_other_titles_are_kept(self):
+        self.notify(title='Welcome')
+        self.notify(title='Welcome')
+        self.notify(title='Profile incomplete')
+        self.notify(title='Reminder', session=self.session)
+        self.notify(title='Changed', session=self.session)
+
+        self.assertEqual(self.prune()['collapsed'], 0)
+        self.assertEqual(Notification.objects.count(), 5)
+
+
+@override_settings(THROTTLE_STORE={'BACKEND': 'memory'}, TOKEN_BUCKETS={})
+class ExchangeArchiveTests(TestCase):
+
+    def setUp(self):
+        throttling._store = None
+        self.addCleanup(setattr, throttling, '_store', None)
+        self.teacher, self.student = make_user('teacher'), make_user('student')
+        self.now = timezone.now()
+        self.sessions = [self.closed_session(days) for days in (120, 100)]
+
+    def closed_session(self, days):
+        start = self.now - timedelta(days=days)
+        session = make_session(self.teacher, self.student, start, status='completed')
+        ExchangeRequest.objects.filter(pk=session.exchange_request_id).update(status='completed', created_at=start)
+        return session
+
+    def get(self, viewset, user, **params):
+        request = APIRequestFactory().get('/history/', params)
+        force_authenticate(request, user)
+        return viewset.as_view({'get': 'history'})(request)
+
+    def test_sessions_with_feedback_move_with_their_request(self):
+        feedback = SessionFeedback.objects.create(
+            session=self.sessions[0], user=self.student, overall_rating=5, teaching_quality=5,
+            communication=5, punctuality=5
+        )
+        outbox.consume(now=self.now + timedelta(minutes=1))
+
+        summary = history.archive_closed(now=self.now)
+
+        self.assertEqual((summary['sessions'], summary['exchange_requests']), (2, 2))
+        self.assertFalse(ExchangeSession.objects.exists())
+        feedback.refresh_from_db()
+        self.assertEqual((feedback.session_id, feedback.archived_session_id), (None, self.sessions[0].pk))
+        self.assertEqual((feedback.teacher_id, feedback.session_title), (self.teacher.pk, 'Lesson'))
+        leaderboard.recompute_teacher(self.teacher.pk)
+        self.assertEqual(
+            TeacherScore.objects.filter(teacher=self.teacher, scope='global').values_list('rating_sum', 'sessions').get(),
+            (5, 1)
+        )
+
+        request = APIRequestFactory().get('/feedback/')
+        force_authenticate(request, self.teacher)
+        response = SessionFeedbackViewSet.as_view({'get': 'list'})(request)
+        self.assertEqual([row['id'] for row in response.data], [feedback.pk])
+
+    def test_row_reopened_before_its_chunk_is_moved_stays_live(self):
+        atomic = transaction.atomic
+
+        def reopen_then_atomic(*args, **kwargs):
+            ExchangeSession.objects.filter(pk=self.sessions[0].pk).update(status='scheduled')
+            return atomic(*args, **kwargs)
+
+        queryset = history.closed_sessions(self.now - timedelta(days=90))
+        with mock.patch('skills.history.transaction.atomic', reopen_then_atomic):
+            moved = history.move_chunk(queryset, ExchangeSessionHistory, 'session', 10, self.now)
+
+        self.assertEqual(moved, 1)
+        self.assertEqual(list(ExchangeSession.objects.values_list('pk', flat=True)), [self.sessions[0].pk])
+        self.assertEqual(list(ExchangeSessionHistory.objects.values_list('pk', flat=True)), [self.sessions[1].pk])
+
+    def test_history_endpoints_page_newest_first(self):
+        history.archive_closed(now=self.now)
+        newest, oldest = sorted((session.pk for session in self.sessions), reverse=True)
+
+        response = self.get(ExchangeSessionViewSet, self.student, limit=1)
+        self.assertEqual([row['id'] for row in response.data], [newest])
+        response = self.get(ExchangeSessionViewSet, self.student, limit=1, before=newest)
+        self.assertEqual([row['id'] for row in response.data], [oldest])
+
+        requests = self.get(ExchangeRequestViewSet, self.teacher).data
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(self.get(ExchangeSessionViewSet, make_user('other')).data, [])
+
+
+@override_settings(THROTTLE_STORE={'BACKEND': 'memory'}, TOKEN_BUCKETS={})
+class SimilarTeachersTests(TestCase):
+
+    def setUp(self):
+        throttling._store = None
+        self.addCleanup(setattr, throttling, '_store', None)
+        guitar, piano, chess = make_skill('Guitar'), make_skill('Piano'), make_skill('Chess')
+        self.ann, self.bob, self.cid, self.dan = (make_user(name) for name in ('ann', 'bob', 'cid', 'dan'))
+        for user, skill, level in (
+            (self.ann, guitar, 'expert'), (self.ann, piano, 'advanced'),
+            (self.bob, guitar, 'expert'), (self.bob, piano, 'advanced'),
+            (self.cid, guitar, 'beginner'), (self.dan, chess, 'expert'),
+        ):
+            UserSkill.objects.create(user=user, skill=skill, proficiency_level=level)
+        self.guitar = guitar
+
+    def offer(self, user, title='Lessons'):
+        return SkillExchangeOffer.objects.create(user=user, skill=self.guitar, title=title, description='Guitar')
+
+    def test_build_ranks_teachers_sharing_skills_only(self):
+        self.assertEqual(similarity.build(), 6)
+
+        neighbors = TeacherNeighbor.objects.filter(teacher=self.ann).order_by('-score')
+        self.assertEqual([row.neighbor_id for row in neighbors], [self.bob.pk, self.cid.pk])
+        self.assertFalse(TeacherNeighbor.objects.filter(Q(teacher=self.dan) | Q(neighbor=self.dan)).exists())
+
+    def test_similar_returns_one_offer_per_neighbour(self):
+        similarity.build()
+        offer = self.offer(self.ann)
+        self.offer(self.bob, 'Old lessons')
+        newest = self.offer(self.bob, 'New lessons')
+        other = self.offer(self.cid)
+
+        request = APIRequestFactory().get(f'/offers/{offer.pk}/similar/')
+        force_authenticate(request, make_user('eve'))
+        response = SkillExchangeOfferViewSet.as_view({'get': 'similar'})(request, pk=offer.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], [newest.pk, other.pk])
+
+
+@override_settings(TRENDING={'SKETCH': True, 'SKETCH_THRESHOLD': 3})
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.hour = trending.bucket_hour(timezone.now())
+
+    def count(self, target_id):
+        bucket = TrendingBucket.objects.filter(kind='skill', target_id=target_id)
+        return bucket.values_list('count', flat=True).first()
+
+    def test_bucket_starts_once_the_sketch_reaches_the_threshold(self):
+        trending.record('skill', 7, self.hour, event_ids=[1])
+        trending.record('skill', 7, self.hour, event_ids=[2])
+        self.assertIsNone(self.count(7))
+
+        trending.record('skill', 7, self.hour, event_ids=[3])
+        self.assertEqual(self.count(7), 3)
+        trending.record('skill', 7, self.hour, event_ids=[4])
+        self.assertEqual(self.count(7), 4)
+
+    def test_retried_events_are_not_counted_twice(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                trending.record('skill', 7, self.hour, event_ids=[1, 2, 3])
+                raise RuntimeError('handler failed')
+        self.assertIsNone(self.count(7))
+
+        trending.record('skill', 7, self.hour, event_ids=[1, 2, 3])
+        self.assertEqual(self.count(7), 3)
+
+    def test_window_sums_its_hours_only(self):
+        for hours_ago, target_id, count in ((0, 1, 2), (23, 1, 2), (24, 2, 9), (5, 2, 3), (30, 3, 50)):
+            TrendingBucket.objects.create(
+                kind='skill', target_id=target_id, hour=self.hour - timedelta(hours=hours_ago), count=count
+            )
+
+        self.assertEqual(trending.trending('skill', '24h'), [(1, 4), (2, 3)])
+        self.assertEqual(trending.trending('skill', '7d', limit=2), [(3, 50), (2, 12)])
@@ -0,0 +1,205 @@
+"""
+Trending skills and offers over sliding time windows.
+
+Every new ExchangeRequest (the skill asked for), Booking (the offer and
+its skill) and SkillWanted row adds one to an hourly TrendingBucket of
+its target, applied from the outbox by skills.read_models. A window is the sum of its last hours:
+``trending`` reads at most 24 or 168 buckets per active target through
+the (kind, hour) index and never touches the activity tables.
+
+With ``SKETCH`` enabled, increments first go to a count-min sketch of the
+current hour kept in the cache, and a target only gets a bucket row once
+its estimate reaches ``SKETCH_THRESHOLD``. The long tail of skills seen
+once or twice an hour then costs a few cache increments instead of a row.
+A count-min sketch never underestimates, so no target that crosses the
+threshold is missed; a hash collision can only start its row a little
+high. The cache is not part of the consumer's transaction, so each
+outbox event is counted in the sketch at most once: a retried batch
+finds its events already seen and only re-reads the estimate.
+
+``prune`` drops buckets older than ``KEEP_DAYS`` and ``rebuild`` refills
+the kept window from the activity tables, e.g. after a deploy.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from accounts.models import SkillWanted
+
+from .models import Booking, ExchangeRequest, TrendingBucket
+
+
+DEFAULTS = {
+    'KEEP_DAYS': 8,
+    'SKETCH': False,
+    'SKETCH_WIDTH': 2048,
+    'SKETCH_DEPTH': 4,
+    'SKETCH_THRESHOLD': 3,
+    'BATCH_SIZE': 1000,
+}
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+}
+MAX_LIMIT = 50
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TRENDING', {})}
+
+
+def bucket_hour(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+class CountMinSketch:
+    """Count-min sketch of one (kind, hour), stored as cache counters"""
+
+    def __init__(self, kind, hour, width, depth):
+        self.prefix = f'trending:{kind}:{hour:%Y%m%d%H}'
+        self.width = width
+        self.depth = depth
+
+    def keys(self, target_id):
+        keys = []
+        for row in range(self.depth):
+            digest = hashlib.blake2b(f'{row}:{target_id}'.encode(), digest_size=8).digest()
+            keys.append(f'{self.prefix}:{row}:{int.from_bytes(digest, "big") % self.width}')
+        return keys
+
+    def add(self, target_id, amount=1):
+        """Count ``amount`` more for ``target_id``, returning the new estimate"""
+        counts = []
+        for key in self.keys(target_id):
+            # Only the current hour is written; two hours leave room for late writes
+            cache.add(key, 0, timeout=7200)
+            counts.append(cache.incr(key, amount))
+        return min(counts)
+
+    def add_events(self, target_id, event_ids):
+        """Count each event not counted before once, returning the new estimate"""
+        unseen = sum(
+            cache.add(f'{self.prefix}:event:{event_id}', 1, timeout=7200) for event_id in event_ids
+        )
+        if not unseen:
+            return self.estimate(target_id)
+        return self.add(target_id, unseen)
+
+    def estimate(self, target_id):
+        counts = cache.get_many(self.keys(target_id))
+        return min(counts.get(key, 0) for key in self.keys(target_id))
+
+
+def record(kind, target_id, when=None, amount=1, event_ids=None):
+    """
+    Count ``amount`` of activity for a skill or offer in its hourly bucket.
+
+    ``event_ids`` are the outbox events behind it (``amount`` is then their
+    number); they keep a retried batch from counting twice in the sketch.
+    """
+    if target_id is None:
+        return
+    config = get_config()
+    hour = bucket_hour(when or timezone.now())
+    if event_ids is not None:
+        amount = len(event_ids)
+    initial = amount
+    if config['SKETCH']:
+        sketch = CountMinSketch(kind, hour, config['SKETCH_WIDTH'], config['SKETCH_DEPTH'])
+        if event_ids is not None:
+            initial = sketch.add_events(target_id, event_ids)
+        else:
+            initial = sketch.add(target_id, amount)
+        if initial < config['SKETCH_THRESHOLD']:
+            # Estimates only grow within an hour, so no row exists yet either
+            return
+
+    bucket = TrendingBucket.objects.filter(kind=kind, target_id=target_id, hour=hour)
+    if bucket.update(count=F('count') + amount):
+        return
+    try:
+        with transaction.atomic():
+            TrendingBucket.objects.create(kind=kind, target_id=target_id, hour=hour, count=initial)
+    except IntegrityError:
+        # Another writer created the bucket first
+        bucket.update(count=F('count') + amount)
+
+
+def trending(kind, window='24h', limit=10, now=None):
+    """[(target id, count)] of the most active targets in the window ending now"""
+    now = now or timezone.now()
+    since = bucket_hour(now) - WINDOWS[window] + timedelta(hours=1)
+    return list(
+        TrendingBucket.objects.filter(kind=kind, hour__gte=since).order_by().values(
+            'target_id'
+        ).annotate(total=Sum('count')).order_by('-total', 'target_id').values_list(
+            'target_id', 'total'
+        )[:limit]
+    )
+
+
+def query_params(params):
+    """(window, limit) of a trending request, window None when unknown"""
+    window = params.get('window', '24h')
+    try:
+        limit = max(1, min(int(params.get('limit', 10)), MAX_LIMIT))
+    except ValueError:
+        limit = 10
+    return (window if window in WINDOWS else None), limit
+
+
+def prune(now=None, batch_size=None):
+    """Delete buckets older than KEEP_DAYS in chunks, returning how many"""
+    config = get_config()
+    now = now or timezone.now()
+    batch_size = batch_size or config['BATCH_SIZE']
+    old = TrendingBucket.objects.filter(hour__lt=bucket_hour(now) - timedelta(days=config['KEEP_DAYS']))
+    removed = 0
+    while True:
+        pks = list(old.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return removed
+        removed += TrendingBucket.objects.filter(pk__in=pks).delete()[0]
+
+
+# (kind, activity model, target field)
+SOURCES = [
+    ('skill', ExchangeRequest, 'skill_requested_id'),
+    ('skill', Booking, 'offer__skill_id'),
+    ('skill', SkillWanted, 'skill_id'),
+    ('offer', Booking, 'offer_id'),
+]
+
+
+@transaction.atomic
+def rebuild(now=None):
+    """Recount the buckets of the last KEEP_DAYS from the activity tables"""
+    config = get_config()
+    now = now or timezone.now()
+    since = bucket_hour(now) - timedelta(days=config['KEEP_DAYS'])
+    counts = {}
+    for kind, model, field in SOURCES:
+        rows = model.objects.filter(created_at__gte=since).order_by().annotate(
+            bucket=TruncHour('created_at')
+        ).values(field, 'bucket').annotate(total=Count('pk')).values_list(field, 'bucket', 'total')
+        for target_id, hour, total in rows:
+            if target_id is not None:
+                key = (kind, target_id, hour)
+                counts[key] = counts.get(key, 0) + total
+
+    TrendingBucket.objects.filter(hour__gte=since).delete()
+    TrendingBucket.objects.bulk_create(
+        [
+            TrendingBucket(kind=kind, target_id=target_id, hour=hour, count=total)
+            for (kind, target_id, hour), total in counts.items()
+        ],
+        batch_size=config['BATCH_SIZE']
+    )
+    return len(counts)
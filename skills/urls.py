@@ -3,8 +3,10 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     ExchangeRequestViewSet, ExchangeSessionViewSet,
     SessionFeedbackViewSet, SkillExchangeOfferViewSet,
-    BookingViewSet, NotificationViewSet, DashboardStatsView
+    BookingViewSet, NotificationViewSet, DashboardStatsView,
+    LeaderboardView, TrendingSkillsView
 )
+from .async_views import AsyncNotificationListView, AsyncUpcomingSessionsView
 
 # Create router for viewsets
 router = DefaultRouter()
@@ -21,6 +23,16 @@ urlpatterns = [
     # Dashboard stats
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
     
+    # Top-teacher leaderboards
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    
+    # Trending skills (offers are under offers/trending/)
+    path('trending/', TrendingSkillsView.as_view(), name='trending-skills'),
+    
+    # Async read endpoints (served through ASGI)
+    path('async/notifications/', AsyncNotificationListView.as_view(), name='async-notifications'),
+    path('async/sessions/upcoming/', AsyncUpcomingSessionsView.as_view(), name='async-upcoming-sessions'),
+    
     # Router URLs
     path('', include(router.urls)),
 ]
\ No newline at end of file
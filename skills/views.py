@@ -4,20 +4,33 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Count, Avg
+from django.db import transaction
+from django.db.models import Q, Count, Avg, F, OuterRef, Subquery
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 
+from accounts import geo
+from accounts.models import Skill
+from SkillExchange import metrics
+from SkillExchange.concurrency import CONFLICT_MESSAGE, compare_and_swap
+from SkillExchange.streaming import StreamingListMixin
+
+from . import leaderboard, trending
+from .history import history_page
 from .models import (
     ExchangeRequest, ExchangeSession, SessionFeedback,
-    SkillExchangeOffer, Booking, Notification
+    SkillExchangeOffer, Booking, Notification,
+    ExchangeRequestHistory, ExchangeSessionHistory, BookingHistory
 )
+from .scheduler import update_offer_stats
 from .serializers import (
     ExchangeRequestSerializer, ExchangeRequestUpdateSerializer,
     ExchangeSessionSerializer, ExchangeSessionDetailSerializer,
     SessionFeedbackSerializer, SkillExchangeOfferSerializer,
     SkillExchangeOfferDetailSerializer, BookingSerializer,
-    BookingUpdateSerializer, NotificationSerializer
+    BookingUpdateSerializer, NotificationSerializer,
+    ExchangeRequestHistorySerializer, ExchangeSessionHistorySerializer,
+    BookingHistorySerializer
 )
 
 User = get_user_model()
@@ -67,6 +80,15 @@ class ExchangeRequestViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(requests, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Get archived requests sent or received by current user"""
+        requests = ExchangeRequestHistory.objects.filter(
+            Q(requester=request.user) | Q(receiver=request.user)
+        ).select_related('requester', 'receiver', 'skill_offered', 'skill_requested')
+        serializer = ExchangeRequestHistorySerializer(history_page(requests, request), many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post'])
     def respond(self, request, pk=None):
         """Respond to an exchange request (accept/reject)"""
@@ -97,6 +119,7 @@ class ExchangeRequestViewSet(viewsets.ModelViewSet):
             
             # If accepted, create a session
             if serializer.validated_data.get('status') == 'accepted':
+                metrics.inc('exchange_requests_accepted_total')
                 self._create_session_from_request(exchange_request)
             
             # Create notification
@@ -139,10 +162,12 @@ class ExchangeRequestViewSet(viewsets.ModelViewSet):
 class ExchangeSessionViewSet(viewsets.ModelViewSet):
     """ViewSet for exchange sessions"""
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'meeting_type']
     ordering_fields = ['scheduled_start', 'created_at']
     ordering = ['-scheduled_start']
+    throttle_costs = {'nearby': 5}
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -156,6 +181,15 @@ class ExchangeSessionViewSet(viewsets.ModelViewSet):
             Q(participant_1=user) | Q(participant_2=user)
         )
 
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Get archived sessions of current user"""
+        sessions = ExchangeSessionHistory.objects.filter(
+            Q(participant_1=request.user) | Q(participant_2=request.user)
+        ).select_related('participant_1', 'participant_2')
+        serializer = ExchangeSessionHistorySerializer(history_page(sessions, request), many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
         """Get upcoming sessions"""
@@ -175,6 +209,24 @@ class ExchangeSessionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(sessions, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Get in-person sessions near ?lat=&lng= (radius_km or k nearest)"""
+        sessions = self.get_queryset().filter(
+            meeting_type__in=['in_person', 'hybrid']
+        )
+        nearby = geo.search(sessions, request.query_params)
+        if nearby is None:
+            return Response(
+                {'error': 'Valid lat and lng query parameters are required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = self.get_serializer(nearby, many=True).data
+        for item, session in zip(data, nearby):
+            item['distance_km'] = round(session.distance_km, 3)
+        return Response(data)
+
     @action(detail=True, methods=['post'])
     def start(self, request, pk=None):
         """Start a session"""
@@ -186,9 +238,8 @@ class ExchangeSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        session.status = 'in_progress'
-        session.actual_start = timezone.now()
-        session.save()
+        if not compare_and_swap(session, status='in_progress', actual_start=timezone.now()):
+            return Response({'error': CONFLICT_MESSAGE}, status=status.HTTP_409_CONFLICT)
         
         serializer = self.get_serializer(session)
         return Response(serializer.data)
@@ -204,9 +255,12 @@ class ExchangeSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        session.status = 'completed'
-        session.actual_end = timezone.now()
-        session.save()
+        with transaction.atomic():
+            if not compare_and_swap(session, status='completed', actual_end=timezone.now()):
+                return Response({'error': CONFLICT_MESSAGE}, status=status.HTTP_409_CONFLICT)
+            # The UPDATE skips the pre_save signal that keeps these for save()
+            update_offer_stats([session.pk])
+        metrics.inc('sessions_completed_total')
         
         serializer = self.get_serializer(session)
         return Response(serializer.data)
@@ -222,8 +276,8 @@ class ExchangeSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        session.status = 'cancelled'
-        session.save()
+        if not compare_and_swap(session, status='cancelled'):
+            return Response({'error': CONFLICT_MESSAGE}, status=status.HTTP_409_CONFLICT)
         
         # Create notification for other participant
         other_participant = (
@@ -253,10 +307,11 @@ class SessionFeedbackViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        """Return feedback for sessions user participated in"""
+        """Return feedback for sessions user participated in, archived or not"""
         user = self.request.user
         return SessionFeedback.objects.filter(
             Q(session__participant_1=user) | Q(session__participant_2=user)
+            | Q(archived_session__participant_1=user) | Q(archived_session__participant_2=user)
         )
 
     @action(detail=False, methods=['get'])
@@ -268,14 +323,16 @@ class SessionFeedbackViewSet(viewsets.ModelViewSet):
 
 
 
-class SkillExchangeOfferViewSet(viewsets.ModelViewSet):
+class SkillExchangeOfferViewSet(StreamingListMixin, viewsets.ModelViewSet):
     """ViewSet for skill exchange offers"""
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'skill', 'availability', 'requires_exchange']
     search_fields = ['title', 'description', 'skill__name']
     ordering_fields = ['created_at', 'total_sessions', 'total_students']
     ordering = ['-created_at']
+    throttle_costs = {'list': 2, 'active': 5, 'similar': 2, 'trending': 2}
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -303,9 +360,66 @@ class SkillExchangeOfferViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Get all active offers"""
-        offers = SkillExchangeOffer.objects.filter(status='active').exclude(user=request.user)
-        serializer = self.get_serializer(offers, many=True)
-        return Response(serializer.data)
+        offers = SkillExchangeOffer.objects.filter(
+            status='active'
+        ).exclude(user=request.user).select_related(
+            'user', 'skill'
+        ).prefetch_related('desired_skills__category')
+        return self.stream(offers)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Active offers with the most bookings over ?window=24h|7d"""
+        window, limit = trending.query_params(request.query_params)
+        if window is None:
+            return Response(
+                {'error': f'window must be one of {", ".join(trending.WINDOWS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        counts = dict(trending.trending('offer', window, limit))
+        offers = SkillExchangeOffer.objects.filter(
+            pk__in=counts, status='active'
+        ).select_related('user', 'skill').prefetch_related('desired_skills__category')
+        offers = sorted(offers, key=lambda offer: (-counts[offer.pk], offer.pk))
+        data = self.get_serializer(offers, many=True).data
+        for item, offer in zip(data, offers):
+            item['activity'] = counts[offer.pk]
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Newest active offer of each teacher most similar to this offer's teacher"""
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+
+        # One query: offer -> teacher -> precomputed neighbours -> their offers,
+        # one per neighbour so a teacher with many offers fills one slot
+        newest = SkillExchangeOffer.objects.filter(
+            user=OuterRef('user'), status='active'
+        ).order_by('-created_at', '-pk').values('pk')[:1]
+        offers = SkillExchangeOffer.objects.filter(
+            status='active',
+            user__similar_to__teacher__skill_offers=pk,
+            pk=Subquery(newest)
+        ).exclude(user=request.user).values(
+            'id', 'user', 'skill', 'title', 'availability',
+            'preferred_meeting_type', 'session_duration',
+            'total_sessions', 'total_students',
+            skill_name=F('skill__name'),
+            user_first_name=F('user__first_name'),
+            user_last_name=F('user__last_name'),
+            similarity=F('user__similar_to__score'),
+        ).order_by('-similarity', '-created_at')[:limit]
+
+        results = []
+        for offer in offers:
+            first_name = offer.pop('user_first_name')
+            last_name = offer.pop('user_last_name')
+            offer['user_name'] = f"{first_name} {last_name}".strip()
+            results.append(offer)
+        return Response(results)
 
     @action(detail=True, methods=['post'])
     def toggle_status(self, request, pk=None):
@@ -319,17 +433,15 @@ class SkillExchangeOfferViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if offer.status == 'active':
-            offer.status = 'paused'
-        elif offer.status == 'paused':
-            offer.status = 'active'
-        else:
+        toggled = {'active': 'paused', 'paused': 'active'}.get(offer.status)
+        if toggled is None:
             return Response(
                 {'error': 'Cannot toggle status of closed offers.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        offer.save()
+        if not compare_and_swap(offer, status=toggled):
+            return Response({'error': CONFLICT_MESSAGE}, status=status.HTTP_409_CONFLICT)
         serializer = self.get_serializer(offer)
         return Response(serializer.data)
 
@@ -375,6 +487,15 @@ class BookingViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(bookings, many =True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Get archived bookings made by user or for user's offers"""
+        bookings = BookingHistory.objects.filter(
+            Q(student=request.user) | Q(offer__user=request.user)
+        ).select_related('student', 'offer__user', 'exchange_skill')
+        serializer = BookingHistorySerializer(history_page(bookings, request), many=True)
+        return Response(serializer.data)
+    
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk = None):
         """Confirm a booking"""
@@ -395,30 +516,31 @@ class BookingViewSet(viewsets.ModelViewSet):
                 
             )
         
-        booking.status = 'confirmed'
-        booking.confirmed_at = timezone.now()
-        
         # Create session
         scheduled_start = booking.proposed_datetime
         scheduled_end = scheduled_start + timezone.timedelta(
             minutes= booking.offer.session_duration
         )
         
-        
-        session = ExchangeSession.objects.create(
-            participant_1 = booking.offer.user,
-            participant_2 = booking.student,
-            title = booking.offer.title,
-            description = booking.offer.description,
-            scheduled_start = scheduled_start,
-            scheduled_end = scheduled_end,
-            meeting_type = booking.offer.preferred_meeting_type
+        with transaction.atomic():
+            session = ExchangeSession.objects.create(
+                participant_1 = booking.offer.user,
+                participant_2 = booking.student,
+                title = booking.offer.title,
+                description = booking.offer.description,
+                scheduled_start = scheduled_start,
+                scheduled_end = scheduled_end,
+                meeting_type = booking.offer.preferred_meeting_type
+                
+            )
             
-        )
-        
-        
-        booking.session = session
-        booking.save()
+            if not compare_and_swap(
+                booking, status='confirmed', confirmed_at=timezone.now(), session=session
+            ):
+                # Someone else confirmed or cancelled it first, drop the session
+                transaction.set_rollback(True)
+                return Response({'error': CONFLICT_MESSAGE}, status=status.HTTP_409_CONFLICT)
+        metrics.inc('bookings_confirmed_total')
         
         
         #create notification
@@ -446,8 +568,8 @@ class BookingViewSet(viewsets.ModelViewSet):
             )
             
             
-        booking.status = 'cancelled'
-        booking.save()
+        if not compare_and_swap(booking, status='cancelled'):
+            return Response({'error': CONFLICT_MESSAGE}, status=status.HTTP_409_CONFLICT)
         
         
         
@@ -467,6 +589,78 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         serializer = BookingSerializer(booking)
         return Response(serializer.data)
-    
-    
-    
\ No newline at end of file
+
+
+class LeaderboardView(APIView):
+    """Top teachers globally, or per ?skill= or ?category="""
+    permission_classes = [IsAuthenticated]
+    read_from_replica = True
+    throttle_cost = 2
+
+    def get(self, request):
+        params = request.query_params
+        scope, scope_id = 'global', 0
+        for name in ('skill', 'category'):
+            if params.get(name):
+                if not params[name].isdigit():
+                    return Response(
+                        {'error': f'{name} must be an id'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                scope, scope_id = name, int(params[name])
+                break
+        try:
+            limit = max(1, min(int(params.get('limit', 10)), 100))
+        except ValueError:
+            limit = 10
+
+        def entry_data(position, entry):
+            return {
+                'rank': position,
+                'teacher': entry.teacher_id,
+                'score': round(entry.score, 4),
+                'rating': round(entry.rating_sum / entry.rating_count, 2) if entry.rating_count else None,
+                'rating_count': entry.rating_count,
+                'sessions': entry.sessions,
+                'recommend_rate': round(entry.recommend_count / entry.sessions, 2) if entry.sessions else None,
+            }
+
+        results = []
+        for position, entry in enumerate(leaderboard.top(scope, scope_id, limit), start=1):
+            data = entry_data(position, entry)
+            data['teacher_name'] = entry.teacher.get_full_name() or entry.teacher.username
+            results.append(data)
+
+        my_rank, mine = leaderboard.rank(request.user.id, scope, scope_id)
+        return Response({
+            'scope': scope,
+            'scope_id': scope_id or None,
+            'results': results,
+            'me': entry_data(my_rank, mine) if mine else None,
+        })
+
+
+class TrendingSkillsView(APIView):
+    """Skills with the most requests, bookings and wishes over ?window=24h|7d"""
+    permission_classes = [IsAuthenticated]
+    read_from_replica = True
+    throttle_cost = 2
+
+    def get(self, request):
+        window, limit = trending.query_params(request.query_params)
+        if window is None:
+            return Response(
+                {'error': f'window must be one of {", ".join(trending.WINDOWS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        rows = trending.trending('skill', window, limit)
+        skills = {
+            skill['id']: skill
+            for skill in Skill.objects.filter(pk__in=[pk for pk, _ in rows]).values(
+                'id', 'name', 'category', category_name=F('category__name')
+            )
+        }
+        return Response([
+            {**skills[pk], 'activity': total}
+            for pk, total in rows if pk in skills
+        ])